@@ -1,14 +1,52 @@
 """entry point for evglint."""
+import glob
 import os
 import sys
-from typing import Dict, List, Optional
+from typing import List, Optional, Set
 
 import click
 
+from evergreen_lint import snapshot
+from evergreen_lint.cache import DEFAULT_MAX_BYTES, ParseCache
 from evergreen_lint.config import STUB, load_config
-from evergreen_lint.model import LintError
-from evergreen_lint.rules import RULES
-from evergreen_lint.yamlhandler import load_file
+from evergreen_lint.includes import ProjectLoader
+from evergreen_lint.model import Buffer
+from evergreen_lint.rules import (
+    RULES,
+    find_literals,
+    literals_required_by,
+    root_keys_read_by,
+    rules_that_may_fire,
+)
+from evergreen_lint.visitor import run_rules
+from evergreen_lint.yamlhandler import ALIAS_BUDGET
+
+alias_budget_option = click.option(
+    "--alias-budget",
+    type=click.IntRange(min=0),
+    default=ALIAS_BUDGET,
+    show_default=True,
+    help="Fail on files whose YAML aliases expand to more nodes than this.",
+)
+no_alias_budget_option = click.option(
+    "--no-alias-budget",
+    is_flag=True,
+    help="Don't limit how many nodes YAML aliases expand to.",
+)
+core_schema_option = click.option(
+    "--core-schema",
+    is_flag=True,
+    help="Resolve plain scalars with the YAML 1.2 core schema, as Evergreen does, instead of "
+    "YAML 1.1, so values like yes, off and dates stay strings.",
+)
+jobs_option = click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Parse independent parts of large YAML files on this many processes.",
+)
 
 
 @click.group()
@@ -17,18 +55,57 @@ from evergreen_lint.yamlhandler import load_file
 def main(ctx: click.Context, config: Optional[os.PathLike]) -> None:
     ctx.ensure_object(dict)
     ctx.obj["config"] = None
+    ctx.obj["config_dir"] = None
     if config is not None:
         click.echo(f"Load config file: {config}")
         ctx.obj["config"] = load_config(config)
+        ctx.obj["config_dir"] = os.path.dirname(os.path.abspath(config))
 
 
 @main.command()
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    envvar="EVGLINT_CACHE_DIR",
+    help="Reuse parsed YAML from this directory across runs.",
+)
+@click.option(
+    "--cache-max-bytes",
+    type=int,
+    default=DEFAULT_MAX_BYTES,
+    show_default=True,
+    help="Evict least recently used cache entries past this size.",
+)
+@click.option(
+    "--generated",
+    type=click.Path(exists=True, file_okay=False),
+    help="Merge the generate.tasks JSON files in this directory into each project.",
+)
+@alias_budget_option
+@no_alias_budget_option
+@core_schema_option
+@jobs_option
 @click.pass_context
-def lint(ctx: click.Context) -> None:
+def lint(
+    ctx: click.Context,
+    cache_dir: Optional[str],
+    cache_max_bytes: int,
+    generated: Optional[str],
+    alias_budget: int,
+    no_alias_budget: bool,
+    core_schema: bool,
+    jobs: int,
+) -> None:
     """Lint an Evergreen YAML file."""
     if ctx.obj["config"] is None:
         click.echo("-c/--config: a config file is required")
         sys.exit(1)
+    fragments: List[str] = []
+    if generated:
+        fragments = sorted(glob.glob(os.path.join(generated, "*.json")))
+    cache = None
+    if cache_dir:
+        cache = ParseCache(cache_dir, max_bytes=cache_max_bytes)
     ret = 0
     rules = RULES
     configs = {}
@@ -43,46 +120,132 @@ def lint(ctx: click.Context) -> None:
         configs[rule["rule"]] = {**configs[rule["rule"]], **rule}
         del configs[rule["rule"]]["rule"]
 
-    for yaml_file in filenames:
-        yaml_dict = load_file(yaml_file)
-        errors: Dict[str, List[LintError]] = {}
-        for rulename, rulecls in rules.items():
-            instance = rulecls()
-            if rulename in configs:
-                config = configs[rulename]
+    budget = None if no_alias_budget else alias_budget
+    literals = literals_required_by(rules.values())
+
+    def scan(content: Buffer) -> Set[str]:
+        return find_literals(literals, [content])
+
+    # include: paths are relative to the directory of the config file, just
+    # like the files list. Each file is scanned for the literals of the
+    # rules while it is open for parsing
+    with ProjectLoader(
+        root=ctx.obj["config_dir"],
+        cache=cache,
+        positions=True,
+        root_keys=root_keys_read_by(rules.values()),
+        alias_budget=budget,
+        intern=True,
+        core_schema=core_schema,
+        processes=jobs,
+        scan=scan,
+    ) as loader:
+        for yaml_file in filenames:
+            file_rules = rules
+            if snapshot.is_snapshot(yaml_file):
+                if generated:
+                    click.echo(
+                        f"--generated: cannot merge generated tasks into snapshot '{yaml_file}'"
+                    )
+                    sys.exit(1)
+                yaml_dict = snapshot.load(yaml_file, alias_budget=budget, core_schema=core_schema)
             else:
-                config = instance.defaults()
-            rule_errors = instance(config, yaml_dict)
-            if rule_errors:
-                errors[rulename] = rule_errors
-
-        err_count = 0
-        for error_list in errors.values():
-            err_count += len(error_list)
-
-        if not err_count:
-            print(f"0 errors found in '{yaml_file}'")
-        if err_count:
-            errors_plural = "error"
-            if err_count > 1:
-                errors_plural = "errors"
-            print(f"{err_count} {errors_plural} found in '{yaml_file}':")
-            print(
-                "For help resolving errors, see the helpful documentation at "
-                f"{ctx.obj['config']['help_url']}"
+                if generated:
+                    yaml_dict = loader.load_generated(yaml_file, fragments)
+                else:
+                    yaml_dict = loader.load(yaml_file)
+                # skip the rules that cannot report an error for this project
+                found: Set[str] = set()
+                for path in loader.sources[os.path.abspath(yaml_file)]:
+                    found |= loader.scanned[path]
+                file_rules = rules_that_may_fire(rules, found)
+            # visitor rules are run in one walk of the project
+            errors = run_rules(
+                {
+                    rulename: (rulecls(), configs[rulename])
+                    for rulename, rulecls in file_rules.items()
+                },
+                yaml_dict,
             )
-            print_nl = False
-            for rule, error_list in errors.items():
-                for error in error_list:
-                    if print_nl:
-                        print("")
-                    print(f"{rule}:", error)
-                    print_nl = True
-            ret = 1
+
+            err_count = 0
+            for error_list in errors.values():
+                err_count += len(error_list)
+
+            if not err_count:
+                print(f"0 errors found in '{yaml_file}'")
+            if err_count:
+                errors_plural = "error"
+                if err_count > 1:
+                    errors_plural = "errors"
+                print(f"{err_count} {errors_plural} found in '{yaml_file}':")
+                print(
+                    "For help resolving errors, see the helpful documentation at "
+                    f"{ctx.obj['config']['help_url']}"
+                )
+                print_nl = False
+                for rule, error_list in errors.items():
+                    for error in error_list:
+                        if print_nl:
+                            print("")
+                        print(f"{rule}:", error)
+                        print_nl = True
+                ret = 1
 
     sys.exit(ret)
 
 
+@main.command(name="compile")
+@click.argument("project_file", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False),
+    required=True,
+    help="Where to write the snapshot.",
+)
+@alias_budget_option
+@no_alias_budget_option
+@core_schema_option
+@jobs_option
+@click.pass_context
+def compile_(
+    ctx: click.Context,
+    project_file: str,
+    output: str,
+    alias_budget: int,
+    no_alias_budget: bool,
+    core_schema: bool,
+    jobs: int,
+) -> None:
+    """Compile an Evergreen YAML file into a snapshot.
+
+    List the snapshot in place of the YAML file in the config file's files
+    to lint it without parsing the YAML again. Linting fails if the YAML
+    file, or any file it includes, changed after it was compiled, or if the
+    alias budget or --core-schema differ.
+    """
+    budget = None if no_alias_budget else alias_budget
+    with ProjectLoader(
+        root=ctx.obj["config_dir"],
+        positions=True,
+        alias_budget=budget,
+        intern=True,
+        core_schema=core_schema,
+        processes=jobs,
+    ) as loader:
+        project = loader.load(project_file)
+        snapshot.write(
+            output,
+            project,
+            loader.sources[os.path.abspath(project_file)],
+            alias_budget=budget,
+            core_schema=core_schema,
+        )
+    click.echo(f"Compiled '{project_file}' to '{output}'")
+    sys.exit(0)
+
+
 @main.command()
 def stub() -> None:
     """Generate a stub configuration."""
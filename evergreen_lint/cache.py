@@ -0,0 +1,119 @@
+"""On-disk parse cache for evglint."""
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Any, Callable, Union
+
+import yaml
+
+from evergreen_lint.model import Buffer
+
+# Bump this whenever the layout of cached trees changes.
+CACHE_FORMAT = 2
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_SUFFIX = ".pickle"
+_MISSING = object()
+
+
+class ParseCache:
+    """Content-addressed cache of parsed yaml trees.
+
+    Entries are keyed by a hash of the raw file content, the PyYAML version,
+    and the cache format, so a stale entry can never be returned for a changed
+    file. Entries are written atomically so several processes can share one
+    directory, and the least recently used entries are evicted once the
+    directory grows past max_bytes. Only point this at a directory you trust:
+    entries are pickles.
+    """
+
+    def __init__(
+        self, directory: Union[str, os.PathLike], max_bytes: int = DEFAULT_MAX_BYTES
+    ) -> None:
+        self.directory = os.fspath(directory)
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(content: Buffer, salt: str = "") -> str:
+        """Return the cache key for the given raw file content.
+
+        :param salt: distinguishes entries produced by different parse modes
+        """
+        digest = hashlib.sha256()
+        digest.update(f"{CACHE_FORMAT}:{yaml.__version__}:{salt}:".encode())
+        digest.update(content)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the tree stored under key, or default on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                tree = pickle.load(fh)
+        except FileNotFoundError:
+            return default
+        except Exception:  # pylint: disable=broad-except
+            # a truncated or otherwise unreadable entry is just a miss
+            self._remove(path)
+            return default
+        try:
+            # mtime doubles as the LRU timestamp
+            os.utime(path)
+        except OSError:
+            pass
+        return tree
+
+    def put(self, key: str, tree: Any) -> None:
+        """Store tree under key, then evict old entries if over budget."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-", suffix=_SUFFIX)
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(tree, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.startswith(".") or not entry.name.endswith(_SUFFIX):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def load(self, content: Buffer, parse: Callable[[Buffer], Any], salt: str = "") -> Any:
+        """Return the cached tree for content, calling parse(content) on a miss."""
+        key = self.key(content, salt)
+        tree = self.get(key, _MISSING)
+        if tree is _MISSING:
+            tree = parse(content)
+            self.put(key, tree)
+        return tree
@@ -1,10 +1,34 @@
 """Helpers for iterating over the yaml dictionary."""
 import re
-from typing import Callable, Generator, List, Optional, Set, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from evergreen_lint.yamlhandler import document_memo, document_positions, position_of
 
 _CommandList = List[dict]
-_Commands = Union[dict, _CommandList]
-_Selector = Callable[[str, _Commands], Generator]
+# A command block: a single command or a list of commands
+Commands = Union[dict, _CommandList]
+_Selector = Callable[["Location", Commands], Generator]
+
+# Whether helpers keep what they derive from a loaded document, like the
+# results of the iterate_* helpers and the CommandIndex, for as long as the
+# document is alive. Turn it off to trade time for memory in batch runs that
+# keep many large documents around.
+MEMOIZE = True
+
+# Root keys read by walk_command_blocks, and so by every iterate_* helper
+COMMAND_BLOCKS = frozenset(["functions", "task_groups", "tasks", "pre", "post", "timeout"])
 
 
 def _in_dict_and_truthy(dictionary: dict, key: str) -> bool:
@@ -19,15 +43,251 @@ def iterate_commands(yaml_dict: dict) -> Generator[Tuple[str, dict], None, None]
     Yields a Tuple, 0: is a human friendly description of where the command
     block can be found, 1: a dict representing the command
     """
-    generator = iterate_commands_context(yaml_dict)
-    for (context, command, _) in generator:
-        yield (context, command)  # type: ignore
+    yield from _memoized_results(
+        yaml_dict,
+        "commands",
+        lambda: ((context, command) for context, command, _ in iterate_commands_context(yaml_dict)),
+    )
+
+
+def iterate_shared_commands(yaml_dict: dict) -> Generator[Tuple[List[str], dict], None, None]:
+    """Return a Generator that yields every distinct command once.
+
+    A command that is defined once behind a YAML anchor and referenced from
+    several places is the same object everywhere it is used, so rules can
+    check it once and report every place it is used in a single error, see
+    describe_uses.
+
+    :param dict yaml_dict: the parsed yaml dictionary
+
+    Yields a Tuple, 0: the human friendly descriptions of every place the
+    command is used, in the order iterate_commands finds them, 1: a dict
+    representing the command
+    """
+    uses: Dict[int, Tuple[List[str], dict]] = {}
+    for context, command in iterate_commands(yaml_dict):
+        use = uses.get(id(command))
+        if use is None:
+            uses[id(command)] = ([context], command)
+        else:
+            use[0].append(context)
+    yield from uses.values()
+
+
+class CommandIndex:
+    """Every command and function call in the yaml dict, grouped by name.
+
+    Built in one walk of the yaml dict, see command_index(), so rules looking
+    for one command find its uses without walking the whole project again.
+
+    commands maps each command name to the distinct commands of that name,
+    like iterate_shared_commands yields them. calls maps each function name
+    to its calls, like iterate_fn_calls_context yields them. Both are in the
+    order the iterate_* helpers find them.
+
+    The contexts are Locations rather than strings, so only the contexts of
+    the errors a rule reports are ever rendered, see describe_uses.
+    """
+
+    __slots__ = ("commands", "calls", "_order")
+
+    def __init__(self, yaml_dict: dict) -> None:
+        self.commands: Dict[str, List[Tuple[List["Location"], dict]]] = {}
+        self.calls: Dict[str, List[Tuple["Location", dict, Commands]]] = {}
+        # id of each distinct command -> the order it was found in
+        self._order: Dict[int, int] = {}
+        shared: Dict[int, Tuple[List["Location"], dict]] = {}
+        for context, node, commands, is_call in walk_command_blocks(yaml_dict, select_commands):
+            if is_call:
+                self.calls.setdefault(node["func"], []).append((context, node, commands))
+                continue
+            use = shared.get(id(node))
+            if use is not None:
+                use[0].append(context)
+                continue
+            use = ([context], node)
+            shared[id(node)] = use
+            self._order[id(node)] = len(self._order)
+            self.commands.setdefault(node["command"], []).append(use)
+
+    def commands_named(self, *names: str) -> List[Tuple[List["Location"], dict]]:
+        """Return the distinct commands with any of names, in the order
+        iterate_shared_commands yields them."""
+        if len(names) == 1:
+            return self.commands.get(names[0], [])
+        found = [use for name in names for use in self.commands.get(name, [])]
+        return sorted(found, key=lambda use: self._order[id(use[1])])
+
+
+def select_commands(prefix: "Location", commands: Commands) -> Generator:
+    """Selector for walk_command_blocks that yields (context, command or call,
+    commands, is_call) for every command and function call, with the contexts
+    iterate_commands_context and iterate_fn_calls_context give them."""
+    if isinstance(commands, dict):
+        if isinstance(commands.get("command"), str):
+            yield (prefix.at(SINGLE, None, commands), commands, commands, False)
+        if isinstance(commands.get("func"), str):
+            yield (prefix.at(SINGLE, commands["func"], commands), commands, commands, True)
+        return
+    for idx, command in enumerate(commands):
+        if not isinstance(command, dict):
+            continue
+        if isinstance(command.get("command"), str):
+            yield (prefix.at(idx, None, command), command, commands, False)
+        if isinstance(command.get("func"), str):
+            yield (prefix.at(idx, command["func"], command), command, commands, True)
+
+
+def command_index(yaml_dict: dict) -> CommandIndex:
+    """Return the CommandIndex of yaml_dict, built once per loaded document."""
+    return memoized(yaml_dict, CommandIndex, lambda: CommandIndex(yaml_dict))
+
+
+def memoized(yaml_dict: dict, key: Any, build: Callable[[], Any]) -> Any:
+    """Return build(), built once per loaded document and key while MEMOIZE is
+    on, see document_memo. Use a key of your own, like the class built."""
+    memo = document_memo(yaml_dict) if MEMOIZE else None
+    if memo is None:
+        return build()
+    key = (key, id(yaml_dict))
+    if key not in memo:
+        # keep the view alive, so that its id isn't reused
+        memo[key] = (yaml_dict, build())
+    return memo[key][1]
+
+
+def _memoized_results(yaml_dict: dict, key: Any, results: Callable[[], Iterable]) -> Iterable:
+    """Return the results of an iterate_* helper. They are kept in a tuple the
+    first time they are asked for, so later calls for the same document only
+    iterate the tuple."""
+    if not MEMOIZE or document_memo(yaml_dict) is None:
+        return results()
+    return memoized(yaml_dict, key, lambda: tuple(results()))
+
+
+def describe_uses(contexts: Sequence[Union[str, "Location"]]) -> str:
+    """Describe every place a shared command is used in one string."""
+    if len(contexts) == 1:
+        return str(contexts[0])
+    return f"{contexts[0]} [also used in: {'; '.join(map(str, contexts[1:]))}]"
+
+
+# Location.index of a command block that is a single command, not a list
+SINGLE = -1
+
+
+class Location:
+    """Where a command or command block is, as a human friendly description
+    like "Task 'compile', command 3 (function call: 'f_fetch')".
+
+    The text is only put together, and the source position looked up, on the
+    first str(). CommandIndex, the callbacks of visitor.Visitor and the
+    iterate_* helpers called with lazy=True give the Location itself, so rules
+    built on them only render the few contexts they report errors for.
+
+    Locations compare equal when they are for the same place, but never to
+    strings, compare str(location) for that.
+    """
+
+    __slots__ = ("kind", "name", "section", "index", "func", "node", "_text")
+
+    def __init__(
+        self,
+        kind: str,
+        name: Any,
+        section: Optional[str] = None,
+        index: Optional[int] = None,
+        func: Optional[str] = None,
+        node: Any = None,
+    ) -> None:
+        # "function", "task_group", "task" or "global"
+        self.kind = kind
+        self.name = name
+        # the command block of a task or task group, or of the project for
+        # "global", like "setup_task" or "pre"
+        self.section = section
+        # the command in the block, SINGLE or None for the block itself
+        self.index = index
+        # the function the command calls
+        self.func = func
+        # where the position of the location is looked up, see locate()
+        self.node = node
+        self._text: Optional[str] = None
+
+    def at(self, index: int, func: Optional[str], node: Any) -> "Location":
+        """Return the location of a command in this command block."""
+        return Location(self.kind, self.name, self.section, index, func, node)
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = locate(self.describe(), self.node)
+        return self._text
+
+    def describe(self) -> str:
+        """Return the text of the location, without its source position."""
+        if self.kind == "function":
+            text = f"Function '{self.name}'"
+        elif self.kind == "task_group":
+            text = f"task_group '{self.name}', {self.section}"
+        elif self.kind == "task":
+            text = f"Task '{self.name}'"
+            if self.section is not None:
+                text = f"{text}, {self.section}"
+        else:
+            text = f"Global {self.section}"
+        if self.index == SINGLE:
+            if self.func is None:
+                return f"{text}, command"
+            return f"{text}, function call '{self.func}'"
+        if self.index is not None:
+            text = f"{text}, command {self.index}"
+            if self.func is not None:
+                text = f"{text} (function call: '{self.func}')"
+        return text
+
+    def __repr__(self) -> str:
+        return repr(str(self))
+
+    def _key(self) -> Tuple[Any, ...]:
+        return (self.kind, self.name, self.section, self.index, self.func)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, Location):
+            return self._key() == other._key() and self.node is other.node
+        return NotImplemented
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+
+def locate(context: str, node: Any) -> str:
+    """Append the source position of node to context, if it is known."""
+    position = position_of(node)
+    if position is None:
+        return context
+    where = f"line {position.line}, column {position.column}"
+    if position.filename is not None:
+        where = f"{position.filename}, {where}"
+    return f"{context} ({where})"
 
 
 # pylint: disable=too-many-branches
-def _iterator(
-    yaml_dict: dict, selector: _Selector, skip_blocks: Optional[List[str]] = None
-) -> Generator[Tuple[str, _Commands, _Commands], None, None]:
+def walk_command_blocks(
+    yaml_dict: dict,
+    selector: _Selector,
+    skip_blocks: Optional[List[str]] = None,
+    definitions: Optional[Callable[[str, Any, Any], None]] = None,
+) -> Generator[Tuple[Any, ...], None, None]:
+    """Yield what selector yields for each command block of the yaml dict.
+
+    selector is called with the Location of each command block and the block,
+    see select_commands. The iterate_* helpers are built on this walk.
+
+    If given, definitions is called with ("function", name, definition),
+    ("task_group", name, task group) or ("task", name, task) before the
+    command blocks of each of them are visited, even if it has none.
+    """
+
     def _should_process(yaml_dict: dict, key: str) -> bool:
         if skip_blocks and key in skip_blocks:
             return False
@@ -36,92 +296,108 @@ def _iterator(
 
     if _should_process(yaml_dict, "functions"):
         for function, commands in yaml_dict["functions"].items():
+            if definitions is not None:
+                definitions("function", function, commands)
             if not commands:
                 continue
-            gen = selector(f"Function '{function}'", commands)
+            gen = selector(Location("function", function), commands)
             for out in gen:
                 yield out
 
     if _should_process(yaml_dict, "task_groups"):
         for task_group in yaml_dict["task_groups"]:
+            if definitions is not None:
+                definitions("task_group", task_group.get("name"), task_group)
             if _in_dict_and_truthy(task_group, "setup_task"):
                 gen = selector(
-                    f"task_group '{task_group['name']}', setup_task", task_group["setup_task"]
+                    Location("task_group", task_group["name"], "setup_task"),
+                    task_group["setup_task"],
                 )
                 for out in gen:
                     yield out
             if _in_dict_and_truthy(task_group, "teardown_task"):
                 gen = selector(
-                    f"task_group '{task_group['name']}', teardown_task", task_group["teardown_task"]
+                    Location("task_group", task_group["name"], "teardown_task"),
+                    task_group["teardown_task"],
                 )
                 for out in gen:
                     yield out
             if _in_dict_and_truthy(task_group, "setup_group"):
                 gen = selector(
-                    f"task_group '{task_group['name']}', setup_group", task_group["setup_group"]
+                    Location("task_group", task_group["name"], "setup_group"),
+                    task_group["setup_group"],
                 )
                 for out in gen:
                     yield out
             if _in_dict_and_truthy(task_group, "teardown_group"):
                 gen = selector(
-                    f"task_group '{task_group['name']}', teardown_group",
+                    Location("task_group", task_group["name"], "teardown_group"),
                     task_group["teardown_group"],
                 )
                 for out in gen:
                     yield out
             if _in_dict_and_truthy(task_group, "timeout"):
-                gen = selector(f"task_group '{task_group['name']}', timeout", task_group["timeout"])
+                gen = selector(
+                    Location("task_group", task_group["name"], "timeout"), task_group["timeout"]
+                )
                 for out in gen:
                     yield out
 
     if _should_process(yaml_dict, "tasks"):
         for task in yaml_dict["tasks"]:
+            if definitions is not None:
+                definitions("task", task.get("name"), task)
             if _in_dict_and_truthy(task, "commands"):
-                gen = selector(f"Task '{task['name']}'", task["commands"])
+                gen = selector(Location("task", task["name"]), task["commands"])
                 for out in gen:
                     yield out
             if _in_dict_and_truthy(task, "setup_task"):
-                gen = selector(f"Task '{task['name']}', setup_task", task["setup_task"])
+                gen = selector(Location("task", task["name"], "setup_task"), task["setup_task"])
                 for out in gen:
                     yield out
             if _in_dict_and_truthy(task, "teardown_task"):
-                gen = selector(f"Task '{task['name']}', teardown_task", task["teardown_task"])
+                gen = selector(
+                    Location("task", task["name"], "teardown_task"), task["teardown_task"]
+                )
                 for out in gen:
                     yield out
             if _in_dict_and_truthy(task, "setup_group"):
-                gen = selector(f"Task '{task['name']}', setup_group", task["setup_group"])
+                gen = selector(Location("task", task["name"], "setup_group"), task["setup_group"])
                 for out in gen:
                     yield out
             if _in_dict_and_truthy(task, "teardown_group"):
-                gen = selector(f"Task '{task['name']}', teardown_group", task["teardown_group"])
+                gen = selector(
+                    Location("task", task["name"], "teardown_group"), task["teardown_group"]
+                )
                 for out in gen:
                     yield out
             if _in_dict_and_truthy(task, "timeout"):
-                gen = selector(f"Task '{task['name']}', timeout", task["timeout"])
+                gen = selector(Location("task", task["name"], "timeout"), task["timeout"])
                 for out in gen:
                     yield out
 
     if _should_process(yaml_dict, "pre"):
-        gen = selector("Global pre", yaml_dict["pre"])
+        gen = selector(Location("global", None, "pre"), yaml_dict["pre"])
         for out in gen:
             yield out
     if _should_process(yaml_dict, "post"):
-        gen = selector("Global post", yaml_dict["post"])
+        gen = selector(Location("global", None, "post"), yaml_dict["post"])
         for out in gen:
             yield out
     if _should_process(yaml_dict, "timeout"):
-        gen = selector("Global timeout", yaml_dict["timeout"])
+        gen = selector(Location("global", None, "timeout"), yaml_dict["timeout"])
         for out in gen:
             yield out
 
 
 def iterate_commands_context(
-    yaml_dict: dict, skip_blocks: Optional[List[str]] = None
-) -> Generator[Tuple[str, _Commands, _Commands], None, None]:
+    yaml_dict: dict, skip_blocks: Optional[List[str]] = None, lazy: bool = False
+) -> Generator[Tuple[Union[str, Location], Commands, Commands], None, None]:
     """Return a Generator that yields commands from the yaml dict.
 
     :param dict yaml_dict: the parsed yaml dictionary
     :param list skip_blocks: skip root level keys in the yaml dictionary in list
+    :param bool lazy: yield Locations, rendered on str(), instead of strings
 
     Yields a Tuple, 0: is a human friendly description of where the command
     block can be found, 1: a dict representing the command, 2: a dict or list of
@@ -131,31 +407,50 @@ def iterate_commands_context(
 
     Functions will not be returned.
     """
+    positions = document_positions(yaml_dict) is not None
 
     def _helper(
-        prefix: str, commands: _Commands
-    ) -> Generator[Tuple[str, _Commands, _CommandList], None, None]:
+        prefix: Location, commands: Commands
+    ) -> Generator[Tuple[Union[str, Location], Commands, _CommandList], None, None]:
         # commands are either a singular dict (representing one command), or
         # a list of dicts
         if isinstance(commands, dict):
             # always yield functions
             if "command" in commands:
-                yield (f"{prefix}, command", commands, commands)  # type: ignore
+                if lazy:
+                    yield (prefix.at(SINGLE, None, commands), commands, commands)  # type: ignore
+                else:
+                    context = _render(f"{prefix.describe()}, command", commands, positions)
+                    yield (context, commands, commands)  # type: ignore
 
         else:
+            text = prefix.describe()
             for idx, command in enumerate(commands):
                 if "command" in command:
-                    yield (f"{prefix}, command {idx}", command, commands)
-
-    gen = _iterator(yaml_dict, _helper, skip_blocks)
-    for out in gen:
-        yield out
-
-
-def iterate_fn_calls_context(yaml_dict: dict) -> Generator[Tuple[str, dict, dict], None, None]:
+                    if lazy:
+                        yield (prefix.at(idx, None, command), command, commands)
+                    else:
+                        yield (
+                            _render(f"{text}, command {idx}", command, positions),
+                            command,
+                            commands,
+                        )
+
+    key: Any = ("commands_context", lazy)
+    if skip_blocks:
+        key = (*key, tuple(skip_blocks))
+    yield from _memoized_results(
+        yaml_dict, key, lambda: walk_command_blocks(yaml_dict, _helper, skip_blocks)
+    )
+
+
+def iterate_fn_calls_context(
+    yaml_dict: dict, lazy: bool = False
+) -> Generator[Tuple[Union[str, Location], dict, dict], None, None]:
     """Return a Generator that yields function calls from the yaml dict.
 
     :param dict yaml_dict: the parsed yaml dictionary
+    :param bool lazy: yield Locations, rendered on str(), instead of strings
 
     Yields a Tuple, 0: is a human friendly description of where the command
     block can be found, 1: a dict representing the command, 2: a dict or list of
@@ -165,26 +460,40 @@ def iterate_fn_calls_context(yaml_dict: dict) -> Generator[Tuple[str, dict, dict
 
     Function definitions will not be returned.
     """
+    positions = document_positions(yaml_dict) is not None
 
-    def _helper(prefix: str, commands: Union[dict, List[dict]]):
+    def _helper(prefix: Location, commands: Union[dict, List[dict]]):
         # commands are either a singular dict (representing one command), or
         # a list of dicts
         if isinstance(commands, dict):
             # only yield functions
             if "func" in commands:
-                yield (f"{prefix}, function call '{commands['func']}'", commands, commands)
+                func = commands["func"]
+                if lazy:
+                    yield (prefix.at(SINGLE, func, commands), commands, commands)
+                else:
+                    context = f"{prefix.describe()}, function call '{func}'"
+                    yield (_render(context, commands, positions), commands, commands)
         else:
+            text = prefix.describe()
             for idx, command in enumerate(commands):
                 if "func" in command:
-                    yield (
-                        f"{prefix}, command {idx} (function call: '{command['func']}')",
-                        command,
-                        commands,
-                    )
+                    func = command["func"]
+                    if lazy:
+                        yield (prefix.at(idx, func, command), command, commands)
+                    else:
+                        context = f"{text}, command {idx} (function call: '{func}')"
+                        yield (_render(context, command, positions), command, commands)
+
+    yield from _memoized_results(
+        yaml_dict, ("fn_calls_context", lazy), lambda: walk_command_blocks(yaml_dict, _helper)
+    )
 
-    gen = _iterator(yaml_dict, _helper)
-    for out in gen:
-        yield out  # type: ignore
+
+def _render(context: str, node: Any, positions: bool) -> str:
+    """Return context, with the source position of node if the document has
+    positions."""
+    return locate(context, node) if positions else context
 
 
 EVERGREEN_SCRIPT_RE = re.compile(r".*\/evergreen\/.*\.sh")
@@ -252,7 +561,9 @@ def match_expansions_write(command: dict) -> bool:
     return True
 
 
-def iterate_command_lists(yaml_dict: dict) -> Generator[Tuple[str, _Commands], None, None]:
+def iterate_command_lists(
+    yaml_dict: dict, lazy: bool = False
+) -> Generator[Tuple[Union[str, Location], Commands], None, None]:
     """Return a Generator that yields every single command list once.
 
     Command lists are defined as the list of commands found in tasks:
@@ -260,6 +571,7 @@ def iterate_command_lists(yaml_dict: dict) -> Generator[Tuple[str, _Commands], N
     globally: pre, post, timeout, and the definitions of functions.
 
     :param dict yaml_dict: the parsed yaml dictionary
+    :param bool lazy: yield Locations, rendered on str(), instead of strings
 
     Yields a Tuple, 0: is a human friendly description of where the command
     block can be found, representing the command, 1: a dict or list of
@@ -267,13 +579,18 @@ def iterate_command_lists(yaml_dict: dict) -> Generator[Tuple[str, _Commands], N
     example, when iterating over commands in a function, this will be the list
     of dicts or single dict that makes up the function definition.
     """
+    positions = document_positions(yaml_dict) is not None
 
-    def _helper(prefix: str, commands: Union[dict, List[dict]]):
-        yield (prefix, commands)
+    def _helper(prefix: Location, commands: Union[dict, List[dict]]):
+        prefix.node = commands
+        if lazy:
+            yield (prefix, commands)
+        else:
+            yield (_render(prefix.describe(), commands, positions), commands)
 
-    gen = _iterator(yaml_dict, _helper)
-    for out in gen:
-        yield out  # type: ignore
+    yield from _memoized_results(
+        yaml_dict, ("command_lists", lazy), lambda: walk_command_blocks(yaml_dict, _helper)
+    )
 
 
 def determine_dependencies_of_task_def(task_def: dict) -> Set[str]:
@@ -295,8 +612,8 @@ def determine_dependencies_of_task_def(task_def: dict) -> Set[str]:
     return dependencies
 
 
-_SHELL_COMMANDS = ["subprocess.exec", "subprocess.scripting", "shell.exec"]
+SHELL_COMMANDS = ("subprocess.exec", "subprocess.scripting", "shell.exec")
 
 
 def is_shell_command(command):
-    return command in _SHELL_COMMANDS
+    return command in SHELL_COMMANDS
@@ -0,0 +1,311 @@
+"""Evergreen include: support for evglint."""
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from evergreen_lint.cache import ParseCache
+from evergreen_lint.model import Buffer
+from evergreen_lint.yamlhandler import (
+    ALIAS_BUDGET,
+    ReadOnlyDict,
+    SourcePositions,
+    document_positions,
+    load_file,
+    unwrap,
+)
+
+# Root keys whose entries from every file are concatenated
+_LIST_KEYS = frozenset(
+    ["tasks", "task_groups", "buildvariants", "modules", "parameters", "containers", "variables"]
+)
+# Root keys whose entries from every file are combined, but must not collide
+_DICT_KEYS = frozenset(["functions"])
+# Every other root key may only be defined by one file
+
+
+class ProjectLoader:
+    """Load Evergreen projects, following their include: directives.
+
+    Included files are resolved relative to root (by default, the directory of
+    the project file that includes them) and loaded concurrently on a thread
+    pool. Each file is loaded at most once per ProjectLoader, so a file
+    included by several projects is only parsed once.
+
+    Files included from a module are skipped, the module's source isn't
+    available to the linter. Like Evergreen, includes are not followed from
+    included files.
+
+    With processes > 1, large files are also split at their root keys and
+    parsed on a process pool of that size, see yamlhandler.load().
+
+    With lazy=True, the entries of a project without includes are parsed when
+    they are first read, see yamlhandler.load(). Merging a project with the
+    files it includes reads every entry.
+
+    If scan is given, it is called with the raw content of each file while
+    the file is open for parsing, and what it returns is kept in scanned,
+    by absolute path.
+    """
+
+    def __init__(
+        self,
+        root: Optional[Union[str, os.PathLike]] = None,
+        cache: Optional[ParseCache] = None,
+        positions: bool = False,
+        root_keys: Optional[Collection[str]] = None,
+        max_workers: Optional[int] = None,
+        alias_budget: Optional[int] = ALIAS_BUDGET,
+        intern: bool = False,
+        core_schema: bool = False,
+        processes: int = 1,
+        lazy: bool = False,
+        scan: Optional[Callable[[Buffer], Any]] = None,
+    ) -> None:
+        self.root = None if root is None else os.fspath(root)
+        self.cache = cache
+        self.positions = positions
+        self.root_keys = root_keys
+        self.alias_budget = alias_budget
+        self.intern = intern
+        self.core_schema = core_schema
+        self.lazy = lazy
+        self.scan = scan
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="evglint-include")
+        self._processes: Optional[ProcessPoolExecutor] = None
+        if processes > 1:
+            self._processes = ProcessPoolExecutor(processes)
+        self._files: Dict[str, "Future[dict]"] = {}
+        self._lock = threading.Lock()
+        # absolute path of each loaded project -> the files it is made of
+        self.sources: Dict[str, List[str]] = {}
+        # absolute path of each loaded file -> what scan returned for it
+        self.scanned: Dict[str, Any] = {}
+
+    def __enter__(self) -> "ProjectLoader":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Shut down the thread and process pools."""
+        self._executor.shutdown()
+        if self._processes is not None:
+            self._processes.shutdown()
+
+    def _scan(self, path: str) -> Optional[Callable[[Buffer], None]]:
+        """Return the scan callback for load_file, which records the result
+        for path."""
+        scan = self.scan
+        if scan is None:
+            return None
+
+        def record(content: Buffer) -> None:
+            self.scanned[path] = scan(content)
+
+        return record
+
+    def _load_file(self, path: str, root_keys: Optional[Collection[str]]) -> "Future[dict]":
+        with self._lock:
+            future = self._files.get(path)
+            if future is None:
+                future = self._executor.submit(
+                    load_file,
+                    path,
+                    cache=self.cache,
+                    positions=self.positions,
+                    root_keys=root_keys,
+                    alias_budget=self.alias_budget,
+                    intern=self.intern,
+                    core_schema=self.core_schema,
+                    executor=self._processes,
+                    lazy=self.lazy,
+                    scan=self._scan(path),
+                )
+                self._files[path] = future
+            return future
+
+    def _load(self, project_file: str) -> Tuple[str, List[Tuple[str, dict]]]:
+        """Return the root includes of project_file are resolved against,
+        and the documents of project_file and the files it includes."""
+        root = self.root if self.root is not None else os.path.dirname(project_file)
+        root_keys = self.root_keys
+        if root_keys is not None:
+            root_keys = {*root_keys, "include"}
+
+        project = load_file(
+            project_file,
+            cache=self.cache,
+            positions=self.positions,
+            root_keys=root_keys,
+            alias_budget=self.alias_budget,
+            intern=self.intern,
+            core_schema=self.core_schema,
+            executor=self._processes,
+            lazy=self.lazy,
+            scan=self._scan(project_file),
+        )
+        includes: List[Tuple[str, "Future[dict]"]] = []
+        for idx, include in enumerate(project.get("include") or []):
+            if not isinstance(include, dict) or "filename" not in include:
+                raise RuntimeError(f"'{project_file}': include {idx}: a filename is required")
+            if include.get("module"):
+                continue
+            path = os.path.abspath(os.path.join(root, include["filename"]))
+            # included files don't need the include key
+            includes.append((path, self._load_file(path, self.root_keys)))
+
+        self.sources[project_file] = [project_file, *(path for path, _ in includes)]
+        files = [(project_file, project)]
+        for path, future in includes:
+            try:
+                files.append((path, future.result()))
+            except OSError as ex:
+                raise RuntimeError(f"'{project_file}': cannot include '{path}': {ex}") from ex
+        return root, files
+
+    def load(self, project_file: Union[str, os.PathLike]) -> dict:
+        """Load project_file and everything it includes as one project."""
+        root, files = self._load(os.path.abspath(project_file))
+        if len(files) == 1:
+            return files[0][1]
+        return merge(files, root)
+
+    def load_generated(
+        self,
+        project_file: Union[str, os.PathLike],
+        fragments: Iterable[Union[str, os.PathLike]],
+    ) -> dict:
+        """Load project_file, like load(), with the files written for its
+        generate.tasks commands merged in.
+
+        The fragments are loaded and merged one at a time, so only the merged
+        project, not the text of every fragment, is kept in memory. Evergreen
+        merges them the way it merges included files: their tasks are added,
+        and the tasks of a build variant that is already defined are added to
+        it.
+        """
+        project_file = os.path.abspath(project_file)
+        root, files = self._load(project_file)
+        merger = _Merger(root)
+        for path, doc in files:
+            merger.add(path, doc)
+        for fragment in fragments:
+            path = os.path.abspath(fragment)
+            try:
+                doc = load_file(
+                    path,
+                    positions=self.positions,
+                    root_keys=self.root_keys,
+                    alias_budget=self.alias_budget,
+                    intern=self.intern,
+                    core_schema=self.core_schema,
+                    scan=self._scan(path),
+                )
+            except OSError as ex:
+                raise RuntimeError(f"'{project_file}': cannot load '{path}': {ex}") from ex
+            merger.add(path, doc)
+            self.sources[project_file].append(path)
+        return merger.result()
+
+
+def merge(files: Iterable[Tuple[str, dict]], root: str) -> dict:
+    """Merge the documents of a project file (first) and its included files.
+
+    The merged document shares nodes with the documents it was built from.
+    """
+    merger = _Merger(root)
+    for path, doc in files:
+        merger.add(path, doc)
+    return merger.result()
+
+
+class _Merger:
+    """Merge the documents of a project one at a time, see merge()."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self.merged: Dict[str, Any] = {}
+        self.defined_in: Dict[str, str] = {}
+        self.tables: List[Optional[SourcePositions]] = []
+        self.filenames: List[Optional[str]] = []
+        # ids of the build variants that were copied for merging, see
+        # _merge_variants
+        self.copied: Set[int] = set()
+        self.variants: Dict[str, int] = {}
+
+    def add(self, path: str, doc: dict) -> None:
+        merged = self.merged
+        defined_in = self.defined_in
+        first = not self.tables
+        for key, value in unwrap(doc).items():
+            if key == "include" and not first:
+                # Evergreen doesn't follow includes from included files
+                continue
+            if key == "buildvariants":
+                self._merge_variants(merged.setdefault(key, []), value or [])
+            elif key in _LIST_KEYS:
+                merged.setdefault(key, []).extend(value or [])
+            elif key in _DICT_KEYS:
+                target = merged.setdefault(key, {})
+                for name, definition in (value or {}).items():
+                    if name in target:
+                        raise RuntimeError(
+                            f"{key} '{name}' is defined in both '{defined_in[f'{key}/{name}']}' "
+                            f"and '{path}'"
+                        )
+                    target[name] = definition
+                    defined_in[f"{key}/{name}"] = path
+            elif key in merged:
+                raise RuntimeError(f"'{key}' is defined in both '{defined_in[key]}' and '{path}'")
+            else:
+                merged[key] = value
+                defined_in[key] = path
+
+        self.tables.append(document_positions(doc))
+        # nodes from the project file itself are reported without a filename
+        self.filenames.append(None if first else os.path.relpath(path, self.root))
+
+    def result(self) -> dict:
+        positions = None
+        if len(self.tables) == 1:
+            positions = self.tables[0]
+        elif all(table is not None for table in self.tables):
+            positions = SourcePositions.merge(self.tables, self.filenames)  # type: ignore
+        return ReadOnlyDict(self.merged, positions=positions)
+
+    def _merge_variants(self, merged: List[Any], variants: List[Any]) -> None:
+        """Append variants to merged. Like Evergreen, a build variant that is
+        defined again only adds its tasks to the first definition."""
+        # variants are only merged into those of earlier files
+        added = {}
+        for variant in variants:
+            if not isinstance(variant, dict) or variant.get("name") not in self.variants:
+                if isinstance(variant, dict) and "name" in variant:
+                    added[variant["name"]] = len(merged)
+                merged.append(variant)
+                continue
+            idx = self.variants[variant["name"]]
+            first = merged[idx]
+            if id(first) in self.copied:
+                first["tasks"].extend(variant.get("tasks") or [])
+                continue
+            # copy, the first definition may be shared with other projects
+            merged[idx] = {
+                **first,
+                "tasks": [*(first.get("tasks") or []), *(variant.get("tasks") or [])],
+            }
+            self.copied.add(id(merged[idx]))
+        self.variants.update(added)
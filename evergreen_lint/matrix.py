@@ -0,0 +1,221 @@
+"""Expansion of Evergreen matrix build variants.
+
+A matrix is a buildvariants entry with a matrix_name instead of a name. It
+stands for one build variant per combination ("cell") of values of the axes
+named in its matrix_spec, except those matching its exclude_spec:
+
+    axes:
+    - id: os
+      values:
+      - id: linux
+        display_name: Linux
+        run_on: [ubuntu2204-large]
+        variables: {python: /usr/bin/python3}
+      - id: windows
+    - id: arch
+      values:
+      - id: x86_64
+      - id: arm64
+    buildvariants:
+    - matrix_name: tests
+      matrix_spec: {os: "*", arch: [x86_64, arm64]}
+      exclude_spec: {os: windows, arch: arm64}
+      display_name: ${os} ${arch}
+      tasks: [{name: unit}]
+      rules:
+      - if: {os: linux}
+        then: {add_tasks: [lint]}
+
+The variant of a cell is named the way Evergreen names it, such as
+"tests__os~linux_arch~x86_64".
+"""
+import re
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple
+
+from evergreen_lint.yamlhandler import ReadOnlyDict
+
+# Root keys read by iterate_variants
+VARIANT_BLOCKS = frozenset(["buildvariants", "axes"])
+
+# ${name} or ${name|default}
+_EXPANSION = re.compile(r"\$\{([^}|]+)(?:\|([^}]*))?\}")
+
+# Variant keys an axis value sets, keys that combine across axes are handled
+# separately
+_AXIS_VALUE_KEYS = ("run_on", "batchtime", "stepback")
+# Keys a rule's "then: set:" may override
+_SETTABLE_KEYS = ("display_name", "tags", "run_on", "modules", "batchtime", "stepback")
+
+# One selected value of an axis: (axis id, value id, value definition)
+_Value = Tuple[str, str, dict]
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return list(value) if isinstance(value, list) else [value]
+
+
+def _expand(value: Any, expansions: Dict[str, str]) -> Any:
+    """Expand ${name} in value, a string or a list of strings."""
+    if isinstance(value, list):
+        return [_expand(item, expansions) for item in value]
+    if not isinstance(value, str) or "${" not in value:
+        return value
+    return _EXPANSION.sub(
+        lambda match: str(expansions.get(match.group(1), match.group(2) or "")), value
+    )
+
+
+def _selected(selector: Any, axis: str, value_id: str) -> bool:
+    """Return True if a matrix_spec style selector allows value_id for axis."""
+    if axis not in selector:
+        return True
+    allowed = selector[axis]
+    return allowed == "*" or value_id in _as_list(allowed)
+
+
+def _matches(selectors: Any, cell: Dict[str, str]) -> bool:
+    """Return True if any of selectors (one selector or a list of them)
+    matches every axis of cell it names."""
+    for selector in _as_list(selectors):
+        if not isinstance(selector, dict):
+            continue
+        if all(axis in cell and _selected(selector, axis, cell[axis]) for axis in selector):
+            return True
+    return False
+
+
+class _Fragment:
+    """What the values of the first few axes of a cell contribute to its
+    variant. Cells that share those values share the fragment."""
+
+    __slots__ = ("cell", "display_names", "expansions", "tags", "modules", "settings")
+
+    def __init__(self) -> None:
+        self.cell: Dict[str, str] = {}
+        # axis id -> display name of its value
+        self.display_names: Dict[str, str] = {}
+        self.expansions: Dict[str, str] = {}
+        self.tags: List[Any] = []
+        self.modules: List[Any] = []
+        self.settings: Dict[str, Any] = {}
+
+    def extend(self, axis: str, value_id: str, value: dict) -> "_Fragment":
+        fragment = _Fragment()
+        fragment.cell = {**self.cell, axis: value_id}
+        fragment.display_names = {
+            **self.display_names,
+            axis: value.get("display_name") or value_id,
+        }
+        fragment.expansions = {**self.expansions, axis: value_id, **(value.get("variables") or {})}
+        fragment.tags = [*self.tags, *_as_list(value.get("tags"))]
+        fragment.modules = [*self.modules, *_as_list(value.get("modules"))]
+        fragment.settings = {
+            **self.settings,
+            **{key: value[key] for key in _AXIS_VALUE_KEYS if key in value},
+        }
+        return fragment
+
+
+def _axis_values(axes: Any) -> Dict[str, List[_Value]]:
+    values: Dict[str, List[_Value]] = {}
+    for axis in axes or []:
+        if not isinstance(axis, dict) or "id" not in axis:
+            continue
+        values[axis["id"]] = [
+            (axis["id"], value["id"], value)
+            for value in axis.get("values") or []
+            if isinstance(value, dict) and "id" in value
+        ]
+    return values
+
+
+def _fragments(axes: List[List[_Value]], prefix: _Fragment) -> Generator[_Fragment, None, None]:
+    """Yield the fragment of every cell of the product of axes, extending
+    prefix. The fragment of each combination of leading values is built once,
+    however many cells start with it."""
+    if not axes:
+        yield prefix
+        return
+    for axis, value_id, value in axes[0]:
+        yield from _fragments(axes[1:], prefix.extend(axis, value_id, value))
+
+
+def expand_matrix(matrix: dict, axes: Any) -> Generator[dict, None, None]:
+    """Yield the build variant of every cell of matrix, one at a time.
+
+    :param matrix: a buildvariants entry with a matrix_name
+    :param axes: the axes root key of the project
+    """
+    values = _axis_values(axes)
+    spec = matrix.get("matrix_spec") or {}
+    if any(axis not in values for axis in spec):
+        return
+    # the axes in the order the project declares them, as Evergreen orders
+    # them in variant names
+    selected = [
+        [value for value in axis_values if _selected(spec, axis, value[1])]
+        for axis, axis_values in values.items()
+        if axis in spec
+    ]
+    tasks = _as_list(matrix.get("tasks"))
+    for fragment in _fragments(selected, _Fragment()):
+        cell = fragment.cell
+        if _matches(matrix.get("exclude_spec"), cell):
+            continue
+        variant: Dict[str, Any] = {
+            key: value
+            for key, value in matrix.items()
+            if key not in ("matrix_name", "matrix_spec", "exclude_spec", "rules")
+        }
+        variant["name"] = f"{matrix['matrix_name']}__" + "_".join(
+            f"{axis}~{value_id}" for axis, value_id in cell.items()
+        )
+        variant.update(fragment.settings)
+        variant["tags"] = [*_as_list(matrix.get("tags")), *fragment.tags]
+        variant["modules"] = [*_as_list(matrix.get("modules")), *fragment.modules]
+        variant["expansions"] = {**(matrix.get("expansions") or {}), **fragment.expansions}
+        # in display names, ${axis} is the display name of the axis value
+        variant["display_name"] = _expand(
+            matrix.get("display_name"), fragment.display_names
+        ) or " ".join(fragment.display_names.values())
+        variant_tasks = tasks
+        for rule in _as_list(matrix.get("rules")):
+            if not isinstance(rule, dict) or not _matches(rule.get("if"), cell):
+                continue
+            then = rule.get("then") or {}
+            variant_tasks = _apply_task_rules(variant_tasks, then)
+            for key, value in (then.get("set") or {}).items():
+                if key in _SETTABLE_KEYS:
+                    variant[key] = value
+        variant["tasks"] = variant_tasks
+        for key in ("tags", "run_on", "modules"):
+            if key in variant:
+                variant[key] = _expand(variant[key], fragment.expansions)
+        yield ReadOnlyDict(variant)
+
+
+def _apply_task_rules(tasks: List[Any], then: dict) -> List[Any]:
+    removed = set(_as_list(then.get("remove_tasks")))
+    if removed:
+        tasks = [task for task in tasks if _task_name(task) not in removed]
+    added = _as_list(then.get("add_tasks"))
+    if added:
+        tasks = [*tasks, *({"name": task} if isinstance(task, str) else task for task in added)]
+    return tasks
+
+
+def _task_name(task: Any) -> Optional[str]:
+    return task.get("name") if isinstance(task, dict) else task
+
+
+def iterate_variants(yaml_dict: dict) -> Iterable[dict]:
+    """Yield every build variant of the yaml dict, with matrices expanded in
+    place, see expand_matrix."""
+    axes = yaml_dict.get("axes")
+    for variant in yaml_dict.get("buildvariants") or []:
+        if isinstance(variant, dict) and "matrix_name" in variant:
+            yield from expand_matrix(variant, axes)
+        else:
+            yield variant
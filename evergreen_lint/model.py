@@ -1,10 +1,14 @@
 """Type annotations for evglint."""
-from typing import List
+import mmap
+from typing import AbstractSet, List, Optional, Union
 
 from typing_extensions import Protocol
 
 LintError = str
 
+# Raw file content, read once and shared by everything that needs it
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
 
 class Rule(Protocol):
     @staticmethod
@@ -18,6 +22,20 @@ class Rule(Protocol):
         are guaranteed to exist when passed to __call__."""
         pass
 
+    @staticmethod
+    def root_keys() -> Optional[AbstractSet[str]]:
+        """Root keys of the yaml dict that __call__ reads, or None if it may
+        read any of them. Other root keys may be missing from the dict."""
+        return None
+
+    @staticmethod
+    def required_literals() -> AbstractSet[str]:
+        """Strings that all appear in the raw text of a project whenever
+        __call__ reports an error for it. The rule is not run on projects
+        missing any of them. Escape sequences in the yaml are not decoded,
+        so only declare literals that are always written as-is."""
+        return frozenset()
+
     def __call__(self, config: dict, yaml: dict) -> List[LintError]:
         """Rule definition."""
         pass
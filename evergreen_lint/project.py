@@ -0,0 +1,374 @@
+"""A typed model of a project, built once per loaded document.
+
+Rules that look tasks and build variants up by name, or read their tags and
+dependencies, query the ProjectModel of the project instead of each scanning
+the yaml dict again:
+
+    model = project_model(yaml)
+    for variant in model.iterate_variants():
+        for ref in variant.tasks:
+            task = model.tasks.get(ref.name)
+
+The functions each function calls make up the call graph of the project,
+see Function.calls, and ProjectModel.function_summary tells what running a
+function does to the expansions, through the whole graph.
+
+Entries that are not mappings or have no name are left out, Evergreen
+rejects them anyway. When a name is defined more than once, the first
+definition wins.
+"""
+from types import MappingProxyType
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from evergreen_lint.helpers import (
+    determine_dependencies_of_task_def,
+    match_expansions_update,
+    match_expansions_write,
+    match_subprocess_exec,
+    match_timeout_update,
+    memoized,
+)
+from evergreen_lint.matrix import VARIANT_BLOCKS, expand_matrix
+
+# Root keys read by ProjectModel
+PROJECT_BLOCKS = frozenset(["functions", "tasks", "task_groups"]) | VARIANT_BLOCKS
+
+_UNTAGGED: Mapping[str, Any] = MappingProxyType({})
+
+
+def _strings(value: Any) -> Tuple[str, ...]:
+    """Normalize a string or a list of strings, like tags or run_on, to a tuple
+    without repeats."""
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        return (value,)
+    return tuple(dict.fromkeys(item for item in value if isinstance(item, str)))
+
+
+def _commands(value: Any) -> Tuple["Command", ...]:
+    if isinstance(value, dict):
+        value = [value]
+    if not isinstance(value, list):
+        return ()
+    return tuple(Command(node) for node in value if isinstance(node, dict))
+
+
+class Command:
+    """A command or function call in a command list."""
+
+    __slots__ = ("name", "func", "params", "node")
+
+    def __init__(self, node: dict) -> None:
+        # the command, like "shell.exec", or None for a function call
+        self.name: Optional[str] = node.get("command")
+        # the function called, or None for a command
+        self.func: Optional[str] = node.get("func")
+        self.params: dict = node.get("params") or {}
+        self.node = node
+
+
+class Function:
+    """A function definition."""
+
+    __slots__ = ("name", "commands", "calls", "node")
+
+    def __init__(self, name: str, node: Any) -> None:
+        self.name = name
+        self.commands = _commands(node)
+        # the functions its commands call, the edges of the call graph of the
+        # project
+        self.calls = tuple(
+            dict.fromkeys(
+                command.func for command in self.commands if isinstance(command.func, str)
+            )
+        )
+        self.node = node
+
+
+class FunctionSummary:
+    """What running a function does to the expansions of a task, as far as
+    the commands after it are concerned, including what the functions it
+    runs do. See ProjectModel.function_summary."""
+
+    __slots__ = (
+        "writes_expansions",
+        "runs_evergreen_script",
+        "updates_expansions",
+        "updates_timeout",
+    )
+
+    def __init__(
+        self,
+        writes_expansions: bool = False,
+        runs_evergreen_script: bool = False,
+        updates_expansions: bool = False,
+        updates_timeout: bool = False,
+    ) -> None:
+        # expansions.write is called, and no update is left unwritten
+        self.writes_expansions = writes_expansions
+        # an evergreen script is run before any expansions.write
+        self.runs_evergreen_script = runs_evergreen_script
+        # expansions.update, or timeout.update, is not followed by
+        # expansions.write
+        self.updates_expansions = updates_expansions
+        self.updates_timeout = updates_timeout
+
+    @classmethod
+    def of_command(cls, command: dict) -> "FunctionSummary":
+        return cls(
+            writes_expansions=match_expansions_write(command),
+            runs_evergreen_script=match_subprocess_exec(command),
+            updates_expansions=match_expansions_update(command),
+            updates_timeout=match_timeout_update(command),
+        )
+
+    @classmethod
+    def of_sequence(cls, summaries: Iterable["FunctionSummary"]) -> "FunctionSummary":
+        """Summarize running what summaries summarize one after the other."""
+        written = runs_evergreen_script = updates_expansions = updates_timeout = False
+        for summary in summaries:
+            if summary.runs_evergreen_script and not written:
+                runs_evergreen_script = True
+            if summary.writes_expansions:
+                written = True
+                updates_expansions = updates_timeout = False
+            updates_expansions = updates_expansions or summary.updates_expansions
+            updates_timeout = updates_timeout or summary.updates_timeout
+        return cls(
+            writes_expansions=written and not (updates_expansions or updates_timeout),
+            runs_evergreen_script=runs_evergreen_script,
+            updates_expansions=updates_expansions,
+            updates_timeout=updates_timeout,
+        )
+
+
+# The summary of functions that are not defined, and of calls within a cycle
+_NO_EFFECT = FunctionSummary()
+
+
+class Task:
+    """A task definition."""
+
+    __slots__ = ("name", "tags", "depends_on", "commands", "functions", "node")
+
+    def __init__(self, node: dict) -> None:
+        self.name: str = node["name"]
+        self.tags = _strings(node.get("tags"))
+        # the names of the tasks it depends on
+        self.depends_on: FrozenSet[str] = frozenset(determine_dependencies_of_task_def(node))
+        self.commands = _commands(node.get("commands"))
+        # the functions its commands call, in order
+        self.functions = tuple(
+            command.func for command in self.commands if isinstance(command.func, str)
+        )
+        self.node = node
+
+
+class TaskGroup:
+    """A task group definition."""
+
+    __slots__ = ("name", "tasks", "node")
+
+    def __init__(self, node: dict) -> None:
+        self.name: str = node["name"]
+        self.tasks = _strings(node.get("tasks"))
+        self.node = node
+
+
+class TaskRef:
+    """A task, or task group, listed in a build variant."""
+
+    __slots__ = ("name", "run_on", "node")
+
+    def __init__(self, node: Any) -> None:
+        if isinstance(node, str):
+            node = {"name": node}
+        self.name: str = node["name"]
+        # the distros it runs on instead of those of the variant, if any
+        self.run_on: Optional[Tuple[str, ...]] = (
+            _strings(node["run_on"]) if node.get("run_on") is not None else None
+        )
+        self.node = node
+
+
+class Variant:
+    """A build variant, or a cell of a matrix, see ProjectModel.iterate_variants."""
+
+    __slots__ = ("name", "display_name", "tags", "run_on", "tasks", "task_names", "node")
+
+    def __init__(self, node: dict) -> None:
+        self.name: str = node["name"]
+        self.display_name: Optional[str] = node.get("display_name")
+        self.tags = _strings(node.get("tags"))
+        self.run_on = _strings(node.get("run_on"))
+        self.tasks = tuple(
+            TaskRef(ref)
+            for ref in node.get("tasks") or []
+            if isinstance(ref, str) or (isinstance(ref, dict) and "name" in ref)
+        )
+        self.task_names = frozenset(ref.name for ref in self.tasks)
+        self.node = node
+
+
+def _named(entries: Any) -> Iterable[dict]:
+    for entry in entries or []:
+        if isinstance(entry, dict) and isinstance(entry.get("name"), str):
+            yield entry
+
+
+class ProjectModel:
+    """The functions, tasks, task groups and build variants of a project, by
+    name, in the order they are defined.
+
+    variants only holds the build variants defined by name: matrices may
+    expand to many cells, so they are expanded on demand by
+    iterate_variants instead of being kept.
+
+    tasks_by_tag maps each tag to the tasks tagged with it, by name in the
+    order they are defined, so rules find what a tag applies to without
+    checking the tags of every task. The tags of a task are its tags
+    attribute.
+    """
+
+    __slots__ = (
+        "functions",
+        "tasks",
+        "task_groups",
+        "variants",
+        "tasks_by_tag",
+        "_summaries",
+        "_buildvariants",
+        "_axes",
+    )
+
+    def __init__(self, yaml_dict: dict) -> None:
+        self.functions: Dict[str, Function] = {}
+        self.tasks: Dict[str, Task] = {}
+        self.task_groups: Dict[str, TaskGroup] = {}
+        self.variants: Dict[str, Variant] = {}
+        self.tasks_by_tag: Dict[str, Dict[str, Task]] = {}
+        self._summaries: Optional[Dict[str, FunctionSummary]] = None
+        self._buildvariants = yaml_dict.get("buildvariants")
+        self._axes = yaml_dict.get("axes")
+
+        functions = yaml_dict.get("functions")
+        if isinstance(functions, dict):
+            for name, definition in functions.items():
+                self.functions[name] = Function(name, definition)
+        for node in _named(yaml_dict.get("tasks")):
+            if node["name"] not in self.tasks:
+                task = Task(node)
+                self.tasks[task.name] = task
+                for tag in task.tags:
+                    self.tasks_by_tag.setdefault(tag, {})[task.name] = task
+        for node in _named(yaml_dict.get("task_groups")):
+            if node["name"] not in self.task_groups:
+                self.task_groups[node["name"]] = TaskGroup(node)
+        for node in _named(self._buildvariants):
+            if node["name"] not in self.variants:
+                self.variants[node["name"]] = Variant(node)
+
+    def iterate_variants(self) -> Iterator[Variant]:
+        """Yield every build variant, in the order they are defined, with
+        matrices expanded one cell at a time.
+
+        Cells are not kept, each call expands the matrices again. When a
+        name is used more than once, only the first variant or cell with it
+        is yielded.
+        """
+        seen: Set[str] = set()
+        for node in self._buildvariants or []:
+            if not isinstance(node, dict):
+                continue
+            if "matrix_name" in node:
+                for cell in expand_matrix(node, self._axes):
+                    if cell["name"] not in seen:
+                        seen.add(cell["name"])
+                        yield Variant(cell)
+            elif isinstance(node.get("name"), str) and node["name"] not in seen:
+                seen.add(node["name"])
+                yield self.variants[node["name"]]
+
+    def function_summary(self, name: str) -> FunctionSummary:
+        """Return the summary of the function called name.
+
+        The summaries of all functions are computed on first use, in one pass
+        that summarizes each function after the functions it calls. Functions
+        that call each other in a cycle, directly or not, would never return,
+        so calls between them count as no effect; the summary of a function
+        only depends on the project, not on the order functions are visited.
+        """
+        if self._summaries is None:
+            self._summaries = self._summarize()
+        return self._summaries.get(name, _NO_EFFECT)
+
+    def _summarize(self) -> Dict[str, FunctionSummary]:
+        # Tarjan's algorithm, which finds the strongly connected components
+        # of the call graph, the cycles, callees first
+        summaries: Dict[str, FunctionSummary] = {}
+        order: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        stack: List[str] = []
+
+        def effect(command: Command, component: Set[str]) -> FunctionSummary:
+            if not isinstance(command.func, str):
+                return FunctionSummary.of_command(command.node)
+            if command.func in component:
+                return _NO_EFFECT
+            return summaries.get(command.func, _NO_EFFECT)
+
+        def summarize(component: Set[str]) -> None:
+            for name in component:
+                summaries[name] = FunctionSummary.of_sequence(
+                    effect(command, component) for command in self.functions[name].commands
+                )
+
+        def visit(name: str) -> None:
+            order[name] = low[name] = len(order)
+            stack.append(name)
+            for callee in self.functions[name].calls:
+                if callee not in self.functions:
+                    continue
+                if callee not in order:
+                    visit(callee)
+                    low[name] = min(low[name], low[callee])
+                elif callee not in summaries:
+                    # still on the stack, so in a cycle with name
+                    low[name] = min(low[name], order[callee])
+            if low[name] == order[name]:
+                component = {stack.pop()}
+                while name not in component:
+                    component.add(stack.pop())
+                summarize(component)
+
+        for name in self.functions:
+            if name not in order:
+                visit(name)
+        return summaries
+
+    def tasks_tagged(self, tag: str) -> Mapping[str, Task]:
+        """Return a read-only view of the tasks tagged with tag, by name."""
+        tasks = self.tasks_by_tag.get(tag)
+        return _UNTAGGED if tasks is None else MappingProxyType(tasks)
+
+    def tasks_in(self, variant: Variant) -> List[Task]:
+        """Return the tasks defined in the project that variant lists by
+        name, in the order it lists them."""
+        return [self.tasks[ref.name] for ref in variant.tasks if ref.name in self.tasks]
+
+
+def project_model(yaml_dict: dict) -> ProjectModel:
+    """Return the ProjectModel of yaml_dict, built once per loaded document."""
+    return memoized(yaml_dict, ProjectModel, lambda: ProjectModel(yaml_dict))
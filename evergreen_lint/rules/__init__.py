@@ -1,7 +1,8 @@
 """Lint rules."""
-from typing import Dict, Type
+import re
+from typing import AbstractSet, Collection, Dict, Iterable, Mapping, Optional, Set, Type
 
-from evergreen_lint.model import Rule
+from evergreen_lint.model import Buffer, Rule
 from evergreen_lint.rules.commonsense import (
     InvalidFunctionName,
     LimitKeyvalInc,
@@ -41,14 +42,93 @@ RULES: Dict[str, Type[Rule]] = {
     "forbid-tasks-with-tag-on-variants": ForbidTasksWithTagOnVariants,
     "enforce-tasks-distro-with-special-tag": EnforceTasksDistroWithSpecialTag,
 }
+
+
+def root_keys_read_by(rules: Iterable[Type[Rule]]) -> Optional[Set[str]]:
+    """Return the root keys read by any of the rules, or None if one of them
+    may read any key. See Rule.root_keys."""
+    keys: Set[str] = set()
+    for rule in rules:
+        rule_keys = rule.root_keys()
+        if rule_keys is None:
+            return None
+        keys |= rule_keys
+    return keys
+
+
+def _overlaps(first: bytes, second: bytes) -> bool:
+    """Return True if an occurrence of first may overlap one of second."""
+    if first in second or second in first:
+        return True
+    return any(
+        first.endswith(second[:idx]) or second.endswith(first[:idx])
+        for idx in range(1, min(len(first), len(second)))
+    )
+
+
+def find_literals(literals: Collection[str], contents: Iterable[Buffer]) -> Set[str]:
+    """Return the literals that appear in any of contents.
+
+    Each buffer is scanned once for all of the literals, until all of them
+    were found.
+    """
+    wanted = {literal: literal.encode() for literal in literals}
+    if not wanted:
+        return set()
+    # longest first, so that a literal is matched rather than its prefix
+    pattern = re.compile(
+        b"|".join(re.escape(raw) for raw in sorted(wanted.values(), key=len, reverse=True))
+    )
+    found: Set[bytes] = set()
+    for content in contents:
+        for match in pattern.finditer(content):
+            found.add(match.group())
+            if len(found) == len(wanted):
+                return set(wanted)
+        # matches don't overlap, so a literal that only appears inside, or
+        # across the edge of, another one's match must be looked for on its own
+        for raw in set(wanted.values()) - found:
+            if any(_overlaps(raw, other) for other in found) and re.search(re.escape(raw), content):
+                found.add(raw)
+    return {literal for literal, raw in wanted.items() if raw in found}
+
+
+def literals_required_by(rules: Iterable[Type[Rule]]) -> Set[str]:
+    """Return the literals required by any of the rules. See
+    Rule.required_literals."""
+    literals: Set[str] = set()
+    for rule in rules:
+        literals |= rule.required_literals()
+    return literals
+
+
+def rules_that_may_fire(
+    rules: Mapping[str, Type[Rule]], found: AbstractSet[str]
+) -> Dict[str, Type[Rule]]:
+    """Return the rules whose required literals were all found in the raw
+    text of a project's files, see find_literals()."""
+    return {rulename: rule for rulename, rule in rules.items() if rule.required_literals() <= found}
+
+
 # Thoughts on Writing Rules
 # - see .helpers for reliable iteration helpers
+# - Prefer subclassing visitor.VisitorRule over implementing __call__: visitor
+#   rules get callbacks for the tasks, functions, commands, etc. they check,
+#   and all of them are run in a single walk of the project
 # - Do not assume a key exists, unless it's been mentioned here
+# - Declare the root keys your rule reads in root_keys(); root keys no enabled
+#   rule reads are not loaded at all
+# - Declare literals that always appear in the yaml when your rule reports an
+#   error in required_literals(), e.g. the name of the command it checks. The
+#   rule isn't run at all on projects without them
 # - Do not allow exceptions to percolate outside of the rule function
 # - YAML anchors are not available. Unless you want to write your own yaml
 #   parser, or fork adrienverge/yamllint, abandon all hope on that idea you have.
-# - Anchors are basically copy and paste, so you might see "duplicate" errors
-#   that originate from the same anchor, but are reported in multiple locations
+# - Aliases are the same object as their anchored node though. Use
+#   helpers.iterate_shared_commands to check a shared command once and report
+#   all of its uses in one error, instead of one "duplicate" error per use
+# - To look for commands or function calls by name, use helpers.command_index.
+#   It walks the project once, however many rules use it
 
 # Evergreen YAML Root Structure Reference
 # Unless otherwise mentioned, the key is optional. You can infer the
@@ -70,4 +150,6 @@ RULES: Dict[str, Type[Rule]] = {
 # task_groups: List[dict]
 # modules: List[dict]
 # buildvariants: List[dict], key is always present
+#   Entries with a matrix_name instead of a name are matrices over the axes
+#   root key, use matrix.iterate_variants to see the variants they expand to
 # parameters: List[dict]
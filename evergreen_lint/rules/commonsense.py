@@ -1,8 +1,14 @@
 import re
-from typing import List
-
-from evergreen_lint.helpers import is_shell_command, iterate_commands
+from typing import AbstractSet, Any, List
+
+from evergreen_lint.helpers import (
+    COMMAND_BLOCKS,
+    SHELL_COMMANDS,
+    command_index,
+    describe_uses,
+)
 from evergreen_lint.model import LintError, Rule
+from evergreen_lint.visitor import Visitor, VisitorRule
 
 
 class LimitKeyvalInc(Rule):
@@ -16,6 +22,14 @@ class LimitKeyvalInc(Rule):
     def defaults() -> dict:
         return {"limit": 0}
 
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return COMMAND_BLOCKS
+
+    @staticmethod
+    def required_literals() -> AbstractSet[str]:
+        return {"keyval.inc"}
+
     def __call__(self, config: dict, yaml: dict) -> List[LintError]:
         def _out_message(context: str) -> LintError:
             return (
@@ -25,10 +39,10 @@ class LimitKeyvalInc(Rule):
 
         out: List[LintError] = []
         count = 0
-        for context, command in iterate_commands(yaml):
-            if "command" in command and command["command"] == "keyval.inc":
-                out.append(_out_message(context))
-                count += 1
+        for contexts, _ in command_index(yaml).commands_named("keyval.inc"):
+            out.append(_out_message(describe_uses(contexts)))
+            # every use runs the command
+            count += len(contexts)
 
         if count <= config["limit"]:
             return []
@@ -46,6 +60,14 @@ class ShellExecExplicitShell(Rule):
     def defaults() -> dict:
         return {}
 
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return COMMAND_BLOCKS
+
+    @staticmethod
+    def required_literals() -> AbstractSet[str]:
+        return {"shell.exec"}
+
     def __call__(self, config: dict, yaml: dict) -> List[LintError]:
         def _out_message(context: str) -> LintError:
             return (
@@ -55,10 +77,9 @@ class ShellExecExplicitShell(Rule):
             )
 
         out: List[LintError] = []
-        for context, command in iterate_commands(yaml):
-            if "command" in command and command["command"] == "shell.exec":
-                if "params" not in command or "shell" not in command["params"]:
-                    out.append(_out_message(context))
+        for contexts, command in command_index(yaml).commands_named("shell.exec"):
+            if "params" not in command or "shell" not in command["params"]:
+                out.append(_out_message(describe_uses(contexts)))
 
         return out
 
@@ -74,6 +95,14 @@ class NoWorkingDirOnShell(Rule):
     def defaults() -> dict:
         return {}
 
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return COMMAND_BLOCKS
+
+    @staticmethod
+    def required_literals() -> AbstractSet[str]:
+        return {"working_dir"}
+
     def __call__(self, config: dict, yaml: dict) -> List[LintError]:
         def _out_message(context: str, cmd: str) -> LintError:
             return (
@@ -83,15 +112,28 @@ class NoWorkingDirOnShell(Rule):
             )
 
         out: List[LintError] = []
-        for context, command in iterate_commands(yaml):
-            if "command" in command and is_shell_command(command["command"]):
-                if "params" in command and "working_dir" in command["params"]:
-                    out.append(_out_message(context, command["command"]))
+        for contexts, command in command_index(yaml).commands_named(*SHELL_COMMANDS):
+            if "params" in command and "working_dir" in command["params"]:
+                out.append(_out_message(describe_uses(contexts), command["command"]))
 
         return out
 
 
-class InvalidFunctionName(Rule):
+class _InvalidFunctionNameVisitor(Visitor):
+    def __init__(self, regex: str) -> None:
+        self.regex = regex
+        self.function_name_re = re.compile(regex)
+        self.out: List[LintError] = []
+
+    def function(self, name: str, definition: Any) -> None:
+        if not self.function_name_re.fullmatch(name):
+            self.out.append(f"Function '{name}' must have a name matching '{self.regex}'")
+
+    def errors(self) -> List[LintError]:
+        return self.out
+
+
+class InvalidFunctionName(VisitorRule):
     """Enforce naming convention on functions."""
 
     @staticmethod
@@ -102,22 +144,12 @@ class InvalidFunctionName(Rule):
     def defaults() -> dict:
         return {"regex": "^f_[a-z][A-Za-z0-9_]*"}
 
-    def __call__(self, config: dict, yaml: dict) -> List[LintError]:
-        FUNCTION_NAME = config["regex"]
-        FUNCTION_NAME_RE = re.compile(FUNCTION_NAME)
-
-        def _out_message(context: str) -> LintError:
-            return f"Function '{context}' must have a name matching '{FUNCTION_NAME}'"
-
-        if "functions" not in yaml:
-            return []
-
-        out: List[LintError] = []
-        for fname in yaml["functions"].keys():
-            if not FUNCTION_NAME_RE.fullmatch(fname):
-                out.append(_out_message(fname))
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return {"functions"}
 
-        return out
+    def visitor(self, config: dict) -> Visitor:
+        return _InvalidFunctionNameVisitor(config["regex"])
 
 
 class NoShellExec(Rule):
@@ -131,6 +163,14 @@ class NoShellExec(Rule):
     def defaults() -> dict:
         return {}
 
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return COMMAND_BLOCKS
+
+    @staticmethod
+    def required_literals() -> AbstractSet[str]:
+        return {"shell.exec"}
+
     def __call__(self, config: dict, yaml: dict) -> List[LintError]:
         def _out_message(context: str) -> LintError:
             return (
@@ -140,9 +180,8 @@ class NoShellExec(Rule):
             )
 
         out: List[LintError] = []
-        for context, command in iterate_commands(yaml):
-            if "command" in command and command["command"] == "shell.exec":
-                out.append(_out_message(context))
+        for contexts, _ in command_index(yaml).commands_named("shell.exec"):
+            out.append(_out_message(describe_uses(contexts)))
         return out
 
 
@@ -155,6 +194,14 @@ class NoMultilineExpansionsUpdate(Rule):
     def defaults() -> dict:
         return {}
 
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return COMMAND_BLOCKS
+
+    @staticmethod
+    def required_literals() -> AbstractSet[str]:
+        return {"expansions.update"}
+
     def __call__(self, config: dict, yaml: dict) -> List[LintError]:
         """Forbid multi-line values in expansion.updates parameters."""
 
@@ -167,10 +214,9 @@ class NoMultilineExpansionsUpdate(Rule):
             )
 
         out: List[LintError] = []
-        for context, command in iterate_commands(yaml):
-            if "command" in command and command["command"] == "expansions.update":
-                if "params" in command and "updates" in command["params"]:
-                    for idx, item in enumerate(command["params"]["updates"]):
-                        if "value" in item and "\n" in item["value"]:
-                            out.append(_out_message(context, idx))
+        for contexts, command in command_index(yaml).commands_named("expansions.update"):
+            if "params" in command and "updates" in command["params"]:
+                for idx, item in enumerate(command["params"]["updates"]):
+                    if "value" in item and "\n" in item["value"]:
+                        out.append(_out_message(describe_uses(contexts), idx))
         return out
@@ -1,10 +1,40 @@
-from typing import List, cast
+from typing import AbstractSet, List
 
 from evergreen_lint.helpers import determine_dependencies_of_task_def
-from evergreen_lint.model import LintError, Rule
+from evergreen_lint.model import LintError
+from evergreen_lint.visitor import Visitor, VisitorRule
 
 
-class DependencyForFunc(Rule):
+class _DependencyForFuncVisitor(Visitor):
+    ERROR_MSG = (
+        "Missing dependency. The task '{task_name}' expects '{dependency}' to be "
+        "listed as a dependency due to the use of the '{function}' func."
+    )
+
+    def __init__(self, dependency_map: dict) -> None:
+        self.dependency_map = dependency_map
+        self.failed_checks: List[LintError] = []
+
+    def task(self, task: dict) -> None:
+        actual_dependencies = determine_dependencies_of_task_def(task)
+        funcs = [cmd["func"] for cmd in task.get("commands", []) if "func" in cmd]
+        for func in funcs:
+            expected_dependencies = self.dependency_map.get(func, [])
+            unmet_dependenices = [
+                dep for dep in expected_dependencies if dep not in actual_dependencies
+            ]
+            self.failed_checks.extend(
+                [
+                    self.ERROR_MSG.format(task_name=task["name"], dependency=dep, function=func)
+                    for dep in unmet_dependenices
+                ]
+            )
+
+    def errors(self) -> List[LintError]:
+        return self.failed_checks
+
+
+class DependencyForFunc(VisitorRule):
 
     """
     Define dependencies that are required if a function is used.
@@ -27,26 +57,9 @@ class DependencyForFunc(Rule):
     def defaults() -> dict:
         return {"dependencies": {}}
 
-    def __call__(self, config: dict, yaml: dict) -> List[LintError]:
-        error_msg = (
-            "Missing dependency. The task '{task_name}' expects '{dependency}' to be "
-            "listed as a dependency due to the use of the '{function}' func."
-        )
-        failed_checks = []
-        dependency_map = config.get("dependencies", {})
-        for task_def in cast(List, yaml.get("tasks")):
-            actual_dependencies = determine_dependencies_of_task_def(task_def)
-            funcs = [cmd["func"] for cmd in task_def.get("commands", []) if "func" in cmd]
-            for func in funcs:
-                expected_dependencies = dependency_map.get(func, [])
-                unmet_dependenices = [
-                    dep for dep in expected_dependencies if dep not in actual_dependencies
-                ]
-                failed_checks.extend(
-                    [
-                        error_msg.format(task_name=task_def["name"], dependency=dep, function=func)
-                        for dep in unmet_dependenices
-                    ]
-                )
-
-        return failed_checks
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return {"tasks"}
+
+    def visitor(self, config: dict) -> Visitor:
+        return _DependencyForFuncVisitor(config.get("dependencies", {}))
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import re
-from typing import List, NamedTuple, Optional, cast
+from typing import AbstractSet, Dict, List, NamedTuple, Optional
 
-from evergreen_lint.model import LintError, Rule
+from evergreen_lint.model import LintError
+from evergreen_lint.visitor import Visitor, VisitorRule
 
 
 class TagGroupsConfig(NamedTuple):
@@ -27,7 +28,89 @@ class EnforceTagsForTasksConfig(NamedTuple):
         )
 
 
-class EnforceTagsForTasks(Rule):
+class _EnforceTagsForTasksVisitor(Visitor):
+    TAG_REGEX_MISMATCH_ERROR_MSG = (
+        "Task tags requirement is not met. The task '{task_name}' has tags that matches"
+        " '{tag_regex}' tag regex of '{group_name}' tag group and is not listed in the"
+        " group: {tag_list}. Please remove the following tag(s) from the task"
+        " '{task_name}': {tags_to_remove}."
+    )
+    NUM_OF_TAGS_MISMATCH_ERROR_MSG = (
+        "Task tags requirement is not met. The task '{task_name}' should have no less"
+        " than '{min_num_of_tags}' and no more than '{max_num_of_tags}' tag(s) of"
+        " '{group_name}' tag group list: {tag_list}. Found tags: {matching_tags}."
+        " Please add/remove tag(s) of the tag group list to/from the task '{task_name}'"
+        " to match the requirement."
+    )
+
+    def __init__(self, rule_config: EnforceTagsForTasksConfig) -> None:
+        self.rule_config = rule_config
+        self.failed_checks: List[LintError] = []
+        # for each tag group, its tag list as a set and whether each tag seen
+        # so far matches its tag regex, so that every distinct tag is matched
+        # once however many tasks have it
+        self.tag_lists = [frozenset(group.tag_list) for group in rule_config.tag_groups]
+        self.regex_matches: List[Dict[str, bool]] = [{} for _ in rule_config.tag_groups]
+
+    @staticmethod
+    def _matches_regex(regex_matches: Dict[str, bool], tag_regex: str, tag: str) -> bool:
+        matches = regex_matches.get(tag)
+        if matches is None:
+            matches = regex_matches[tag] = re.match(tag_regex, tag) is not None
+        return matches
+
+    def task(self, task_def: dict) -> None:
+        actual_tags = task_def.get("tags")
+        actual_tags_set = set()
+        if actual_tags is not None:
+            actual_tags_set = set(actual_tags)
+
+        for tag_group_config, tag_list, regex_matches in zip(
+            self.rule_config.tag_groups, self.tag_lists, self.regex_matches
+        ):
+            matching_tag_regex_tags = actual_tags_set
+            if tag_group_config.tag_regex is not None:
+                matching_tag_regex_tags = {
+                    t
+                    for t in actual_tags_set
+                    if self._matches_regex(regex_matches, tag_group_config.tag_regex, t)
+                }
+
+            matching_tag_list_tags = matching_tag_regex_tags & tag_list
+            tags_to_remove = matching_tag_regex_tags - matching_tag_list_tags
+            num_of_matching_tags = len(matching_tag_list_tags)
+
+            if tags_to_remove:
+                self.failed_checks.append(
+                    self.TAG_REGEX_MISMATCH_ERROR_MSG.format(
+                        task_name=task_def["name"],
+                        tag_regex=tag_group_config.tag_regex,
+                        group_name=tag_group_config.group_name,
+                        tag_list=tag_group_config.tag_list,
+                        tags_to_remove=list(tags_to_remove),
+                    )
+                )
+
+            if (
+                num_of_matching_tags < tag_group_config.min_num_of_tags
+                or num_of_matching_tags > tag_group_config.max_num_of_tags
+            ):
+                self.failed_checks.append(
+                    self.NUM_OF_TAGS_MISMATCH_ERROR_MSG.format(
+                        task_name=task_def["name"],
+                        min_num_of_tags=tag_group_config.min_num_of_tags,
+                        max_num_of_tags=tag_group_config.max_num_of_tags,
+                        group_name=tag_group_config.group_name,
+                        tag_list=tag_group_config.tag_list,
+                        matching_tags=list(matching_tag_list_tags),
+                    )
+                )
+
+    def errors(self) -> List[LintError]:
+        return self.failed_checks
+
+
+class EnforceTagsForTasks(VisitorRule):
     """
     Enforce tags presence in task definitions.
 
@@ -58,67 +141,9 @@ class EnforceTagsForTasks(Rule):
     def defaults() -> dict:
         return {"tag_groups": []}
 
-    def __call__(self, config: dict, yaml: dict) -> List[LintError]:
-        tag_regex_mismatch_error_msg = (
-            "Task tags requirement is not met. The task '{task_name}' has tags that matches"
-            " '{tag_regex}' tag regex of '{group_name}' tag group and is not listed in the"
-            " group: {tag_list}. Please remove the following tag(s) from the task"
-            " '{task_name}': {tags_to_remove}."
-        )
-        num_of_tags_mismatch_error_msg = (
-            "Task tags requirement is not met. The task '{task_name}' should have no less"
-            " than '{min_num_of_tags}' and no more than '{max_num_of_tags}' tag(s) of"
-            " '{group_name}' tag group list: {tag_list}. Found tags: {matching_tags}."
-            " Please add/remove tag(s) of the tag group list to/from the task '{task_name}'"
-            " to match the requirement."
-        )
-
-        failed_checks = []
-        rule_config = EnforceTagsForTasksConfig.from_config_dict(config)
-
-        for task_def in cast(List, yaml.get("tasks", [])):
-            actual_tags = task_def.get("tags")
-            actual_tags_set = set()
-            if actual_tags is not None:
-                actual_tags_set = set(actual_tags)
-
-            for tag_group_config in rule_config.tag_groups:
-                matching_tag_regex_tags = actual_tags_set
-                if tag_group_config.tag_regex is not None:
-                    matching_tag_regex_tags = {
-                        t for t in actual_tags_set if re.match(tag_group_config.tag_regex, t)
-                    }
-
-                matching_tag_list_tags = {
-                    t for t in matching_tag_regex_tags if t in tag_group_config.tag_list
-                }
-                tags_to_remove = matching_tag_regex_tags - matching_tag_list_tags
-                num_of_matching_tags = len(matching_tag_list_tags)
-
-                if tags_to_remove:
-                    failed_checks.append(
-                        tag_regex_mismatch_error_msg.format(
-                            task_name=task_def["name"],
-                            tag_regex=tag_group_config.tag_regex,
-                            group_name=tag_group_config.group_name,
-                            tag_list=tag_group_config.tag_list,
-                            tags_to_remove=list(tags_to_remove),
-                        )
-                    )
-
-                if (
-                    num_of_matching_tags < tag_group_config.min_num_of_tags
-                    or num_of_matching_tags > tag_group_config.max_num_of_tags
-                ):
-                    failed_checks.append(
-                        num_of_tags_mismatch_error_msg.format(
-                            task_name=task_def["name"],
-                            min_num_of_tags=tag_group_config.min_num_of_tags,
-                            max_num_of_tags=tag_group_config.max_num_of_tags,
-                            group_name=tag_group_config.group_name,
-                            tag_list=tag_group_config.tag_list,
-                            matching_tags=list(matching_tag_list_tags),
-                        )
-                    )
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return {"tasks"}
 
-        return failed_checks
+    def visitor(self, config: dict) -> Visitor:
+        return _EnforceTagsForTasksVisitor(EnforceTagsForTasksConfig.from_config_dict(config))
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import re
-from typing import List, NamedTuple, Optional, cast
+from typing import AbstractSet, List, NamedTuple, Optional
 
-from evergreen_lint.model import LintError, Rule
+from evergreen_lint.matrix import VARIANT_BLOCKS
+from evergreen_lint.model import LintError
+from evergreen_lint.visitor import Visitor, VisitorRule
 
 
 class VariantConfig(NamedTuple):
@@ -41,7 +43,68 @@ class EnforceTagsForVariantsConfig(NamedTuple):
         )
 
 
-class EnforceTagsForVariants(Rule):
+class _EnforceTagsForVariantsVisitor(Visitor):
+    VARIANT_IS_NOT_TAGGED_ERROR_MSG = (
+        "Build variant '{variant}' should be tagged with '{tag}',"
+        " because build variant configuration matches the following:"
+        " {variant_config}"
+    )
+    VARIANT_CONFIG_NOT_MATCHES_ERROR_MSG = (
+        "Tag '{tag}' should be removed from build variant '{variant}'"
+        " because build variant configuration does not match the following:"
+        " {variant_config}"
+    )
+
+    def __init__(self, rule_config: EnforceTagsForVariantsConfig) -> None:
+        self.rule_config = rule_config
+        self.failed_checks: List[LintError] = []
+
+    def variant(self, variant_def: dict) -> None:
+        for cfg in self.rule_config.tags:
+            variant_is_tagged = cfg.tag_name in variant_def.get("tags", [])
+
+            variant_config_checks: List[bool] = []
+            if cfg.variant_config.name_regex:
+                variant_config_checks.append(
+                    re.match(
+                        cfg.variant_config.name_regex,
+                        variant_def["name"],
+                    )
+                    is not None
+                )
+            if cfg.variant_config.display_name_regex:
+                variant_config_checks.append(
+                    re.match(
+                        cfg.variant_config.display_name_regex,
+                        variant_def["display_name"],
+                    )
+                    is not None
+                )
+            variant_config_matches = all(variant_config_checks)
+
+            if variant_config_matches and not variant_is_tagged:
+                self.failed_checks.append(
+                    self.VARIANT_IS_NOT_TAGGED_ERROR_MSG.format(
+                        tag=cfg.tag_name,
+                        variant=variant_def["name"],
+                        variant_config=cfg.variant_config.print(),
+                    )
+                )
+
+            if variant_is_tagged and not variant_config_matches:
+                self.failed_checks.append(
+                    self.VARIANT_CONFIG_NOT_MATCHES_ERROR_MSG.format(
+                        tag=cfg.tag_name,
+                        variant=variant_def["name"],
+                        variant_config=cfg.variant_config.print(),
+                    )
+                )
+
+    def errors(self) -> List[LintError]:
+        return self.failed_checks
+
+
+class EnforceTagsForVariants(VisitorRule):
     """
     Enforce tags presence in variant definitions.
 
@@ -69,60 +132,9 @@ class EnforceTagsForVariants(Rule):
     def defaults() -> dict:
         return {"tags": []}
 
-    def __call__(self, config: dict, yaml: dict) -> List[LintError]:
-        variant_is_not_tagged_error_msg = (
-            "Build variant '{variant}' should be tagged with '{tag}',"
-            " because build variant configuration matches the following:"
-            " {variant_config}"
-        )
-        variant_config_not_matches_error_msg = (
-            "Tag '{tag}' should be removed from build variant '{variant}'"
-            " because build variant configuration does not match the following:"
-            " {variant_config}"
-        )
-
-        failed_checks = []
-        rule_config = EnforceTagsForVariantsConfig.from_config_dict(config)
-
-        for variant_def in cast(List, yaml.get("buildvariants", [])):
-            for cfg in rule_config.tags:
-                variant_is_tagged = cfg.tag_name in variant_def.get("tags", [])
-
-                variant_config_checks: List[bool] = []
-                if cfg.variant_config.name_regex:
-                    variant_config_checks.append(
-                        re.match(
-                            cfg.variant_config.name_regex,
-                            variant_def["name"],
-                        )
-                        is not None
-                    )
-                if cfg.variant_config.display_name_regex:
-                    variant_config_checks.append(
-                        re.match(
-                            cfg.variant_config.display_name_regex,
-                            variant_def["display_name"],
-                        )
-                        is not None
-                    )
-                variant_config_matches = all(variant_config_checks)
-
-                if variant_config_matches and not variant_is_tagged:
-                    failed_checks.append(
-                        variant_is_not_tagged_error_msg.format(
-                            tag=cfg.tag_name,
-                            variant=variant_def["name"],
-                            variant_config=cfg.variant_config.print(),
-                        )
-                    )
-
-                if variant_is_tagged and not variant_config_matches:
-                    failed_checks.append(
-                        variant_config_not_matches_error_msg.format(
-                            tag=cfg.tag_name,
-                            variant=variant_def["name"],
-                            variant_config=cfg.variant_config.print(),
-                        )
-                    )
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return VARIANT_BLOCKS
 
-        return failed_checks
+    def visitor(self, config: dict) -> Visitor:
+        return _EnforceTagsForVariantsVisitor(EnforceTagsForVariantsConfig.from_config_dict(config))
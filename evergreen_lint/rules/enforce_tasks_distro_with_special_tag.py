@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import re
-from typing import List, NamedTuple, Set
+from typing import AbstractSet, Dict, List, NamedTuple, Sequence
 
+from evergreen_lint.matrix import VARIANT_BLOCKS
 from evergreen_lint.model import LintError, Rule
+from evergreen_lint.project import project_model
 
 
 class TagConfig(NamedTuple):
@@ -41,47 +43,49 @@ class EnforceTasksDistroWithSpecialTag(Rule):
     def defaults() -> dict:
         return {"tags": []}
 
-    def _get_tasks_with_tag(self, yaml: dict, tag_name: str) -> Set[str]:
-        """Find all tasks that have the specified tag."""
-        tagged_tasks = set()
-        for task in yaml.get("tasks", []):
-            if tag_name in task.get("tags", []):
-                tagged_tasks.add(task["name"])
-        return tagged_tasks
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return {"tasks"} | VARIANT_BLOCKS
 
-    def _check_distro_requirements(self, distros: List[str], allowed_distro_regex: str) -> bool:
+    def _check_distro_requirements(self, distros: Sequence[str], allowed_distro_regex: str) -> bool:
         """Check if any of the distros match the allowed pattern."""
         pattern = re.compile(allowed_distro_regex)
         return any(pattern.match(distro) for distro in distros)
 
     def __call__(self, config: dict, yaml: dict) -> List[LintError]:
-        failed_checks = []
         rule_config = EnforceTasksDistroWithSpecialTagConfig.from_config_dict(config)
-
-        for tag_config in rule_config.tags:
-            # Find all tasks with the special tag
-            tagged_tasks = self._get_tasks_with_tag(yaml, tag_config.task_tag_name)
-
-            # Check each buildvariant
-            for variant in yaml.get("buildvariants", []):
-                variant_name = variant["name"]
-                variant_distros = variant.get("run_on", [])
-
-                # Check each task in the variant
-                for task in variant.get("tasks", []):
-                    task_name = task["name"]
-                    if task_name not in tagged_tasks:
-                        continue
-
-                    # Get task-specific run_on if it exists, otherwise use variant's run_on
-                    task_distros = task.get("run_on", variant_distros)
-
-                    if not self._check_distro_requirements(
-                        task_distros, tag_config.allowed_distro_regex
-                    ):
-                        failed_checks.append(
-                            f"Task '{task_name}' in variant '{variant_name}' is tagged with"
-                            f" '{tag_config.task_tag_name}' but is set to run on incompatible"
-                            f" distros: {task_distros}. It should run on a bigger host"
+        model = project_model(yaml)
+
+        # the configs of each tag, and the errors of each config, so that
+        # the variants are gone through once however many tags there are
+        configs_by_tag: Dict[str, List[int]] = {}
+        for idx, tag_config in enumerate(rule_config.tags):
+            if model.tasks_tagged(tag_config.task_tag_name):
+                configs_by_tag.setdefault(tag_config.task_tag_name, []).append(idx)
+        failed_checks: List[List[LintError]] = [[] for _ in rule_config.tags]
+        if not configs_by_tag:
+            return []
+
+        for variant in model.iterate_variants():
+            # Check each task in the variant
+            for task in variant.tasks:
+                task_def = model.tasks.get(task.name)
+                if task_def is None:
+                    continue
+                for tag in task_def.tags:
+                    for idx in configs_by_tag.get(tag, []):
+                        tag_config = rule_config.tags[idx]
+                        # Get task-specific run_on if it exists, otherwise use variant's run_on
+                        task_distros = list(
+                            task.run_on if task.run_on is not None else variant.run_on
                         )
-        return failed_checks
+
+                        if not self._check_distro_requirements(
+                            task_distros, tag_config.allowed_distro_regex
+                        ):
+                            failed_checks[idx].append(
+                                f"Task '{task.name}' in variant '{variant.name}' is tagged with"
+                                f" '{tag_config.task_tag_name}' but is set to run on incompatible"
+                                f" distros: {task_distros}. It should run on a bigger host"
+                            )
+        return [error for errors in failed_checks for error in errors]
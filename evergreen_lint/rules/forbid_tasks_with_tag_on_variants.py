@@ -1,8 +1,10 @@
 from __future__ import annotations
 
-from typing import List, NamedTuple, Optional, Set
+from typing import AbstractSet, Dict, List, NamedTuple, Optional
 
+from evergreen_lint.matrix import VARIANT_BLOCKS
 from evergreen_lint.model import LintError, Rule
+from evergreen_lint.project import project_model
 
 
 class TagConfig(NamedTuple):
@@ -48,38 +50,37 @@ class ForbidTasksWithTagOnVariants(Rule):
         return {"tags": []}
 
     @staticmethod
-    def _get_variant_tasks(variant: dict) -> Set[str]:
-        # Extract task names from a variant
-        return {task["name"] for task in variant.get("tasks", [])}
+    def root_keys() -> AbstractSet[str]:
+        return {"tasks"} | VARIANT_BLOCKS
 
     def __call__(self, config: dict, yaml: dict) -> List[LintError]:
-        failed_checks = []
         rule_config = ForbidTasksWithTagOnVariantsConfig.from_config_dict(config)
-        for tag_config in rule_config.tags:
-            forbidden_tasks: Set[str] = set()
-            # Identify tasks with the forbidden tag
-            for task in yaml.get("tasks", []):
-                if tag_config.forbidden_task_tag in task.get("tags", []):
-                    forbidden_tasks.add(task["name"])
-
-            # Check each buildvariant
-            for variant in yaml.get("buildvariants", []):
-                variant_name = variant["name"]
-                variant_tags = set(variant.get("tags", []))
-
-                if tag_config.variant_tag_name not in variant_tags:
-                    continue
-
-                variant_tasks = self._get_variant_tasks(variant)
-
-                # Check each task in the variant
-                for task_name in variant_tasks:
-                    if task_name in forbidden_tasks and (
-                        tag_config.ignored_tasks is None
-                        or task_name not in tag_config.ignored_tasks
-                    ):
-                        failed_checks.append(
-                            f"Task '{task_name}' is tagged with '{tag_config.forbidden_task_tag}' and therefore should be removed from '{variant_name}' build variant, because the build variant is tagged with '{tag_config.variant_tag_name}'"
-                        )
-
-        return failed_checks
+        model = project_model(yaml)
+
+        # the configs of each variant tag, and the errors of each config, so
+        # that the variants are gone through once however many tags there are
+        configs_by_tag: Dict[str, List[int]] = {}
+        for idx, tag_config in enumerate(rule_config.tags):
+            # Only configs with tasks with the forbidden tag can fail
+            if model.tasks_tagged(tag_config.forbidden_task_tag):
+                configs_by_tag.setdefault(tag_config.variant_tag_name, []).append(idx)
+        if not configs_by_tag:
+            return []
+        failed_checks: List[List[LintError]] = [[] for _ in rule_config.tags]
+
+        # Check each buildvariant with the tag
+        for variant in model.iterate_variants():
+            for tag in variant.tags:
+                for idx in configs_by_tag.get(tag, []):
+                    tag_config = rule_config.tags[idx]
+                    forbidden_tasks = model.tasks_tagged(tag_config.forbidden_task_tag)
+                    # Check each task in the variant
+                    for task_name in dict.fromkeys(ref.name for ref in variant.tasks):
+                        if task_name in forbidden_tasks and (
+                            tag_config.ignored_tasks is None
+                            or task_name not in tag_config.ignored_tasks
+                        ):
+                            failed_checks[idx].append(
+                                f"Task '{task_name}' is tagged with '{tag_config.forbidden_task_tag}' and therefore should be removed from '{variant.name}' build variant, because the build variant is tagged with '{tag_config.variant_tag_name}'"
+                            )
+        return [error for errors in failed_checks for error in errors]
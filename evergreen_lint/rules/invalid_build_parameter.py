@@ -1,5 +1,5 @@
 import re
-from typing import List
+from typing import AbstractSet, List
 
 from evergreen_lint.model import LintError, Rule
 
@@ -15,6 +15,10 @@ class InvalidBuildParameter(Rule):
     def defaults() -> dict:
         return {"regex": "[a-z][a-z0-9_]*", "require-description": True}
 
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return {"parameters"}
+
     def __call__(self, config: dict, yaml: dict) -> List[LintError]:
         BUILD_PARAMETER = config["regex"]
         BUILD_PARAMETER_RE = re.compile(BUILD_PARAMETER)
@@ -1,8 +1,14 @@
-from typing import List, Optional, Set, Union
+from typing import AbstractSet, List, Optional, Set, Union, cast
 
 from evergreen_lint import helpers as helpers
-from evergreen_lint.helpers import iterate_command_lists, iterate_fn_calls_context
+from evergreen_lint.helpers import (
+    COMMAND_BLOCKS,
+    Location,
+    iterate_command_lists,
+    iterate_fn_calls_context,
+)
 from evergreen_lint.model import LintError, Rule
+from evergreen_lint.project import FunctionSummary, project_model
 
 
 class RequiredExpansionsWrite(Rule):
@@ -17,6 +23,10 @@ class RequiredExpansionsWrite(Rule):
     def defaults() -> dict:
         return {"regex": ".*\\/evergreen\\/.*\\.sh"}
 
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return COMMAND_BLOCKS
+
     # pylint: disable=too-many-branches,too-many-locals,too-many-statements
     def __call__(self, config: dict, yaml: dict) -> List[LintError]:
 
@@ -82,46 +92,50 @@ class RequiredExpansionsWrite(Rule):
         #   params:
         #     file: expansions.yml
         #     redacted: true
-        # A function containing the above as a dict definition is treated as
-        # equivalent to calling expansions.write
+        # Calling a function that makes the above call, in its own definition or
+        # in the functions it calls, and leaves no expansions.update or
+        # timeout.update unwritten, is treated as equivalent to calling
+        # expansions.write
         #
         # 5. Furthermore, above mentions of subprocess.exec MUST be applied only to
         # subprocess.exec invocations that call scripts in the evergreen directory.
         #
-        # 6. And because that's not complicated enough, any functions that are
-        # dict-defined with subprocess.exec must be treated as equivalent to
-        # subprocess.exec on its own.
+        # 6. And because that's not complicated enough, any functions that call
+        # subprocess.exec before writing the expansions must be treated as
+        # equivalent to subprocess.exec on its own.
         #
-        # 7. Functions that call expansions.update, and are dict-defined MUST
-        # require an expansions.update call after they are called, regardless of
-        # syntax
+        # 7. Functions that call expansions.update, without an expansions.write
+        # after it, MUST require an expansions.write call after they are called,
+        # regardless of syntax
         #
         # 8. timeout.update can also affect expansion values, and all the rules
         # above need to applied equally to timeout.update
 
+        # What calling each function does, including the functions it calls
+        # in turn (Resolutions 4, 6, 7 and 8)
+        model = project_model(yaml)
+
         # These are functions that invoke expansions.write in a dict defintion,
-        # as described in Resolution 4.
-        expansions_write_fns: Set[str] = set()
+        # suggested in place of expansions.write in the messages (Resolution 4).
+        expansions_write_fns: List[str] = []
         # These are functions whose invocations must be checked for Resolution 1.
         subprocess_exec_fns: Set[str] = set()
-        # And these are for Resolution 7
-        expansions_update_fns: Set[str] = set()
-        # and Resolution 8
-        timeout_update_fns: Set[str] = set()
 
         def _out_message_dangerous_function(context: str) -> LintError:
-            return f"{context} cannot safely take arguments. Call expansions.write with params: file: expansions.yml; redacted: true, (or use one of these functions: {list(expansions_write_fns)}) in the function, or do not pass arguments to it."  # noqa: E501
+            return f"{context} cannot safely take arguments. Call expansions.write with params: file: expansions.yml; redacted: true, (or use one of these functions: {expansions_write_fns}) in the function, or do not pass arguments to it."  # noqa: E501
 
         def _out_message_expansions_update(
             context: str, fname: str = "expansions.update"
         ) -> LintError:
-            return f"{context} is an {fname} command that is not immediately followed by an expansions.write call. Always call expansions.write with params: file: expansions.yml; redacted: true, (or use one of these functions: {list(expansions_write_fns)}) after calling {fname}."  # noqa: E501
+            return f"{context} is an {fname} command that is not immediately followed by an expansions.write call. Always call expansions.write with params: file: expansions.yml; redacted: true, (or use one of these functions: {expansions_write_fns}) after calling {fname}."  # noqa: E501
 
         def _out_message_subprocess(context: str) -> LintError:
-            return f"{context} calls an evergreen shell script without a preceding expansions.write call. Always call expansions.write with params: file: expansions.yml; redacted: true, (or use one of these functions: {list(expansions_write_fns)}) before calling an evergreen shell script via subprocess.exec."  # noqa: E501
+            return f"{context} calls an evergreen shell script without a preceding expansions.write call. Always call expansions.write with params: file: expansions.yml; redacted: true, (or use one of these functions: {expansions_write_fns}) before calling an evergreen shell script via subprocess.exec."  # noqa: E501
 
-        def _is_one_command_fn(body: Union[dict, List[dict]], ctx: Optional[str] = None) -> bool:
-            if ctx is not None and "Function" not in ctx:
+        def _is_one_command_fn(
+            body: Union[dict, List[dict]], location: Optional[Location] = None
+        ) -> bool:
+            if location is not None and location.kind != "function":
                 return False
             if isinstance(body, dict):
                 return True
@@ -129,25 +143,22 @@ class RequiredExpansionsWrite(Rule):
                 return len(body) == 1
             return False
 
+        def _called(command: dict) -> FunctionSummary:
+            if isinstance(command.get("func"), str):
+                return model.function_summary(command["func"])
+            return FunctionSummary()
+
         def _is_expansions_write_or_fn(command: dict) -> bool:
-            return helpers.match_expansions_write(command) or (
-                "func" in command and command["func"] in expansions_write_fns
-            )
+            return helpers.match_expansions_write(command) or _called(command).writes_expansions
 
         def _is_subprocess_exec_or_fn(command: dict) -> bool:
-            return helpers.match_subprocess_exec(command) or (
-                "func" in command and command["func"] in subprocess_exec_fns
-            )
+            return helpers.match_subprocess_exec(command) or _called(command).runs_evergreen_script
 
         def _is_expansions_update_or_fn(command: dict) -> bool:
-            return helpers.match_expansions_update(command) or (
-                "func" in command and command["func"] in expansions_update_fns
-            )
+            return helpers.match_expansions_update(command) or _called(command).updates_expansions
 
         def _is_timeout_update_or_fn(command: dict) -> bool:
-            return helpers.match_timeout_update(command) or (
-                "func" in command and command["func"] in timeout_update_fns
-            )
+            return helpers.match_timeout_update(command) or _called(command).updates_timeout
 
         def _context_add_fn(context: str, command: Optional[dict]) -> str:
             if command and "func" in command:
@@ -155,7 +166,14 @@ class RequiredExpansionsWrite(Rule):
 
             return context
 
-        def _check_command_list(context: str, commands: Union[dict, List[dict]]) -> List[LintError]:
+        def _command_context(location: Location, idx: int, command: dict) -> str:
+            # the position, if known, is that of the command and goes last
+            context = _context_add_fn(location.at(idx, None, command).describe(), command)
+            return helpers.locate(context, command)
+
+        def _check_command_list(
+            location: Location, commands: Union[dict, List[dict]]
+        ) -> List[LintError]:
             out: List[LintError] = []
             first_subprocess: Optional[int] = None
             first_subprocess_cmd: Optional[dict] = None
@@ -174,11 +192,7 @@ class RequiredExpansionsWrite(Rule):
                     and _is_subprocess_exec_or_fn(command)
                     and first_exp_write is None
                 ):
-                    out.append(
-                        _out_message_subprocess(
-                            _context_add_fn(f"{context}, command {idx}", command)
-                        )
-                    )
+                    out.append(_out_message_subprocess(_command_context(location, idx, command)))
                     # only warn for the first instance of this per command list.
                     # Once you resolve the first instance, the Resolution 3 and
                     # Resolution 8 checks below handle the rest of the errors.
@@ -192,13 +206,13 @@ class RequiredExpansionsWrite(Rule):
                         if _is_expansions_update_or_fn(command):
                             out.append(
                                 _out_message_expansions_update(
-                                    _context_add_fn(f"{context}, command {idx}", command)
+                                    _command_context(location, idx, command)
                                 )
                             )
                         elif _is_timeout_update_or_fn(command):
                             out.append(
                                 _out_message_expansions_update(
-                                    _context_add_fn(f"{context}, command {idx}", command),
+                                    _command_context(location, idx, command),
                                     "timeout.update",
                                 )
                             )
@@ -211,8 +225,8 @@ class RequiredExpansionsWrite(Rule):
             ):
                 out.append(
                     _out_message_subprocess(
-                        _context_add_fn(
-                            f"{context}, command {first_subprocess}", first_subprocess_cmd
+                        _command_context(
+                            location, first_subprocess, cast(dict, first_subprocess_cmd)
                         )
                     )
                 )
@@ -233,25 +247,21 @@ class RequiredExpansionsWrite(Rule):
             # assemble the list of functions whose bodies are the expected
             # expansions.write call. (Resolution 4)
             if helpers.match_expansions_write(func_body):
-                expansions_write_fns.add(func_name)
+                expansions_write_fns.append(func_name)
             # assemble the list of functions that must never be called
             # with arguments (Resolution 1)
             elif helpers.match_subprocess_exec(func_body):
                 subprocess_exec_fns.add(func_name)
-            # Resolution 7
-            elif helpers.match_expansions_update(func_body):
-                expansions_update_fns.add(func_name)
-            # Resolution 8
-            elif helpers.match_timeout_update(func_body):
-                timeout_update_fns.add(func_name)
-
-        for context, commands in iterate_command_lists(yaml):
-            if _is_one_command_fn(commands, context):
+
+        # the Locations are only rendered for the errors reported
+        for context, commands in iterate_command_lists(yaml, lazy=True):
+            location = cast(Location, context)
+            if _is_one_command_fn(commands, location):
                 continue
-            out += _check_command_list(context, commands)
+            out += _check_command_list(location, commands)
 
-        for context, command, _ in iterate_fn_calls_context(yaml):
+        for context, command, _ in iterate_fn_calls_context(yaml, lazy=True):
             if command["func"] in subprocess_exec_fns and "vars" in command and command["vars"]:
-                out.append(_out_message_dangerous_function(context))
+                out.append(_out_message_dangerous_function(str(context)))
 
         return out
@@ -1,6 +1,8 @@
-from typing import Dict, List, Optional, Set, cast
+from typing import AbstractSet, Dict, List, Optional, Set, cast
 
+from evergreen_lint.matrix import VARIANT_BLOCKS
 from evergreen_lint.model import LintError, Rule
+from evergreen_lint.project import project_model
 
 TasksSet = Set[str]
 TaskVariantMapping = List[Dict[str, List[str]]]
@@ -68,8 +70,8 @@ class TasksForVariants(Rule):
         return {"task-variant-mappings": {}}
 
     @staticmethod
-    def _get_task_set_from_list(task_list):
-        return {task["name"] for task in task_list}
+    def root_keys() -> AbstractSet[str]:
+        return VARIANT_BLOCKS
 
     def __call__(self, config: dict, yaml: dict) -> List[LintError]:
         error_msg = (
@@ -86,10 +88,10 @@ class TasksForVariants(Rule):
         if variants is None:
             failed_checks.append("No variants defined in Evergreen config")
 
-        for variant_obj in variants:
-            variant = variant_obj["name"]
+        for variant_obj in project_model(yaml).iterate_variants():
+            variant = variant_obj.name
             expected_tasks = config_wrapper.tasks_for_variant(variant)
-            actual_tasks = self._get_task_set_from_list(variant_obj["tasks"])
+            actual_tasks = set(variant_obj.task_names)
 
             if expected_tasks is None:
                 continue
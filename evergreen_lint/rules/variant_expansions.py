@@ -1,9 +1,11 @@
 from __future__ import annotations
 
 import re
-from typing import Any, Dict, List, NamedTuple, Optional, cast
+from typing import AbstractSet, Any, Dict, List, NamedTuple, Optional
 
-from evergreen_lint.model import LintError, Rule
+from evergreen_lint.matrix import VARIANT_BLOCKS
+from evergreen_lint.model import LintError
+from evergreen_lint.visitor import Visitor, VisitorRule
 
 
 def compile_optional_regex(regex: Optional[str]) -> Optional[re.Pattern]:
@@ -100,7 +102,94 @@ class VariantExpansionsConfig(NamedTuple):
         )
 
 
-class VariantExpansions(Rule):
+class _VariantExpansionsVisitor(Visitor):
+    REQUIRE_EXPANSION_ERROR_MSG = (
+        "Build variant expansion '{expansion_name}' should be added to '{variant}'"
+        " build variant, because build variant configuration matches the following:"
+        " {variant_config}"
+    )
+    PROHIBIT_EXPANSION_ERROR_MSG = (
+        "Build variant expansion '{expansion_name}' should be removed from '{variant}'"
+        " build variant, because build variant configuration matches the following:"
+        " {variant_config}"
+    )
+    REQUIRE_EXPANSION_WITH_VALUE_ERROR_MSG = (
+        "Build variant expansion '{expansion_name}' value should match"
+        " '{expansion_value_regex}' pattern on '{variant}' build variant, because"
+        " build variant configuration matches the following:"
+        " {variant_config}"
+    )
+    PROHIBIT_EXPANSION_WITH_VALUE_ERROR_MSG = (
+        "Build variant expansion '{expansion_name}' value should not match"
+        " '{expansion_value_regex}' pattern on '{variant}' build variant, because"
+        " build variant configuration matches the following:"
+        " {variant_config}"
+    )
+
+    def __init__(self, rule_config: VariantExpansionsConfig) -> None:
+        self.rule_config = rule_config
+        self.failed_checks: List[LintError] = []
+
+    def variant(self, variant_def: dict) -> None:
+        variant_name = variant_def["name"]
+        variant_expansions = variant_def.get("expansions") or {}
+
+        for require_config in self.rule_config.require_expansions:
+            if not require_config.variant_config.matches_variant_definition(variant_def):
+                continue
+            expansion_to_validate = variant_expansions.get(require_config.expansion_name)
+            if expansion_to_validate is None:
+                self.failed_checks.append(
+                    self.REQUIRE_EXPANSION_ERROR_MSG.format(
+                        expansion_name=require_config.expansion_name,
+                        variant=variant_name,
+                        variant_config=require_config.variant_config.print(),
+                    )
+                )
+            elif (
+                require_config.expansion_value_regex is not None
+                and require_config.expansion_value_regex.match(expansion_to_validate) is None
+            ):
+                self.failed_checks.append(
+                    self.REQUIRE_EXPANSION_WITH_VALUE_ERROR_MSG.format(
+                        expansion_name=require_config.expansion_name,
+                        expansion_value_regex=require_config.expansion_value_regex.pattern,
+                        variant=variant_name,
+                        variant_config=require_config.variant_config.print(),
+                    )
+                )
+
+        for prohibit_config in self.rule_config.prohibit_expansions:
+            if not prohibit_config.variant_config.matches_variant_definition(variant_def):
+                continue
+            expansion_to_validate = variant_expansions.get(prohibit_config.expansion_name)
+            if prohibit_config.expansion_value_regex is None and expansion_to_validate is not None:
+                self.failed_checks.append(
+                    self.PROHIBIT_EXPANSION_ERROR_MSG.format(
+                        expansion_name=prohibit_config.expansion_name,
+                        variant=variant_name,
+                        variant_config=prohibit_config.variant_config.print(),
+                    )
+                )
+            elif (
+                prohibit_config.expansion_value_regex is not None
+                and expansion_to_validate is not None
+                and prohibit_config.expansion_value_regex.match(expansion_to_validate) is not None
+            ):
+                self.failed_checks.append(
+                    self.PROHIBIT_EXPANSION_WITH_VALUE_ERROR_MSG.format(
+                        expansion_name=prohibit_config.expansion_name,
+                        expansion_value_regex=prohibit_config.expansion_value_regex.pattern,
+                        variant=variant_name,
+                        variant_config=prohibit_config.variant_config.print(),
+                    )
+                )
+
+    def errors(self) -> List[LintError]:
+        return self.failed_checks
+
+
+class VariantExpansions(VisitorRule):
     """
     Validate expansions in variant definitions.
 
@@ -146,90 +235,9 @@ class VariantExpansions(Rule):
     def defaults() -> dict:
         return {"require_expansions": [], "prohibit_expansions": []}
 
-    def __call__(self, config: dict, yaml: dict) -> List[LintError]:
-        require_expansion_error_msg = (
-            "Build variant expansion '{expansion_name}' should be added to '{variant}'"
-            " build variant, because build variant configuration matches the following:"
-            " {variant_config}"
-        )
-        prohibit_expansion_error_msg = (
-            "Build variant expansion '{expansion_name}' should be removed from '{variant}'"
-            " build variant, because build variant configuration matches the following:"
-            " {variant_config}"
-        )
-        require_expansion_with_value_error_msg = (
-            "Build variant expansion '{expansion_name}' value should match"
-            " '{expansion_value_regex}' pattern on '{variant}' build variant, because"
-            " build variant configuration matches the following:"
-            " {variant_config}"
-        )
-        prohibit_expansion_with_value_error_msg = (
-            "Build variant expansion '{expansion_name}' value should not match"
-            " '{expansion_value_regex}' pattern on '{variant}' build variant, because"
-            " build variant configuration matches the following:"
-            " {variant_config}"
-        )
-
-        failed_checks = []
-        rule_config = VariantExpansionsConfig.from_config_dict(config)
-
-        for variant_def in cast(List, yaml.get("buildvariants") or []):
-            variant_name = variant_def["name"]
-            variant_expansions = variant_def.get("expansions") or {}
-
-            for require_config in rule_config.require_expansions:
-                if not require_config.variant_config.matches_variant_definition(variant_def):
-                    continue
-                expansion_to_validate = variant_expansions.get(require_config.expansion_name)
-                if expansion_to_validate is None:
-                    failed_checks.append(
-                        require_expansion_error_msg.format(
-                            expansion_name=require_config.expansion_name,
-                            variant=variant_name,
-                            variant_config=require_config.variant_config.print(),
-                        )
-                    )
-                elif (
-                    require_config.expansion_value_regex is not None
-                    and require_config.expansion_value_regex.match(expansion_to_validate) is None
-                ):
-                    failed_checks.append(
-                        require_expansion_with_value_error_msg.format(
-                            expansion_name=require_config.expansion_name,
-                            expansion_value_regex=require_config.expansion_value_regex.pattern,
-                            variant=variant_name,
-                            variant_config=require_config.variant_config.print(),
-                        )
-                    )
-
-            for prohibit_config in rule_config.prohibit_expansions:
-                if not prohibit_config.variant_config.matches_variant_definition(variant_def):
-                    continue
-                expansion_to_validate = variant_expansions.get(prohibit_config.expansion_name)
-                if (
-                    prohibit_config.expansion_value_regex is None
-                    and expansion_to_validate is not None
-                ):
-                    failed_checks.append(
-                        prohibit_expansion_error_msg.format(
-                            expansion_name=prohibit_config.expansion_name,
-                            variant=variant_name,
-                            variant_config=prohibit_config.variant_config.print(),
-                        )
-                    )
-                elif (
-                    prohibit_config.expansion_value_regex is not None
-                    and expansion_to_validate is not None
-                    and prohibit_config.expansion_value_regex.match(expansion_to_validate)
-                    is not None
-                ):
-                    failed_checks.append(
-                        prohibit_expansion_with_value_error_msg.format(
-                            expansion_name=prohibit_config.expansion_name,
-                            expansion_value_regex=prohibit_config.expansion_value_regex.pattern,
-                            variant=variant_name,
-                            variant_config=prohibit_config.variant_config.print(),
-                        )
-                    )
+    @staticmethod
+    def root_keys() -> AbstractSet[str]:
+        return VARIANT_BLOCKS
 
-        return failed_checks
+    def visitor(self, config: dict) -> Visitor:
+        return _VariantExpansionsVisitor(VariantExpansionsConfig.from_config_dict(config))
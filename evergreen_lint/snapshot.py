@@ -0,0 +1,148 @@
+"""Precompiled project snapshots for evglint.
+
+A snapshot is a loaded project (after includes are merged), stored so that
+linting the same revision again skips yaml parsing. The file starts with a
+fixed header:
+
+    magic (8 bytes) | format version (uint16) | metadata length (uint32)
+
+followed by JSON metadata recording the sha256 of every source file and the
+options the yaml was parsed with, and a pickle of the tree and its source
+positions.
+"""
+import hashlib
+import json
+import os
+import pickle
+import struct
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import yaml
+
+from evergreen_lint.yamlhandler import (
+    ALIAS_BUDGET,
+    ReadOnlyDict,
+    SourcePositions,
+    document_positions,
+    intern_tree,
+    read_file,
+    unwrap,
+)
+
+MAGIC = b"EVGLSNAP"
+FORMAT_VERSION = 2
+_HEADER = struct.Struct("<8sHI")
+
+PathLike = Union[str, os.PathLike]
+
+
+def is_snapshot(path: PathLike) -> bool:
+    """Return True if path is an evglint snapshot rather than yaml."""
+    with open(path, "rb") as fh:
+        return fh.read(len(MAGIC)) == MAGIC
+
+
+def _digest(path: PathLike) -> str:
+    with read_file(path) as content:
+        return hashlib.sha256(content).hexdigest()
+
+
+def write(
+    path: PathLike,
+    project: dict,
+    sources: Sequence[PathLike],
+    alias_budget: Optional[int] = ALIAS_BUDGET,
+    core_schema: bool = False,
+) -> None:
+    """Write project, loaded from the files in sources, to a snapshot at path.
+
+    Source paths are stored relative to the directory of the snapshot. Pass
+    the alias_budget and core_schema the project was loaded with, see
+    yamlhandler.load(); load() rejects the snapshot under other options.
+    """
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    metadata = {
+        "pyyaml": yaml.__version__,
+        "alias_budget": alias_budget,
+        "core_schema": core_schema,
+        "sources": [
+            [os.path.relpath(os.path.abspath(source), directory), _digest(source)]
+            for source in sources
+        ],
+    }
+    tree = unwrap(project)
+    table = document_positions(project)
+    payload = (tree, None if table is None else table.dump(tree))
+
+    header = json.dumps(metadata).encode()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(header)))
+            fh.write(header)
+            pickle.dump(payload, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        # mkstemp creates the file private to the user, but snapshots are
+        # meant to be shared between CI steps
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _check(path: str, metadata: Dict[str, Any], options: Dict[str, Any]) -> None:
+    if metadata.get("pyyaml") != yaml.__version__:
+        raise RuntimeError(
+            f"snapshot '{path}' was compiled with PyYAML {metadata.get('pyyaml')}, "
+            "compile it again"
+        )
+    for option, value in options.items():
+        if metadata[option] != value:
+            raise RuntimeError(
+                f"snapshot '{path}' was compiled with {option}={metadata[option]}, "
+                f"not {value}. Compile it again"
+            )
+    directory = os.path.dirname(path)
+    stale: List[str] = []
+    for source, digest in metadata["sources"]:
+        try:
+            if _digest(os.path.join(directory, source)) != digest:
+                stale.append(source)
+        except OSError:
+            stale.append(source)
+    if stale:
+        raise RuntimeError(
+            f"snapshot '{path}' is stale, these files changed since it was compiled: "
+            f"{stale}. Compile it again"
+        )
+
+
+def load(
+    path: PathLike, alias_budget: Optional[int] = ALIAS_BUDGET, core_schema: bool = False
+) -> dict:
+    """Load a snapshot written by write().
+
+    Raises a RuntimeError if any of its source files changed since, or if it
+    was compiled with another alias_budget or core_schema. Only load files
+    you trust: snapshots are pickles.
+    """
+    path = os.path.abspath(path)
+    with open(path, "rb") as fh:
+        magic, version, header_len = _HEADER.unpack(fh.read(_HEADER.size))
+        if magic != MAGIC:
+            raise RuntimeError(f"'{path}' is not an evglint snapshot")
+        if version != FORMAT_VERSION:
+            raise RuntimeError(
+                f"snapshot '{path}' has format version {version}, expected {FORMAT_VERSION}. "
+                "Compile it again"
+            )
+        options = {"alias_budget": alias_budget, "core_schema": core_schema}
+        _check(path, json.loads(fh.read(header_len)), options)
+        tree, dumped = pickle.load(fh)
+    # compile interns the tree, unpickling makes new strings
+    intern_tree(tree)
+
+    positions = None if dumped is None else SourcePositions.load(tree, dumped)
+    return ReadOnlyDict(tree, positions=positions)
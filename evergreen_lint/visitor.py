@@ -0,0 +1,134 @@
+"""Rules that are run together, in one walk of the project.
+
+A visitor rule returns a Visitor from visitor(). walk() goes over the
+project once, calling the callbacks of every visitor that overrides them, and
+then asks each visitor for its errors. Rules that implement __call__ instead
+each walk the project themselves, and run_rules() runs both kinds.
+"""
+from abc import abstractmethod
+from typing import Any, Callable, Dict, Generator, List, Mapping, Sequence, Tuple
+
+from evergreen_lint.helpers import (
+    Commands,
+    Location,
+    select_commands,
+    walk_command_blocks,
+)
+from evergreen_lint.matrix import iterate_variants
+from evergreen_lint.model import LintError, Rule
+
+# The callbacks of Visitor
+_CALLBACKS = ("function", "task_group", "task", "command", "function_call", "variant")
+
+
+class Visitor:
+    """Callbacks for the nodes of a project. Override the ones the rule needs,
+    walk() doesn't visit nodes no visitor is interested in."""
+
+    def function(self, name: str, definition: Commands) -> None:
+        """Called for each function definition."""
+
+    def task_group(self, task_group: dict) -> None:
+        """Called for each task group."""
+
+    def task(self, task: dict) -> None:
+        """Called for each task."""
+
+    def command(self, context: Location, command: dict, commands: Commands) -> None:
+        """Called for each use of a command, like iterate_commands_context
+        yields them."""
+
+    def function_call(self, context: Location, call: dict, commands: Commands) -> None:
+        """Called for each function call, like iterate_fn_calls_context
+        yields them."""
+
+    def variant(self, variant: dict) -> None:
+        """Called for each build variant, with matrices expanded, see
+        matrix.iterate_variants."""
+
+    def errors(self) -> List[LintError]:
+        """Return the errors found, called once the walk is done."""
+        return []
+
+
+class VisitorRule(Rule):
+    """Base class for rules that are run by a Visitor."""
+
+    @abstractmethod
+    def visitor(self, config: dict) -> Visitor:
+        """Return a new visitor that checks the project against config."""
+
+    def __call__(self, config: dict, yaml: dict) -> List[LintError]:
+        visitor = self.visitor(config)
+        walk(yaml, [visitor])
+        return visitor.errors()
+
+
+def _callbacks(visitors: Sequence[Visitor], name: str) -> List[Callable[..., None]]:
+    default = getattr(Visitor, name)
+    return [
+        getattr(visitor, name)
+        for visitor in visitors
+        if getattr(type(visitor), name) is not default
+    ]
+
+
+def _no_commands(prefix: Location, commands: Commands) -> Generator:
+    yield from ()
+
+
+def walk(yaml_dict: dict, visitors: Sequence[Visitor]) -> None:
+    """Call the callbacks of visitors for the nodes of the yaml dict, walking
+    it once however many visitors there are."""
+    callbacks = {name: _callbacks(visitors, name) for name in _CALLBACKS}
+
+    definitions = None
+    if callbacks["function"] or callbacks["task_group"] or callbacks["task"]:
+
+        def definitions(kind: str, name: Any, definition: Any) -> None:
+            if kind == "function":
+                for callback in callbacks["function"]:
+                    callback(name, definition)
+            else:
+                for callback in callbacks[kind]:
+                    callback(definition)
+
+    selector = select_commands
+    if not callbacks["command"] and not callbacks["function_call"]:
+        selector = _no_commands
+    if definitions is not None or selector is select_commands:
+        for context, node, commands, is_call in walk_command_blocks(
+            yaml_dict, selector, definitions=definitions
+        ):
+            for callback in callbacks["function_call" if is_call else "command"]:
+                callback(context, node, commands)
+
+    if callbacks["variant"]:
+        for variant in iterate_variants(yaml_dict):
+            for callback in callbacks["variant"]:
+                callback(variant)
+
+
+def run_rules(
+    rules: Mapping[str, Tuple[Rule, dict]], yaml_dict: dict
+) -> Dict[str, List[LintError]]:
+    """Run rules, a map of rule name to the rule and its config, on the yaml
+    dict. Visitor rules share one walk.
+
+    Returns the errors of each rule that found any, in the order of rules.
+    """
+    visitors: Dict[str, Visitor] = {}
+    for name, (rule, config) in rules.items():
+        if isinstance(rule, VisitorRule):
+            visitors[name] = rule.visitor(config)
+    walk(yaml_dict, list(visitors.values()))
+
+    errors: Dict[str, List[LintError]] = {}
+    for name, (rule, config) in rules.items():
+        if name in visitors:
+            rule_errors = visitors[name].errors()
+        else:
+            rule_errors = rule(config, yaml_dict)
+        if rule_errors:
+            errors[name] = rule_errors
+    return errors
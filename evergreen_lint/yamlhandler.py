@@ -1,34 +1,1631 @@
 """Yaml handling helpers for evglint."""
+import collections.abc
+import copy
+import functools
+import json
+import mmap
 import os
-from typing import Any, Union
+import re
+import sys
+from array import array
+from bisect import bisect_left
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Dict,
+    ItemsView,
+    Iterator,
+    KeysView,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+    ValuesView,
+)
 
 import yaml
 
+from evergreen_lint.cache import ParseCache
+from evergreen_lint.model import Buffer
+
+# libyaml's C parser is an order of magnitude faster than the pure-Python one,
+# but PyYAML can be built without it. Both produce identical trees.
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Files at least this large are mapped into memory rather than read
+MMAP_THRESHOLD = 1024 * 1024
+
+# Default for how many nodes aliases may add to a document, see load(). Real
+# Evergreen projects stay far below it: mongo.yml expands to about 13k.
+ALIAS_BUDGET = 1_000_000
+
+# Longest scalar value that is interned when loading with intern=True. Names,
+# tags, distros and expansion names fit, scripts don't.
+INTERN_MAX_LENGTH = 64
+
+# Files at least this large are split into sections and parsed on the
+# executor given to load()/load_file(), if any
+PARALLEL_THRESHOLD = 256 * 1024
+
+
+def _readonly(self, *args, **kwargs):
+    raise RuntimeError("Rules must not modify the yaml dictionary")
+
+
+class Position(NamedTuple):
+    """1-based source position of a yaml node.
+
+    filename is only set for nodes that come from another file than the root
+    of the document, see evergreen_lint.includes.
+    """
+
+    line: int
+    column: int
+    filename: Optional[str] = None
+
+
+class SourcePositions:
+    """Start line and column of every mapping and sequence in a document.
+
+    The table is keyed by node identity and stored in parallel arrays, sorted
+    by id() on first lookup, which costs 16 bytes per node, 18 for documents
+    made of several files, instead of an object per node. It is only
+    meaningful while the nodes are alive, so it is kept alongside the
+    document it describes.
+
+    Nodes added after the first lookup go to a dict instead so the arrays
+    aren't sorted again.
+    """
+
+    __slots__ = ("_ids", "_lines", "_columns", "_files", "_sorted", "_added", "filenames")
+
+    def __init__(self, filename: Optional[str] = None) -> None:
+        self._ids = array("Q")
+        self._lines = array("I")
+        self._columns = array("I")
+        # index into filenames per node; empty while there is only one file
+        self._files = array("H")
+        self._sorted = True
+        self._added: Dict[int, Tuple[int, int]] = {}
+        self.filenames: List[Optional[str]] = [filename]
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._added)
+
+    def add(self, node: Any, line: int, column: int) -> None:
+        """Record the 0-based line and column that node starts at."""
+        if self._sorted and self._ids:
+            self._added[id(node)] = (line, column)
+            return
+        self._ids.append(id(node))
+        self._lines.append(line)
+        self._columns.append(column)
+        self._sorted = False
+
+    def retain(self, tree: Any) -> None:
+        """Forget the nodes that are not part of tree.
+
+        The loader records nodes that end up unused, like the value of a key
+        that is merged in with "<<" and then overridden. Their ids may be
+        reused by nodes created later.
+        """
+        live = {id(node) for node in _walk(tree)}
+        keep = [idx for idx, key in enumerate(self._ids) if key in live]
+        if len(keep) == len(self._ids):
+            return
+        self._ids = array("Q", (self._ids[i] for i in keep))
+        self._lines = array("I", (self._lines[i] for i in keep))
+        self._columns = array("I", (self._columns[i] for i in keep))
+        if self._files:
+            self._files = array("H", (self._files[i] for i in keep))
+
+    def _sort(self) -> None:
+        order = sorted(range(len(self._ids)), key=self._ids.__getitem__)
+        self._ids = array("Q", (self._ids[i] for i in order))
+        self._lines = array("I", (self._lines[i] for i in order))
+        self._columns = array("I", (self._columns[i] for i in order))
+        if self._files:
+            self._files = array("H", (self._files[i] for i in order))
+        self._sorted = True
+
+    def _index(self, node: Any) -> int:
+        if not self._sorted:
+            self._sort()
+        key = id(node)
+        idx = bisect_left(self._ids, key)
+        if idx == len(self._ids) or self._ids[idx] != key:
+            return -1
+        return idx
+
+    def _find(self, node: Any) -> Optional[Tuple[int, int, int]]:
+        # nodes added late may reuse the id of a garbage node in the arrays
+        if self._added and id(node) in self._added:
+            return (*self._added[id(node)], 0)
+        idx = self._index(node)
+        if idx < 0:
+            return None
+        return (self._lines[idx], self._columns[idx], self._files[idx] if self._files else 0)
+
+    def get(self, node: Any) -> Optional[Position]:
+        """Return the position of node, or None if it was not recorded."""
+        found = self._find(node)
+        if found is None:
+            return None
+        line, column, file = found
+        return Position(line + 1, column + 1, self.filenames[file])
+
+    @classmethod
+    def merge(
+        cls,
+        tables: Sequence["SourcePositions"],
+        filenames: Optional[Sequence[Optional[str]]] = None,
+    ) -> "SourcePositions":
+        """Combine the tables of several files that make up one document.
+
+        :param filenames: if given, rename the file of each single-file table
+        """
+        merged = cls()
+        merged.filenames = []
+        for idx, table in enumerate(tables):
+            offset = len(merged.filenames)
+            if filenames is None:
+                merged.filenames.extend(table.filenames)
+            else:
+                assert len(table.filenames) == 1
+                merged.filenames.append(filenames[idx])
+            merged._ids.extend(table._ids)
+            merged._lines.extend(table._lines)
+            merged._columns.extend(table._columns)
+            if table._files:
+                merged._files.extend(offset + idx for idx in table._files)
+            else:
+                merged._files.extend([offset] * len(table._ids))
+            for key, (line, column) in table._added.items():
+                merged._ids.append(key)
+                merged._lines.append(line)
+                merged._columns.append(column)
+                merged._files.append(offset)
+        merged._sorted = False
+        return merged
+
+    def dump(self, tree: Any) -> Tuple[Any, ...]:
+        """Return a picklable copy of the table for the nodes of tree.
+
+        Positions are listed in the order _walk(tree) visits nodes, which
+        unlike ids survives pickling tree, see load().
+        """
+        lines = array("I")
+        columns = array("I")
+        files = array("H")
+        for node in _walk(tree):
+            found = self._find(node)
+            if found is None:
+                lines.append(_NO_POSITION)
+                columns.append(_NO_POSITION)
+                files.append(0)
+            else:
+                lines.append(found[0])
+                columns.append(found[1])
+                files.append(found[2])
+        if len(self.filenames) == 1:
+            files = array("H")
+        return (lines, columns, files, list(self.filenames))
+
+    @classmethod
+    def load(cls, tree: Any, dumped: Tuple[Any, ...]) -> "SourcePositions":
+        """Rebuild a table for tree from the output of dump()."""
+        lines, columns, files, filenames = dumped
+        positions = cls()
+        positions.filenames = filenames
+        for idx, (node, line) in enumerate(zip(_walk(tree), lines)):
+            if line != _NO_POSITION:
+                positions.add(node, line, columns[idx])
+                if files:
+                    positions._files.append(files[idx])
+        return positions
+
+
+_NO_POSITION = 0xFFFFFFFF
+
+
+def _walk(tree: Any) -> Iterator[Any]:
+    """Yield every mapping and sequence in tree once, depth first."""
+    seen = set()
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        if not isinstance(node, (dict, list)) or id(node) in seen:
+            continue
+        seen.add(id(node))
+        yield node
+        children = node.values() if isinstance(node, dict) else node
+        stack.extend(reversed(list(children)))
+
+
+class _Document:
+    """State shared by all views of one document."""
+
+    __slots__ = ("views", "positions", "memo", "lazy")
+
+    def __init__(self, positions: Optional[SourcePositions] = None) -> None:
+        # views holds a strong reference to every wrapped node, so ids are
+        # never reused while the document is alive
+        self.views: Dict[int, Any] = {}
+        self.positions = positions
+        # what helpers derive from the document, see document_memo()
+        self.memo: Dict[Any, Any] = {}
+        # the entries left to parse, for documents loaded with lazy=True
+        self.lazy: Optional[_LazySource] = None
+
+
+def _wrap(value: Any, doc: _Document) -> Any:
+    """Return the read-only view of value, creating it on first access."""
+    if not isinstance(value, (dict, list)) or isinstance(value, (ReadOnlyDict, ReadOnlyList)):
+        return value
+    view = doc.views.get(id(value))
+    if view is None:
+        if isinstance(value, dict):
+            view = ReadOnlyDict(value, _doc=doc)
+        else:
+            view = ReadOnlyList(value, _doc=doc)
+        doc.views[id(value)] = view
+    return view
+
 
 class ReadOnlyDict(dict):
-    """RO dictionary wrapper to prevent modifications to the yaml dict."""
+    """RO view of a yaml mapping to prevent modifications to the yaml dict.
+
+    Nothing is copied: nested mappings and sequences are wrapped lazily when
+    they are read, and every node is wrapped at most once per document, so
+    protecting the whole tree costs O(accessed nodes). copy.deepcopy()
+    returns a plain, mutable copy of the underlying data.
+
+    The view has no dict storage of its own, so C-level consumers that read
+    it directly, like json.dumps(), see an empty mapping. Serialize
+    unwrap(view) instead.
+    """
+
+    __slots__ = ("_data", "_doc")
+
+    # pylint: disable=super-init-not-called
+    def __init__(
+        self,
+        data: Any = None,
+        positions: Optional[SourcePositions] = None,
+        _doc: Optional[_Document] = None,
+    ) -> None:
+        if isinstance(data, ReadOnlyDict):
+            data = data._data
+        elif not isinstance(data, dict):
+            data = dict(data or {})
+        self._data: dict = data
+        self._doc = _Document(positions) if _doc is None else _doc
+
+    def __getitem__(self, key: Any) -> Any:
+        return _wrap(self._data[key], self._doc)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        if key in self._data:
+            return _wrap(self._data[key], self._doc)
+        return default
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._data
+
+    def __iter__(self) -> Iterator:
+        return iter(self._data)
+
+    def __reversed__(self) -> Iterator:
+        return reversed(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def keys(self) -> KeysView:  # type: ignore
+        return self._data.keys()
+
+    def values(self) -> ValuesView:  # type: ignore
+        return collections.abc.ValuesView(self)
+
+    def items(self) -> ItemsView:  # type: ignore
+        return collections.abc.ItemsView(self)
+
+    def copy(self) -> dict:
+        """Return a shallow, mutable copy whose nested values stay read-only."""
+        return dict(self.items())
+
+    def __eq__(self, other: object) -> bool:
+        return self._data == unwrap(other)
+
+    def __ne__(self, other: object) -> bool:
+        return self._data != unwrap(other)
+
+    def __or__(self, other: Any) -> dict:
+        return {**self, **other}
+
+    def __ror__(self, other: Any) -> dict:
+        return {**other, **self}
+
+    def __repr__(self) -> str:
+        return repr(self._data)
+
+    def __reduce__(self) -> Tuple:
+        return (ReadOnlyDict, (self._data,))
+
+    def __copy__(self) -> dict:
+        return self.copy()
+
+    def __deepcopy__(self, memo: dict) -> dict:
+        return copy.deepcopy(self._data, memo)
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    __ior__ = _readonly
+    pop = _readonly
+    popitem = _readonly
+    clear = _readonly
+    update = _readonly
+    setdefault = _readonly
+
+
+class ReadOnlyList(list):
+    """RO view of a yaml sequence, see ReadOnlyDict.
+
+    The view has no list storage of its own either. C-level consumers such as
+    str.join() and tuple() iterate it, since it isn't an exact list.
+    """
+
+    __slots__ = ("_data", "_doc")
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, data: Any = (), _doc: Optional[_Document] = None) -> None:
+        if isinstance(data, ReadOnlyList):
+            data = data._data
+        elif not isinstance(data, list):
+            data = list(data)
+        self._data: list = data
+        self._doc = _Document() if _doc is None else _doc
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return ReadOnlyList(self._data[index], _doc=self._doc)
+        return _wrap(self._data[index], self._doc)
+
+    def __iter__(self) -> Iterator:
+        doc = self._doc
+        return (_wrap(item, doc) for item in self._data)
+
+    def __reversed__(self) -> Iterator:
+        doc = self._doc
+        return (_wrap(item, doc) for item in reversed(self._data))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, value: object) -> bool:
+        return unwrap(value) in self._data
+
+    def index(self, value: Any, *args: Any) -> int:
+        return self._data.index(unwrap(value), *args)
+
+    def count(self, value: Any) -> int:
+        return self._data.count(unwrap(value))
+
+    def copy(self) -> list:
+        """Return a shallow, mutable copy whose nested values stay read-only."""
+        return list(self)
+
+    def __add__(self, other: Any) -> list:
+        return list(self) + list(other)
+
+    def __radd__(self, other: Any) -> list:
+        return list(other) + list(self)
+
+    def __mul__(self, count: Any) -> list:
+        return list(self) * count
+
+    __rmul__ = __mul__
+
+    def __eq__(self, other: object) -> bool:
+        return self._data == unwrap(other)
+
+    def __ne__(self, other: object) -> bool:
+        return self._data != unwrap(other)
+
+    def __lt__(self, other: Any) -> bool:
+        return self._data < unwrap(other)
+
+    def __le__(self, other: Any) -> bool:
+        return self._data <= unwrap(other)
+
+    def __gt__(self, other: Any) -> bool:
+        return self._data > unwrap(other)
+
+    def __ge__(self, other: Any) -> bool:
+        return self._data >= unwrap(other)
+
+    def __repr__(self) -> str:
+        return repr(self._data)
+
+    def __reduce__(self) -> Tuple:
+        return (ReadOnlyList, (self._data,))
+
+    def __copy__(self) -> list:
+        return self.copy()
+
+    def __deepcopy__(self, memo: dict) -> list:
+        return copy.deepcopy(self._data, memo)
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    __iadd__ = _readonly
+    __imul__ = _readonly
+    append = _readonly
+    extend = _readonly
+    insert = _readonly
+    pop = _readonly
+    remove = _readonly
+    clear = _readonly
+    sort = _readonly
+    reverse = _readonly
+
+
+def unwrap(value: Any) -> Any:
+    """Return the data behind a read-only view, to serialize it with
+    json.dumps() for instance. The entries of a document loaded with
+    lazy=True that haven't been read yet are parsed first. Do not modify it."""
+    if isinstance(value, (ReadOnlyDict, ReadOnlyList)):
+        if value._doc.lazy is not None:
+            value._doc.lazy.materialize()
+            value._doc.lazy = None
+        return value._data
+    return value
+
+
+def document_positions(node: Any) -> Optional[SourcePositions]:
+    """Return the position table of the document node belongs to, if any."""
+    if not isinstance(node, (ReadOnlyDict, ReadOnlyList)):
+        return None
+    return node._doc.positions
+
+
+def document_memo(node: Any) -> Optional[Dict[Any, Any]]:
+    """Return a dict that lives as long as the document node belongs to, for
+    helpers to keep what they derive from it, or None if node isn't part of a
+    loaded document. Keys should include id() of the node the value was
+    derived from."""
+    if not isinstance(node, (ReadOnlyDict, ReadOnlyList)):
+        return None
+    return node._doc.memo
+
+
+def position_of(node: Any) -> Optional[Position]:
+    """Return where node starts in its source file, if that was recorded.
+
+    Positions are only recorded for documents loaded with positions=True.
+    """
+    if not isinstance(node, (ReadOnlyDict, ReadOnlyList)) or node._doc.positions is None:
+        return None
+    return node._doc.positions.get(node._data)
+
+
+class _PositionLoader(SafeLoader):  # type: ignore
+    """SafeLoader that records where each mapping and sequence starts."""
+
+    def __init__(self, stream: Any) -> None:
+        super().__init__(stream)
+        self.positions = SourcePositions()
+
+    def construct_object(self, node: yaml.Node, deep: bool = False) -> Any:
+        new = not isinstance(node, yaml.ScalarNode) and node not in self.constructed_objects
+        data = super().construct_object(node, deep=deep)
+        if new and isinstance(data, (dict, list)):
+            self.positions.add(data, node.start_mark.line, node.start_mark.column)
+        return data
+
+
+class _InterningLoader(SafeLoader):  # type: ignore
+    """SafeLoader that interns mapping keys and short string values.
+
+    Keys like "command" and task, tag and function names repeat thousands of
+    times in a project; interned, every repeat is the same object.
+    """
+
+    def construct_yaml_str(self, node: yaml.ScalarNode) -> str:
+        value = self.construct_scalar(node)
+        if len(value) <= INTERN_MAX_LENGTH:
+            return sys.intern(value)
+        return value
+
+    def construct_mapping(self, node: yaml.MappingNode, deep: bool = False) -> dict:
+        mapping = super().construct_mapping(node, deep=deep)
+        if any(type(key) is str and len(key) > INTERN_MAX_LENGTH for key in mapping):
+            mapping = {
+                sys.intern(key) if type(key) is str else key: value
+                for key, value in mapping.items()
+            }
+        return mapping
+
+
+_InterningLoader.add_constructor("tag:yaml.org,2002:str", _InterningLoader.construct_yaml_str)
+
+
+def intern_tree(tree: Any) -> None:
+    """Intern the mapping keys and short string values of a plain tree in
+    place, like loading it with intern=True does.
+
+    Unpickling a tree, from the parse cache, a snapshot or another process,
+    creates new strings: repeats within the tree stay shared, but not with
+    the strings of any other tree.
+    """
+    intern = sys.intern
+    for node in _walk(tree):
+        if isinstance(node, dict):
+            items = [
+                (
+                    intern(key) if type(key) is str else key,
+                    (
+                        intern(value)
+                        if type(value) is str and len(value) <= INTERN_MAX_LENGTH
+                        else value
+                    ),
+                )
+                for key, value in node.items()
+            ]
+            node.clear()
+            node.update(items)
+        else:
+            node[:] = [
+                intern(item) if type(item) is str and len(item) <= INTERN_MAX_LENGTH else item
+                for item in node
+            ]
+
+
+class _CoreSchemaLoader(SafeLoader):  # type: ignore
+    """SafeLoader that resolves plain scalars like Evergreen does.
+
+    Evergreen reads project files with Go's yaml.v3, which implements the YAML
+    1.2 core schema: only true/false are booleans, there are no timestamps or
+    sexagesimal numbers, and ints follow Go's base prefixes (0x, 0o, 0b, and a
+    leading 0 for octal). SafeLoader implements YAML 1.1, where "yes", "on" and
+    "2021-01-01" aren't strings, and tries more patterns per plain scalar.
+    """
+
+    # replaces SafeLoader's resolvers, filled in below
+    yaml_implicit_resolvers: Dict[str, List[Tuple[str, Any]]] = {}
+
+
+for _tag, _pattern, _first in [
+    ("tag:yaml.org,2002:null", r"~|null|Null|NULL|", ["~", "n", "N", ""]),
+    ("tag:yaml.org,2002:bool", r"true|True|TRUE|false|False|FALSE", list("tTfF")),
+    (
+        "tag:yaml.org,2002:int",
+        r"[-+]?(?:0b[01_]+|0o?[0-7_]+|0x[0-9a-fA-F_]+|[1-9][0-9_]*|0)",
+        list("-+0123456789"),
+    ),
+    (
+        "tag:yaml.org,2002:float",
+        r"[-+]?(?:\.[0-9]+|[0-9]+(?:\.[0-9]*)?)(?:[eE][-+]?[0-9]+)?"
+        r"|[-+]?\.(?:inf|Inf|INF)|\.(?:nan|NaN|NAN)",
+        list("-+.0123456789"),
+    ),
+    ("tag:yaml.org,2002:merge", r"<<", ["<"]),
+]:
+    _CoreSchemaLoader.add_implicit_resolver(_tag, re.compile(f"^(?:{_pattern})$"), _first)
+
+
+@functools.lru_cache(maxsize=None)
+def _loader_class(positions: bool, intern: bool, core_schema: bool) -> Any:
+    bases = [
+        cls
+        for cls, enabled in [
+            (_PositionLoader, positions),
+            (_InterningLoader, intern),
+            (_CoreSchemaLoader, core_schema),
+        ]
+        if enabled
+    ]
+    if len(bases) < 2:
+        return bases[0] if bases else SafeLoader
+    # each base only overrides one of construct_object, yaml_constructors and
+    # yaml_implicit_resolvers, so they combine by inheritance
+    return type("_Loader", tuple(bases), {})
+
+
+def load_file(
+    yaml_file: Union[str, os.PathLike],
+    cache: Optional[ParseCache] = None,
+    positions: bool = False,
+    root_keys: Optional[Collection[str]] = None,
+    alias_budget: Optional[int] = ALIAS_BUDGET,
+    intern: bool = False,
+    core_schema: bool = False,
+    executor: Optional[Executor] = None,
+    lazy: bool = False,
+    scan: Optional[Callable[[Buffer], Any]] = None,
+) -> dict:
+    """Load yaml from a file on disk.
+
+    JSON files, recognized by their .json extension or by starting with an
+    object or array, are decoded with the json module instead. The cache,
+    alias_budget, intern, core_schema and lazy parameters don't apply to them.
+
+    :param yaml_file: path to the yaml file
+    :param cache: if given, reuse the parsed tree from this cache when the
+        file content has been seen before
+    :param positions: record source positions, see position_of()
+    :param root_keys: only build these root keys, see load()
+    :param alias_budget: see load()
+    :param intern: see load()
+    :param core_schema: see load()
+    :param executor: see load()
+    :param lazy: see load(). Trees that come from the cache are whole.
+    :param scan: if given, called with the raw content of the file before it
+        is parsed, to check the text without reading the file again
+    """
+    with read_file(yaml_file) as content:
+        if scan is not None:
+            scan(content)
+        if _looks_like_json(yaml_file, content):
+            doc = _load_json(content, positions, root_keys)
+            if doc is not None:
+                return doc
+        return _load_content(
+            content, cache, positions, root_keys, alias_budget, intern, core_schema, executor, lazy
+        )
+
+
+@contextmanager
+def read_file(path: Union[str, os.PathLike]) -> Iterator[Buffer]:
+    """Read path once, into bytes or, for large files, a read-only mmap.
+
+    Hashing, raw-text checks and parsing should all work from the returned
+    buffer instead of reading the file again. It is only valid inside the
+    with block.
+    """
+    with open(path, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size < MMAP_THRESHOLD:
+            yield fh.read()
+            return
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+
+# JSON documents start with an object or array, possibly after a BOM
+_JSON_START = re.compile(rb"(?:\xef\xbb\xbf)?[ \t\r\n]*[{\[]")
+# A JSON string, or the start of an object or array
+_JSON_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[{\[]')
+
+
+def _looks_like_json(path: Union[str, os.PathLike], content: Buffer) -> bool:
+    if os.fspath(path).endswith(".json"):
+        return True
+    return _JSON_START.match(content) is not None
+
+
+def _load_json(
+    content: Buffer, positions: bool, root_keys: Optional[Collection[str]]
+) -> Optional[dict]:
+    """Load content with the json module, which is several times faster than
+    any yaml loader. Return None if it isn't JSON after all, such as yaml
+    that starts with a flow mapping.
+
+    There are no anchors in JSON, so there is no alias budget to check, and
+    the decoder already shares repeated keys within a document.
+    """
+    data = content if isinstance(content, bytes) else bytes(content)
+    try:
+        tree = json.loads(data)
+    except ValueError:
+        return None
+
+    table = None
+    if positions:
+        table = _json_positions(data, tree)
+    if root_keys is not None and isinstance(tree, dict):
+        tree = {key: value for key, value in tree.items() if key in root_keys}
+        if table is not None:
+            table.retain(tree)
+    return ReadOnlyDict(tree, positions=table)
+
+
+def _json_positions(data: bytes, tree: Any) -> SourcePositions:
+    """Return the positions of the objects and arrays of tree, decoded from
+    data.
+
+    The decoder builds them in the order their opening brackets appear in
+    data, which is the order _walk() yields them in. A key that is repeated
+    within an object breaks that correspondence, its documents get no
+    positions.
+    """
+    table = SourcePositions()
+    starts = [
+        match.start() for match in _JSON_TOKEN.finditer(data) if match.end() - match.start() == 1
+    ]
+    nodes = list(_walk(tree))
+    if len(nodes) != len(starts):
+        return table
+    line = 0
+    line_start = 0
+    for node, start in zip(nodes, starts):
+        line += data.count(b"\n", line_start, start)
+        line_start = data.rfind(b"\n", 0, start) + 1
+        column = start - line_start
+        if not data[line_start:start].isascii():
+            column = len(data[line_start:start].decode("utf-8", "replace"))
+        table.add(node, line, column)
+    return table
+
+
+def _load_content(
+    content: Buffer,
+    cache: Optional[ParseCache],
+    positions: bool,
+    root_keys: Optional[Collection[str]],
+    alias_budget: Optional[int],
+    intern: bool,
+    core_schema: bool,
+    executor: Optional[Executor],
+    lazy: bool,
+) -> dict:
+    if cache is None:
+        return load(
+            content,
+            positions=positions,
+            root_keys=root_keys,
+            alias_budget=alias_budget,
+            intern=intern,
+            core_schema=core_schema,
+            executor=executor,
+            lazy=lazy,
+        )
+
+    salt = "" if root_keys is None else "keys=" + ",".join(sorted(root_keys))
+    # a tree cached under a larger budget must not get past a smaller one
+    salt += f";aliases={alias_budget}"
+    if core_schema:
+        salt += ";core"
+    if not positions:
+        tree = cache.load(
+            content,
+            lambda data: _parse(data, root_keys, alias_budget, intern, core_schema, executor),
+            salt,
+        )
+        if intern:
+            intern_tree(tree)
+        return ReadOnlyDict(tree)
+
+    def _parse_dumped(data: Buffer) -> Tuple[Any, Tuple[Any, ...]]:
+        tree, table = _parse_with_positions(
+            data, root_keys, alias_budget, intern, core_schema, executor
+        )
+        return tree, table.dump(tree)
+
+    tree, dumped = cache.load(content, _parse_dumped, salt + ";positions")
+    if intern:
+        intern_tree(tree)
+    return ReadOnlyDict(tree, positions=SourcePositions.load(tree, dumped))
+
+
+def _select_root_keys(loader: Any, node: yaml.Node, root_keys: Collection[str]) -> yaml.Node:
+    """Return a copy of the root node without the root keys we don't need.
+
+    This happens on the composed node graph, where aliases are still
+    references to their anchored nodes, so anchors defined under a dropped key
+    are still constructed when a kept key refers to them.
+    """
+    if not isinstance(node, yaml.MappingNode):
+        return node
+    # pull in root-level merge keys ("<<: *anchor") before filtering
+    loader.flatten_mapping(node)
+    value = [
+        (key, val)
+        for key, val in node.value
+        if not isinstance(key, yaml.ScalarNode) or key.value in root_keys
+    ]
+    return yaml.MappingNode(
+        node.tag, value, node.start_mark, node.end_mark, flow_style=node.flow_style
+    )
+
+
+def _check_aliases(node: yaml.Node, budget: int) -> None:
+    """Raise if aliases in the document rooted at node expand to more than
+    budget nodes.
+
+    PyYAML composes an alias as another reference to its anchored node, so
+    the document is a graph, and anything walking the constructed tree visits
+    an anchored subtree once per alias. A few nested aliases ("billion laughs")
+    are enough to make that walk take forever. Here every node is visited
+    once and the size of its expanded subtree memoized, so each alias costs
+    constant time no matter how much it expands to.
+    """
+    # the expanded size of every node visited, 0 while it is on the stack
+    sizes: Dict[int, int] = {id(node): 0}
+    expanded = 0
+    # post-order: a node's size is known once all of its children were left
+    stack: List[Tuple[yaml.Node, Iterator[yaml.Node]]] = [(node, _child_nodes(node))]
+    totals = [1]
+    while stack:
+        parent, children = stack[-1]
+        for child in children:
+            seen = sizes.get(id(child))
+            if seen is None:
+                sizes[id(child)] = 0
+                stack.append((child, _child_nodes(child)))
+                totals.append(1)
+                break
+            if seen == 0:
+                raise RuntimeError(
+                    f"recursive yaml alias to the node at line {child.start_mark.line + 1}"
+                )
+            totals[-1] += seen
+            expanded += seen
+            if expanded > budget:
+                raise RuntimeError(
+                    f"yaml aliases expand to more than {budget} nodes (the alias budget), "
+                    f"last to the node at line {child.start_mark.line + 1}"
+                )
+        else:
+            stack.pop()
+            size = totals.pop()
+            sizes[id(parent)] = size
+            if totals:
+                totals[-1] += size
+
+
+def _child_nodes(node: yaml.Node) -> Iterator[yaml.Node]:
+    if isinstance(node, yaml.MappingNode):
+        return (child for pair in node.value for child in pair)
+    if isinstance(node, yaml.SequenceNode):
+        return iter(node.value)
+    return iter(())
+
+
+def _construct(
+    loader: Any, root_keys: Optional[Collection[str]], alias_budget: Optional[int]
+) -> Any:
+    try:
+        node = loader.get_single_node()
+        if node is None:
+            return None
+        if root_keys is not None:
+            node = _select_root_keys(loader, node, root_keys)
+        if alias_budget is not None:
+            _check_aliases(node, alias_budget)
+        return loader.construct_document(node)
+    finally:
+        loader.dispose()
+
+
+class _BufferStream:
+    """Minimal file object over a buffer.
+
+    PyYAML only accepts str, bytes and file objects, and copying a
+    memoryview or mmap to bytes would double the memory used by the raw
+    file. The parser reads from this in chunks instead.
+    """
+
+    def __init__(self, buffer: Buffer) -> None:
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def read(self, size: int = -1) -> bytes:
+        end = len(self._view) if size < 0 else min(self._pos + size, len(self._view))
+        chunk = self._view[self._pos : end].tobytes()
+        self._pos = end
+        return chunk
+
+
+def _stream(data: Any) -> Any:
+    if isinstance(data, (bytearray, memoryview, mmap.mmap)):
+        return _BufferStream(data)
+    return data
+
+
+# A line that starts a new root key: anything at column 0 but whitespace,
+# comments and the "- " of a sequence that is the value of the previous key
+_SECTION_START = re.compile(rb"^[^\s#-]", re.MULTILINE)
+_ROOT_KEY = re.compile(rb"([^\s#?:,\[\]{}&*!|>'\"%@`][^\n:]*):(?:\s|$)")
+# Document markers, which mean there is more than one document to parse
+_DOCUMENT_MARKER = re.compile(rb"^(?:---|\.\.\.)(?:\s|$)", re.MULTILINE)
+# Anything that looks like an anchor or alias. This also matches "&&" in
+# scripts or "*.log" in globs, which at worst groups more sections than needed.
+_ANCHOR = re.compile(rb"&([^\s,\[\]{}]+)")
+_ALIAS = re.compile(rb"\*([^\s,\[\]{}]+)")
+
+
+def _split_sections(data: bytes) -> Optional[List[Tuple[str, int, int]]]:
+    """Return (root key, start, end) for every root key of data.
+
+    The scan works on raw lines, so it only accepts a block mapping of plain
+    root keys, and returns None for anything it can't split reliably.
+    """
+    if data.startswith((b"\xef\xbb\xbf", b"\xff\xfe", b"\xfe\xff")):
+        return None
+    if _DOCUMENT_MARKER.search(data):
+        return None
+    starts = [match.start() for match in _SECTION_START.finditer(data)]
+    sections = []
+    for idx, start in enumerate(starts):
+        match = _ROOT_KEY.match(data, start)
+        if match is None:
+            return None
+        try:
+            key = match.group(1).decode("utf-8").rstrip()
+        except UnicodeDecodeError:
+            return None
+        end = starts[idx + 1] if idx + 1 < len(starts) else len(data)
+        # comments before the first key belong to the first section
+        sections.append((key, start if idx else 0, end))
+    return sections or None
+
+
+def _group_sections(
+    data: bytes, sections: List[Tuple[str, int, int]], min_size: int
+) -> List[List[int]]:
+    """Group sections that must be parsed together, because one uses an
+    anchor defined in another, or because they define the same root key.
+
+    Independent groups are then packed together until they are at least
+    min_size bytes, so that small root keys don't get a process each.
+    """
+    parent = list(range(len(sections)))
+
+    def _find(idx: int) -> int:
+        while parent[idx] != idx:
+            parent[idx] = parent[parent[idx]]
+            idx = parent[idx]
+        return idx
+
+    def _union(idx: int, other: int) -> None:
+        parent[_find(idx)] = _find(other)
+
+    defined_in: Dict[bytes, int] = {}
+    key_in: Dict[str, int] = {}
+    for idx, (key, start, end) in enumerate(sections):
+        _union(idx, key_in.setdefault(key, idx))
+        for name in _ANCHOR.findall(data, start, end):
+            _union(idx, defined_in.setdefault(name, idx))
+    for idx, (_, start, end) in enumerate(sections):
+        for name in _ALIAS.findall(data, start, end):
+            if name in defined_in:
+                _union(idx, defined_in[name])
+
+    groups: Dict[int, List[int]] = {}
+    for idx in range(len(sections)):
+        groups.setdefault(_find(idx), []).append(idx)
+
+    batches: List[List[int]] = [[]]
+    size = 0
+    for group in groups.values():
+        if batches[-1] and size >= min_size:
+            batches.append([])
+            size = 0
+        batches[-1].extend(group)
+        size += sum(sections[idx][2] - sections[idx][1] for idx in group)
+    if size < min_size and len(batches) > 1:
+        batches[-2].extend(batches.pop())
+    return [sorted(batch) for batch in batches]
+
+
+def _parse_group(
+    text: bytes,
+    positions: bool,
+    root_keys: Optional[Collection[str]],
+    alias_budget: Optional[int],
+    intern: bool,
+    core_schema: bool,
+) -> Tuple[Any, Optional[Tuple[Any, ...]]]:
+    if not positions:
+        return _parse(text, root_keys, alias_budget, intern, core_schema), None
+    tree, table = _parse_with_positions(text, root_keys, alias_budget, intern, core_schema)
+    return tree, table.dump(tree)
+
+
+def _parse_sections(
+    data: Any,
+    executor: Executor,
+    positions: bool,
+    root_keys: Optional[Collection[str]],
+    alias_budget: Optional[int],
+    intern: bool,
+    core_schema: bool,
+) -> Optional[Tuple[Any, Optional[SourcePositions]]]:
+    """Parse the root keys of data in groups on executor and stitch them back
+    together, or return None if data can't be split.
+
+    Each group is padded with empty lines so that its sections keep their line
+    numbers. Aliases only resolve within a group, and alias_budget applies to
+    each group.
+    """
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    elif isinstance(data, (bytearray, memoryview, mmap.mmap)):
+        data = memoryview(data).cast("B").tobytes()
+    elif not isinstance(data, bytes):
+        return None
+    if len(data) < PARALLEL_THRESHOLD:
+        return None
+    sections = _split_sections(data)
+    if sections is None:
+        return None
+    if root_keys is not None:
+        # drop whole groups, sections defining anchors must stay with their users
+        groups = _group_sections(data, sections, 0)
+        groups = [group for group in groups if any(sections[i][0] in root_keys for i in group)]
+        kept = sorted(idx for group in groups for idx in group)
+        sections = [sections[idx] for idx in kept]
+    groups = _group_sections(data, sections, PARALLEL_THRESHOLD // 4)
+    if len(groups) < 2:
+        return None
+
+    futures = []
+    for group in groups:
+        chunks = []
+        line = 0
+        for idx in group:
+            _, start, end = sections[idx]
+            section_line = data.count(b"\n", 0, start)
+            chunks.append(b"\n" * (section_line - line))
+            chunks.append(data[start:end])
+            line = section_line + data.count(b"\n", start, end)
+        text = b"".join(chunks)
+        futures.append(
+            executor.submit(
+                _parse_group, text, positions, root_keys, alias_budget, intern, core_schema
+            )
+        )
+    try:
+        results = [future.result() for future in futures]
+    except yaml.YAMLError:
+        return None
+
+    values = {}
+    for group, (tree, _) in zip(groups, results):
+        keys = [sections[idx][0] for idx in group]
+        if root_keys is not None:
+            keys = [key for key in keys if key in root_keys]
+        # a line that looked like a root key but wasn't
+        if not isinstance(tree, dict) or list(tree) != list(dict.fromkeys(keys)):
+            return None
+        values.update(tree)
+
+    # reuse the root of the group with the first key, which has the
+    # position serial parsing would have given the root
+    first = min(range(len(groups)), key=lambda idx: groups[idx][0])
+    root = results[first][0]
+    root.clear()
+    for key, _, _ in sections:
+        if key in values:
+            root[key] = values[key]
+    if intern:
+        # the groups were pickled back from other processes
+        intern_tree(root)
+    if not positions:
+        return root, None
+
+    first_key = _SECTION_START.search(data)
+    assert first_key is not None
+    tables = []
+    for idx, (tree, dumped) in enumerate(results):
+        assert dumped is not None
+        if idx == first:
+            # serial parsing puts the root at the first key, even if dropped
+            dumped[0][0] = data.count(b"\n", 0, first_key.start())
+            dumped[1][0] = 0
+        else:
+            # the other roots are garbage now, their ids may be reused
+            dumped[0][0] = _NO_POSITION
+        tables.append(SourcePositions.load(tree, dumped))
+    return root, SourcePositions.merge(tables, [None] * len(tables))
+
+
+def _parse(
+    data: Any,
+    root_keys: Optional[Collection[str]] = None,
+    alias_budget: Optional[int] = ALIAS_BUDGET,
+    intern: bool = False,
+    core_schema: bool = False,
+    executor: Optional[Executor] = None,
+) -> Any:
+    if executor is not None:
+        result = _parse_sections(
+            data, executor, False, root_keys, alias_budget, intern, core_schema
+        )
+        if result is not None:
+            return result[0]
+    loader_cls = _loader_class(False, intern, core_schema)
+    return _construct(loader_cls(_stream(data)), root_keys, alias_budget)
+
+
+def _parse_with_positions(
+    data: Any,
+    root_keys: Optional[Collection[str]] = None,
+    alias_budget: Optional[int] = ALIAS_BUDGET,
+    intern: bool = False,
+    core_schema: bool = False,
+    executor: Optional[Executor] = None,
+) -> Tuple[Any, SourcePositions]:
+    if executor is not None:
+        result = _parse_sections(data, executor, True, root_keys, alias_budget, intern, core_schema)
+        if result is not None:
+            return result  # type: ignore
+    loader = _loader_class(True, intern, core_schema)(_stream(data))
+    tree = _construct(loader, root_keys, alias_budget)
+    loader.positions.retain(tree)
+    return tree, loader.positions
+
+
+def load(
+    data: Any,
+    positions: bool = False,
+    root_keys: Optional[Collection[str]] = None,
+    alias_budget: Optional[int] = ALIAS_BUDGET,
+    intern: bool = False,
+    core_schema: bool = False,
+    executor: Optional[Executor] = None,
+    lazy: bool = False,
+) -> dict:
+    """Given a file handle, str, or bytes-like buffer (including memoryview
+    and mmap objects), load yaml.
+
+    :param positions: record source positions, see position_of()
+    :param root_keys: if given, only build Python objects for these root keys.
+        Everything else is still parsed, so the document must be valid yaml and
+        anchors defined elsewhere still resolve, but it is never constructed.
+    :param alias_budget: raise a RuntimeError if aliases add more than this
+        many nodes to the (selected part of the) document or if an alias
+        refers to a node that contains it, None to skip this check.
+    :param intern: intern mapping keys and string values of up to
+        INTERN_MAX_LENGTH characters, so repeated names share one object.
+    :param core_schema: resolve plain scalars with the YAML 1.2 core schema, as
+        Evergreen does, instead of PyYAML's YAML 1.1 rules. "yes", "off" and
+        dates stay strings, and fewer patterns are tried per scalar.
+    :param executor: if given, str and bytes-like data of at least
+        PARALLEL_THRESHOLD bytes is split at its root keys, and independent
+        groups of root keys are parsed concurrently on it. Use a
+        ProcessPoolExecutor, parsing holds the GIL. The result equals the one
+        of parsing serially.
+    :param lazy: only parse the entries of the root keys in LAZY_KEYS when
+        they are first read, see find_named(). The raw data is kept in memory
+        until they all are. The executor isn't used then.
+    """
+    if lazy:
+        return _load_lazy(data, positions, root_keys, alias_budget, intern, core_schema)
+    if not positions:
+        return ReadOnlyDict(_parse(data, root_keys, alias_budget, intern, core_schema, executor))
+    yaml_dict, table = _parse_with_positions(
+        data, root_keys, alias_budget, intern, core_schema, executor
+    )
+    return ReadOnlyDict(yaml_dict, positions=table)
+
+
+# Lazy loading, see load(lazy=True). The entries of the root keys in
+# LAZY_KEYS are located in the raw file and only parsed when first read.
+# Everything else is parsed up front, along with every entry that may define
+# or refer to an anchor, so aliases keep resolving to shared objects.
+
+# Root keys whose entries are parsed on demand. functions is a mapping, the
+# others are sequences.
+LAZY_KEYS = frozenset(["functions", "tasks", "task_groups", "buildvariants"])
+
+_HEADER = re.compile(rb"[^:\n]*:[ \t]*(?:#[^\n]*)?\r?\n")
+_SEQUENCE_ENTRY = re.compile(rb"-(?:[ \t]|\r?$)", re.MULTILINE)
+_MAPPING_KEY = re.compile(
+    rb"(?:\"(?:[^\"\\\n]|\\.)*\"|'(?:[^'\n]|'')*'|[^\s#?\-\[\]{},&*!|>'\"%@`][^\n]*?):(?=\s|$)"
+)
+# "- name: value" on the first line of a sequence entry
+_NAME = re.compile(rb"-[ \t]+name:[ \t]+([^\s#'\"&*!|>{}\[\],][^\n#]*?)[ \t]*(?:#[^\n]*)?\r?$")
+
+
+class _Entry(NamedTuple):
+    """An entry that hasn't been parsed yet."""
+
+    start: int
+    end: int
+    line: int
+    # a hint from the raw text, the name of the parsed entry may differ
+    name: Optional[str]
+
+
+class _LazySource:
+    """The raw file behind the lazy entries of a document."""
+
+    __slots__ = ("data", "positions", "options", "containers", "replaced")
+
+    def __init__(
+        self,
+        data: bytes,
+        positions: Optional[SourcePositions],
+        alias_budget: Optional[int],
+        intern: bool,
+        core_schema: bool,
+    ) -> None:
+        self.data = data
+        self.positions = positions
+        self.options = (alias_budget, intern, core_schema)
+        self.containers: List[Union["_LazySequence", "_LazyMapping"]] = []
+        # nodes replaced by lazy containers, kept alive so their ids, which
+        # may still be in positions, aren't reused
+        self.replaced: List[Any] = []
+
+    def parse(self, entry: _Entry) -> Any:
+        """Parse entry, which is alone in a sequence or mapping of its own."""
+        text = self.data[entry.start : entry.end]
+        if self.positions is None:
+            tree = _parse(text, None, *self.options)
+        else:
+            tree, table = _parse_with_positions(text, None, *self.options)
+        if isinstance(tree, list) and len(tree) == 1:
+            value = tree[0]
+        elif isinstance(tree, dict) and len(tree) == 1:
+            value = next(iter(tree.values()))
+        else:
+            raise RuntimeError(f"line {entry.line + 1}: could not parse the entry on its own")
+
+        if self.positions is not None:
+            # skip the wrapper, it is garbage once we return
+            for node in _walk(value):
+                position = table.get(node)
+                if position is not None:
+                    self.positions.add(node, entry.line + position.line - 1, position.column - 1)
+        return value
+
+    def materialize(self) -> None:
+        """Parse every entry that hasn't been read yet."""
+        for container in self.containers:
+            container._materialize()
+
+
+class _LazySequence(list):
+    """A sequence whose entries are parsed when they are read.
+
+    Like the read-only views, it keeps its items out of its list storage,
+    which stays empty until every entry is parsed, see _materialize().
+    """
+
+    __slots__ = ("_items", "_source")
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, items: List[Any], source: _LazySource) -> None:
+        self._items = items
+        self._source = source
+
+    def _get(self, idx: int) -> Any:
+        item = self._items[idx]
+        if type(item) is _Entry:
+            item = self._items[idx] = self._source.parse(item)
+        return item
+
+    def _materialize(self) -> None:
+        if list.__len__(self) != len(self._items):
+            list.extend(self, [self._get(idx) for idx in range(len(self._items))])
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self._get(idx) for idx in range(*index.indices(len(self._items)))]
+        return self._get(index)
+
+    def __iter__(self) -> Iterator:
+        return (self._get(idx) for idx in range(len(self._items)))
+
+    def __reversed__(self) -> Iterator:
+        return (self._get(idx) for idx in reversed(range(len(self._items))))
+
+    def __contains__(self, value: object) -> bool:
+        return any(item == value for item in self)
+
+    def index(self, value: Any, *args: Any) -> int:
+        return list(self).index(value, *args)
+
+    def count(self, value: Any) -> int:
+        return list(self).count(value)
+
+    def copy(self) -> list:
+        return list(self)
+
+    def __add__(self, other: Any) -> list:
+        return list(self) + list(other)
+
+    def __radd__(self, other: Any) -> list:
+        return list(other) + list(self)
+
+    def __eq__(self, other: object) -> bool:
+        return list(self) == other
+
+    def __ne__(self, other: object) -> bool:
+        return list(self) != other
+
+    def __lt__(self, other: Any) -> bool:
+        return list(self) < other
+
+    def __le__(self, other: Any) -> bool:
+        return list(self) <= other
+
+    def __gt__(self, other: Any) -> bool:
+        return list(self) > other
+
+    def __ge__(self, other: Any) -> bool:
+        return list(self) >= other
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def __reduce__(self) -> Tuple:
+        return (list, (list(self),))
+
+    def __copy__(self) -> list:
+        return list(self)
+
+    def __deepcopy__(self, memo: dict) -> list:
+        return copy.deepcopy(list(self), memo)
+
+
+class _LazyMapping(dict):
+    """A mapping whose values are parsed when they are read, see
+    _LazySequence."""
+
+    __slots__ = ("_items", "_source")
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, items: Dict[Any, Any], source: _LazySource) -> None:
+        self._items = items
+        self._source = source
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self._items[key]
+        if type(value) is _Entry:
+            value = self._items[key] = self._source.parse(value)
+        return value
+
+    def _materialize(self) -> None:
+        if dict.__len__(self) != len(self._items):
+            dict.update(self, [(key, self[key]) for key in self._items])
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        return self[key] if key in self._items else default
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._items
+
+    def __iter__(self) -> Iterator:
+        return iter(self._items)
+
+    def __reversed__(self) -> Iterator:
+        return reversed(self._items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def keys(self) -> KeysView:  # type: ignore
+        return self._items.keys()
+
+    def values(self) -> Any:
+        return [self[key] for key in self._items]
+
+    def items(self) -> Any:
+        return [(key, self[key]) for key in self._items]
+
+    def copy(self) -> dict:
+        return dict(self.items())
+
+    def __eq__(self, other: object) -> bool:
+        return dict(self.items()) == other
+
+    def __ne__(self, other: object) -> bool:
+        return dict(self.items()) != other
+
+    def __or__(self, other: Any) -> dict:
+        return {**self, **other}
+
+    def __ror__(self, other: Any) -> dict:
+        return {**other, **self}
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def __reduce__(self) -> Tuple:
+        return (dict, (dict(self.items()),))
+
+    def __copy__(self) -> dict:
+        return self.copy()
+
+    def __deepcopy__(self, memo: dict) -> dict:
+        return copy.deepcopy(dict(self.items()), memo)
+
+
+def _index_section(
+    data: bytes, key: str, start: int, end: int
+) -> Optional[Tuple[List[_Entry], int]]:
+    """Return the entries of the root key in data[start:end] and their
+    indentation, or None if it isn't a block sequence (or for functions, a
+    block mapping) that can be split at lines alone."""
+    # the first section starts with the comments before its key
+    key_line = _SECTION_START.search(data, start, end)
+    if key_line is None:
+        return None
+    header = _HEADER.match(data, key_line.start(), end)
+    if header is None:
+        return None
+    mapping = key == "functions"
+    entries: List[_Entry] = []
+    indent = -1
+    line = data.count(b"\n", 0, header.end())
+    pos = header.end()
+    while pos < end:
+        eol = data.find(b"\n", pos, end)
+        eol = end if eol < 0 else eol + 1
+        text = data[pos:eol]
+        stripped = text.lstrip(b" ")
+        if stripped.strip() and not stripped.startswith(b"#"):
+            if stripped.startswith(b"\t"):
+                return None
+            current = len(text) - len(stripped)
+            if indent < 0:
+                indent = current
+                if mapping and indent == 0:
+                    return None
+            if current < indent:
+                return None
+            if current == indent:
+                if mapping:
+                    if not _MAPPING_KEY.match(stripped):
+                        return None
+                    name = None
+                else:
+                    if not _SEQUENCE_ENTRY.match(stripped):
+                        return None
+                    match = _NAME.match(stripped)
+                    name = match.group(1).decode("utf-8", "replace") if match else None
+                if entries:
+                    entries[-1] = entries[-1]._replace(end=pos)
+                entries.append(_Entry(pos, end, line, name))
+            elif entries and entries[-1].line == line - 1 and entries[-1].name is not None:
+                # a plain name that goes on over several lines
+                if not _MAPPING_KEY.match(stripped) and not _SEQUENCE_ENTRY.match(stripped):
+                    entries[-1] = entries[-1]._replace(name=None)
+        line += 1
+        pos = eol
+    if not entries:
+        return None
+    return entries, indent
+
+
+def _independent(data: bytes, entry: _Entry, anchors: set, aliases: set) -> bool:
+    """Whether entry can be parsed on its own: it neither refers to an anchor
+    nor defines one that is referred to. Both are matched on the raw text, so
+    a "&&" or "*.log" in a script may make an entry look dependent."""
+    if any(name in aliases for name in _ANCHOR.findall(data, entry.start, entry.end)):
+        return False
+    return not any(name in anchors for name in _ALIAS.findall(data, entry.start, entry.end))
+
+
+def _entry_key(data: bytes, entry: _Entry, indent: int, options: Tuple) -> Any:
+    match = _MAPPING_KEY.match(data, entry.start + indent)
+    assert match is not None
+    return next(iter(_parse(match.group(0), None, *options)))
+
+
+def _to_bytes(data: Any) -> bytes:
+    if isinstance(data, str):
+        return data.encode("utf-8")
+    if hasattr(data, "read"):
+        data = data.read()
+        return data.encode("utf-8") if isinstance(data, str) else bytes(data)
+    return bytes(data)
+
+
+def _load_lazy(
+    data: Any,
+    positions: bool,
+    root_keys: Optional[Collection[str]],
+    alias_budget: Optional[int],
+    intern: bool,
+    core_schema: bool,
+) -> dict:
+    raw = _to_bytes(data)
+    options = (alias_budget, intern, core_schema)
+    indexed: Dict[str, Tuple[List[_Entry], int]] = {}
+    for key, start, end in _split_sections(raw) or []:
+        if key not in LAZY_KEYS or (root_keys is not None and key not in root_keys):
+            continue
+        if key in indexed:
+            # the last definition of a key wins, leave that to the parser
+            indexed = {}
+            break
+        index = _index_section(raw, key, start, end)
+        if index is not None:
+            indexed[key] = index
+
+    anchors = set(_ANCHOR.findall(raw))
+    aliases = set(_ALIAS.findall(raw))
+    # per indexed key, the entry to parse on demand or None for the entries
+    # that are parsed now
+    lazy: Dict[str, List[Optional[_Entry]]] = {}
+    chunks = []
+    pos = 0
+    for key, (entries, _) in indexed.items():
+        lazy[key] = []
+        for entry in entries:
+            if not _independent(raw, entry, anchors, aliases):
+                lazy[key].append(None)
+                continue
+            lazy[key].append(entry)
+            # blank the entry out of what is parsed now, keeping line numbers
+            chunks.append(raw[pos : entry.start])
+            chunks.append(b"\n" * raw.count(b"\n", entry.start, entry.end))
+            pos = entry.end
+    chunks.append(raw[pos:])
 
-    # pylint: disable=no-self-use
-    def __readonly__(self, *args, **kwargs):
-        raise RuntimeError("Rules must not modify the yaml dictionary")
+    base = b"".join(chunks)
+    if positions:
+        tree, table = _parse_with_positions(base, root_keys, *options)
+    else:
+        tree, table = _parse(base, root_keys, *options), None
+    if not any(entry is not None for entries in lazy.values() for entry in entries):
+        return ReadOnlyDict(tree, positions=table)
 
-    __setitem__ = __readonly__
-    __delitem__ = __readonly__
-    pop = __readonly__  # type: ignore
-    popitem = __readonly__
-    clear = __readonly__
-    update = __readonly__  # type: ignore
-    setdefault = __readonly__  # type: ignore
-    del __readonly__
+    source = _LazySource(raw, table, *options)
+    for key, placeholders in lazy.items():
+        entries, indent = indexed[key]
+        parsed = tree.get(key)
+        if key == "functions":
+            parsed_items = list((parsed or {}).items()) if isinstance(parsed or {}, dict) else []
+        else:
+            parsed_items = list(parsed or []) if isinstance(parsed or [], list) else []
+        if len(parsed_items) != placeholders.count(None):
+            # the raw text didn't split the way the parser does
+            return load(raw, positions, root_keys, *options)
 
+        remaining = iter(parsed_items)
+        value: Union[_LazySequence, _LazyMapping]
+        if key == "functions":
+            value = _LazyMapping(
+                dict(
+                    next(remaining)
+                    if entry is None
+                    else (_entry_key(raw, entry, indent, options), entry)
+                    for entry in placeholders
+                ),
+                source,
+            )
+        else:
+            value = _LazySequence(
+                [next(remaining) if entry is None else entry for entry in placeholders], source
+            )
+        if table is not None:
+            # where the parser would have put the first entry
+            table.add(value, entries[0].line, indent)
+        source.containers.append(value)
+        source.replaced.append(parsed)
+        tree[key] = value
+    doc = _Document(table)
+    doc.lazy = source
+    return ReadOnlyDict(tree, _doc=doc)
 
-def load_file(yaml_file: Union[str, os.PathLike]) -> dict:
-    """Load yaml from a file on disk."""
-    with open(yaml_file) as fh:
-        return load(fh)
 
+def find_named(sequence: List[Any], name: str) -> List[Any]:
+    """Return the entries of sequence whose name is name, in order.
 
-def load(data: Any) -> dict:
-    """Given a file handle or buffer, load yaml."""
-    yaml_dict = yaml.safe_load(data)
-    return ReadOnlyDict(yaml_dict)
+    For a sequence of a document loaded with lazy=True, entries whose name in
+    the raw text is a different one are not parsed.
+    """
+    data = sequence._data if isinstance(sequence, ReadOnlyList) else sequence
+    found = []
+    for idx in range(len(data)):
+        if isinstance(data, _LazySequence):
+            entry = data._items[idx]
+            if type(entry) is _Entry and entry.name is not None and entry.name != name:
+                continue
+        item = sequence[idx]
+        if isinstance(item, dict) and item.get("name") == name:
+            found.append(item)
+    return found
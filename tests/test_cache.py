@@ -0,0 +1,78 @@
+"""Tests for evergreen_lint.cache."""
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from evergreen_lint import yamlhandler
+from evergreen_lint.cache import ParseCache
+
+MONGO_YML = os.path.join(os.path.dirname(__file__), "yml", "mongo.yml")
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.directory = self._tmp.name
+
+    def _entries(self):
+        return sorted(
+            name
+            for name in os.listdir(self.directory)
+            if name.endswith(".pickle") and not name.startswith(".")
+        )
+
+    def test_key_depends_on_content(self):
+        self.assertEqual(ParseCache.key(b"a: 1"), ParseCache.key(b"a: 1"))
+        self.assertNotEqual(ParseCache.key(b"a: 1"), ParseCache.key(b"a: 2"))
+
+    def test_warm_load_skips_parsing(self):
+        cache = ParseCache(self.directory)
+        cold = yamlhandler.load_file(MONGO_YML, cache=cache)
+        self.assertEqual(len(self._entries()), 1)
+
+        with mock.patch.object(yamlhandler, "_parse", side_effect=AssertionError("parsed")):
+            warm = yamlhandler.load_file(MONGO_YML, cache=cache)
+
+        self.assertIsInstance(warm, yamlhandler.ReadOnlyDict)
+        self.assertEqual(warm, cold)
+
+    def test_changed_content_misses(self):
+        cache = ParseCache(self.directory)
+        path = os.path.join(self.directory, "evergreen.yml")
+        for value in (1, 2):
+            with open(path, "w") as fh:
+                fh.write(f"a: {value}\n")
+            self.assertEqual(yamlhandler.load_file(path, cache=cache), {"a": value})
+        self.assertEqual(len(self._entries()), 2)
+
+    def test_corrupt_entry_is_a_miss(self):
+        cache = ParseCache(self.directory)
+        key = cache.key(b"a: 1")
+        with open(os.path.join(self.directory, key + ".pickle"), "wb") as fh:
+            fh.write(b"not a pickle")
+        self.assertEqual(cache.load(b"a: 1", yamlhandler._parse), {"a": 1})
+        self.assertEqual(cache.get(key), {"a": 1})
+
+    def test_lru_eviction(self):
+        cache = ParseCache(self.directory)
+        for i, key in enumerate(("old", "recent", "new")):
+            cache.put(key, "x" * 1000)
+            os.utime(os.path.join(self.directory, key + ".pickle"), (i, i))
+        # touching "old" makes it the most recently used entry
+        self.assertIsNotNone(cache.get("old"))
+        os.utime(os.path.join(self.directory, "recent.pickle"), (0, 0))
+
+        cache.max_bytes = 2500
+        cache.evict()
+        self.assertEqual(self._entries(), ["new.pickle", "old.pickle"])
+
+    def test_aliases_stay_shared(self):
+        cache = ParseCache(self.directory)
+        path = os.path.join(self.directory, "evergreen.yml")
+        with open(path, "w") as fh:
+            fh.write("functions:\n  f: &f\n    command: shell.exec\npre:\n- *f\n")
+        for _ in range(2):
+            doc = yamlhandler.load_file(path, cache=cache)
+            self.assertIs(doc["pre"][0], doc["functions"]["f"])
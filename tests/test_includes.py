@@ -0,0 +1,179 @@
+"""Tests for evergreen_lint.includes."""
+import os
+import tempfile
+import textwrap
+import unittest
+from unittest import mock
+
+from evergreen_lint import helpers as h
+from evergreen_lint import includes, yamlhandler
+from evergreen_lint.includes import ProjectLoader
+from evergreen_lint.yamlhandler import unwrap
+
+
+class TestProjectLoader(unittest.TestCase):
+    FILES = {
+        "main.yml": """
+            include:
+            - filename: etc/functions.yml
+            - filename: etc/tasks.yml
+            - filename: etc/elsewhere.yml
+              module: enterprise
+            functions:
+              f_main:
+                command: shell.exec
+            buildvariants:
+            - name: linux
+              tasks:
+              - name: compile
+            """,
+        "other.yml": """
+            include:
+            - filename: etc/functions.yml
+            tasks:
+            - name: other
+            """,
+        "etc/functions.yml": """
+            functions:
+              f_included:
+              - command: subprocess.exec
+            """,
+        "etc/tasks.yml": """
+            tasks:
+            - name: compile
+              commands:
+              - func: f_included
+            buildvariants:
+            - name: linux
+              tasks:
+              - name: lint
+            """,
+    }
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        for name, content in self.FILES.items():
+            self._write(name, content)
+        self.loader = ProjectLoader(positions=True)
+        self.addCleanup(self.loader.close)
+
+    def _write(self, name, content):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as fh:
+            fh.write(textwrap.dedent(content))
+        return path
+
+    def _load(self, name):
+        return self.loader.load(os.path.join(self.root, name))
+
+    def test_merges_included_files(self):
+        project = self._load("main.yml")
+        self.assertEqual(set(project["functions"]), {"f_main", "f_included"})
+        self.assertEqual([task["name"] for task in project["tasks"]], ["compile"])
+        self.assertEqual(
+            project["buildvariants"],
+            [{"name": "linux", "tasks": [{"name": "compile"}, {"name": "lint"}]}],
+        )
+
+    def test_included_positions_name_the_file(self):
+        contexts = [context for context, _ in h.iterate_commands(self._load("main.yml"))]
+        self.assertEqual(
+            contexts,
+            [
+                "Function 'f_main', command (line 9, column 5)",
+                f"Function 'f_included', command 0 ({os.path.join('etc', 'functions.yml')}, "
+                "line 4, column 5)",
+            ],
+        )
+
+    def test_shared_includes_are_loaded_once(self):
+        with mock.patch.object(includes, "load_file", wraps=includes.load_file) as load_file:
+            main = self._load("main.yml")
+            other = self._load("other.yml")
+        loaded = [os.path.relpath(call.args[0], self.root) for call in load_file.call_args_list]
+        self.assertEqual(loaded.count(os.path.join("etc", "functions.yml")), 1)
+        self.assertIs(
+            unwrap(main["functions"]["f_included"]), unwrap(other["functions"]["f_included"])
+        )
+        # merging build variants must not leak into the included file
+        self.assertEqual(len(self._load("etc/tasks.yml")["buildvariants"][0]["tasks"]), 1)
+
+    def test_scan_reads_each_file_once(self):
+        loader = ProjectLoader(scan=lambda content: b"subprocess.exec" in content)
+        self.addCleanup(loader.close)
+        with mock.patch.object(yamlhandler, "read_file", wraps=yamlhandler.read_file) as read:
+            loader.load(os.path.join(self.root, "main.yml"))
+        main = os.path.join(self.root, "main.yml")
+        self.assertEqual(len(read.call_args_list), len(loader.sources[main]))
+        self.assertEqual(
+            {os.path.relpath(path, self.root): found for path, found in loader.scanned.items()},
+            {
+                "main.yml": False,
+                os.path.join("etc", "functions.yml"): True,
+                os.path.join("etc", "tasks.yml"): False,
+            },
+        )
+
+    def test_duplicate_definitions(self):
+        self._write("dup.yml", "include:\n- filename: main.yml\nfunctions:\n  f_main: {}\n")
+        with self.assertRaisesRegex(RuntimeError, "functions 'f_main' is defined in both"):
+            self._load("dup.yml")
+        self._write(
+            "dup.yml", "include:\n- filename: etc/tasks.yml\npre: []\nexec_timeout_secs: 1\n"
+        )
+        self._write("etc/tasks.yml", "exec_timeout_secs: 2\n")
+        with self.assertRaisesRegex(RuntimeError, "'exec_timeout_secs' is defined in both"):
+            ProjectLoader().load(os.path.join(self.root, "dup.yml"))
+
+    def test_missing_include(self):
+        self._write("broken.yml", "include:\n- filename: nope.yml\n")
+        with self.assertRaisesRegex(RuntimeError, "cannot include"):
+            self._load("broken.yml")
+
+    def test_generated_fragments(self):
+        fragments = [
+            self._write(
+                "generated/0.json",
+                '{"tasks": [{"name": "gen_0", "commands": [{"command": "shell.exec"}]}],\n'
+                ' "buildvariants": [{"name": "linux", "tasks": [{"name": "gen_0"}]}]}',
+            ),
+            self._write(
+                "generated/1.json",
+                '{"tasks": [{"name": "gen_1"}],\n'
+                ' "buildvariants": [{"name": "linux", "tasks": [{"name": "gen_1"}]},\n'
+                '                   {"name": "new", "tasks": [{"name": "gen_1"}]}]}',
+            ),
+        ]
+        project = self.loader.load_generated(os.path.join(self.root, "main.yml"), fragments)
+        self.assertEqual([task["name"] for task in project["tasks"]], ["compile", "gen_0", "gen_1"])
+        self.assertEqual(
+            [[task["name"] for task in variant["tasks"]] for variant in project["buildvariants"]],
+            [["compile", "lint", "gen_0", "gen_1"], ["gen_1"]],
+        )
+        contexts = [context for context, _ in h.iterate_commands(project)]
+        self.assertIn(
+            f"Task 'gen_0', command 0 ({os.path.join('generated', '0.json')}, line 1, column 43)",
+            contexts,
+        )
+        self.assertEqual(
+            self.loader.sources[os.path.join(self.root, "main.yml")][-2:],
+            [os.path.join(self.root, fragment) for fragment in fragments],
+        )
+        # the loaded project files are left alone
+        self.assertEqual(len(self._load("main.yml")["buildvariants"][0]["tasks"]), 2)
+
+    def test_generated_fragments_may_be_streamed(self):
+        paths = (
+            self._write(f"generated/{idx}.json", f'{{"tasks": [{{"name": "gen_{idx}"}}]}}')
+            for idx in range(3)
+        )
+        project = self.loader.load_generated(os.path.join(self.root, "other.yml"), paths)
+        self.assertEqual(len(project["tasks"]), 4)
+
+    def test_generated_duplicate_function(self):
+        fragment = self._write("generated/0.json", '{"functions": {"f_main": {}}}')
+        with self.assertRaisesRegex(RuntimeError, "functions 'f_main' is defined in both"):
+            self.loader.load_generated(os.path.join(self.root, "main.yml"), [fragment])
@@ -1,3 +1,5 @@
+from unittest import mock
+
 from click.testing import CliRunner
 
 import evergreen_lint.__main__ as ut
@@ -26,3 +28,40 @@ def test_with_errs_custom_url():
         "For help resolving errors, see the helpful documentation at http://example.com"
     ) in res.output
     assert res.exit_code == 1
+
+
+def test_generated(tmp_path):
+    (tmp_path / "generate.json").write_text(
+        '{"tasks": [{"name": "gen", "commands": [{"command": "shell.exec"}]}]}'
+    )
+    runner = CliRunner()
+    res = runner.invoke(
+        ut.main, ["-c", "tests/yml/config.yml", "lint", "--generated", str(tmp_path)]
+    )
+    assert "Task 'gen', command 0" in res.output
+    assert res.exit_code == 1
+
+
+def test_core_schema_is_opt_in():
+    runner = CliRunner()
+    with mock.patch.object(ut, "ProjectLoader", wraps=ut.ProjectLoader) as loader:
+        assert runner.invoke(ut.main, ["-c", "tests/yml/config.yml", "lint"]).exit_code == 0
+        res = runner.invoke(ut.main, ["-c", "tests/yml/config.yml", "lint", "--core-schema"])
+        assert res.exit_code == 0
+    assert [call.kwargs["core_schema"] for call in loader.call_args_list] == [False, True]
+
+
+def test_alias_budget():
+    runner = CliRunner()
+    args = ["-c", "tests/yml/config.yml", "lint"]
+    with mock.patch.object(ut, "ProjectLoader", wraps=ut.ProjectLoader) as loader:
+        runner.invoke(ut.main, args)
+        # 0 is a budget like any other, not "no limit"
+        res = runner.invoke(ut.main, [*args, "--alias-budget", "0"])
+        assert "alias budget" in str(res.exception)
+        assert runner.invoke(ut.main, [*args, "--no-alias-budget"]).exit_code == 0
+    assert [call.kwargs["alias_budget"] for call in loader.call_args_list] == [
+        ut.ALIAS_BUDGET,
+        0,
+        None,
+    ]
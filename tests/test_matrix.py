@@ -0,0 +1,117 @@
+"""Tests for evergreen_lint.matrix."""
+import textwrap
+import unittest
+from unittest import mock
+
+from evergreen_lint import matrix
+from evergreen_lint.matrix import expand_matrix, iterate_variants
+from evergreen_lint.yamlhandler import load
+
+
+class TestExpandMatrix(unittest.TestCase):
+    def setUp(self):
+        # the example in the module docstring
+        self.yaml = load(textwrap.dedent(matrix.__doc__.split("\n\n")[2]))
+
+    def test_cells(self):
+        variants = list(iterate_variants(self.yaml))
+        self.assertEqual(
+            [variant["name"] for variant in variants],
+            [
+                "tests__os~linux_arch~x86_64",
+                "tests__os~linux_arch~arm64",
+                "tests__os~windows_arch~x86_64",
+            ],
+        )
+        linux = variants[0]
+        self.assertEqual(linux["display_name"], "Linux x86_64")
+        self.assertEqual(linux["run_on"], ["ubuntu2204-large"])
+        self.assertEqual(
+            linux["expansions"], {"arch": "x86_64", "os": "linux", "python": "/usr/bin/python3"}
+        )
+        self.assertEqual(linux["tasks"], [{"name": "unit"}, {"name": "lint"}])
+        self.assertEqual(variants[2]["tasks"], [{"name": "unit"}])
+        self.assertNotIn("run_on", variants[2])
+
+    def test_cell_names_follow_the_axes(self):
+        yaml = load(
+            """
+            axes:
+            - id: os
+              values: [{id: linux}]
+            - id: arch
+              values: [{id: arm64}]
+            - id: compiler
+              values: [{id: gcc}]
+            buildvariants:
+            - matrix_name: m
+              matrix_spec: {compiler: "*", arch: "*", os: "*"}
+            """
+        )
+        variants = list(iterate_variants(yaml))
+        # not in matrix_spec or name order
+        self.assertEqual(
+            [variant["name"] for variant in variants], ["m__os~linux_arch~arm64_compiler~gcc"]
+        )
+        self.assertEqual(variants[0]["display_name"], "linux arm64 gcc")
+
+    def test_rules_and_defaults(self):
+        yaml = load(
+            """
+            axes:
+            - id: size
+              values:
+              - id: small
+                display_name: Small
+                tags: ["small-${size}"]
+                variables: {memory: "1"}
+              - id: large
+                display_name: Large
+                batchtime: 60
+            buildvariants:
+            - name: literal
+            - matrix_name: m
+              matrix_spec: {size: "*"}
+              tags: [matrix]
+              tasks: [{name: a}, {name: b}]
+              rules:
+              - if: [{size: small}]
+                then:
+                  remove_tasks: [b]
+                  set: {run_on: ["tiny-${memory}"]}
+            """
+        )
+        variants = list(iterate_variants(yaml))
+        self.assertEqual(variants[0], {"name": "literal"})
+        small, large = variants[1:]
+        self.assertEqual(small["display_name"], "Small")
+        self.assertEqual(small["tags"], ["matrix", "small-small"])
+        self.assertEqual(small["tasks"], [{"name": "a"}])
+        self.assertEqual(small["run_on"], ["tiny-1"])
+        self.assertEqual(large["tags"], ["matrix"])
+        self.assertEqual(large["batchtime"], 60)
+        self.assertEqual(large["tasks"], [{"name": "a"}, {"name": "b"}])
+        with self.assertRaises(RuntimeError):
+            small["name"] = "x"
+
+    def test_cells_are_generated_lazily(self):
+        values = "\n".join(f"    - id: v{idx}" for idx in range(20))
+        axes = "\n".join(f"- id: axis{axis}\n  values:\n{values}" for axis in range(3))
+        yaml = load(
+            f"axes:\n{axes}\nbuildvariants:\n- matrix_name: big\n"
+            "  matrix_spec: {axis0: '*', axis1: '*', axis2: '*'}\n"
+        )
+        with mock.patch.object(
+            matrix._Fragment, "extend", autospec=True, side_effect=matrix._Fragment.extend
+        ) as extend:
+            cells = expand_matrix(yaml["buildvariants"][0], yaml["axes"])
+            first = next(cells)
+            self.assertEqual(first["name"], "big__axis0~v0_axis1~v0_axis2~v0")
+            self.assertEqual(extend.call_count, 3)
+            self.assertEqual(sum(1 for _ in cells), 20**3 - 1)
+        # one fragment per prefix of axis values, not per axis value of each cell
+        self.assertEqual(extend.call_count, 20 + 20**2 + 20**3)
+
+    def test_unknown_axes_select_nothing(self):
+        yaml = load("buildvariants:\n- matrix_name: m\n  matrix_spec: {missing: '*'}\n")
+        self.assertEqual(list(iterate_variants(yaml)), [])
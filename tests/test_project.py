@@ -0,0 +1,232 @@
+"""Tests for evergreen_lint.project."""
+import os
+import unittest
+from unittest import mock
+
+from evergreen_lint import helpers
+from evergreen_lint.project import PROJECT_BLOCKS, ProjectModel, project_model
+from evergreen_lint.yamlhandler import load, load_file
+
+MONGO = os.path.join(os.path.dirname(__file__), "yml", "mongo.yml")
+
+
+class TestProjectModel(unittest.TestCase):
+    RAW = """
+    functions:
+      f_single: {command: shell.exec}
+      f_list:
+      - command: shell.exec
+        params: {script: echo}
+      - func: f_single
+    tasks:
+    - name: compile
+      tags: release
+    - name: test
+      tags: [release, "unit"]
+      depends_on:
+      - compile
+      - name: lint
+        variant: linux
+      commands:
+      - func: f_list
+      - command: shell.exec
+      - func: f_single
+    - name: test
+      tags: [duplicate]
+    - not a task
+    - tags: [nameless]
+    task_groups:
+    - name: tg
+      tasks: [compile, test]
+    axes:
+    - id: os
+      values:
+      - id: linux
+      - id: macos
+    buildvariants:
+    - name: linux
+      display_name: Linux
+      run_on: ubuntu2204
+      tags: [required]
+      tasks:
+      - name: compile
+      - name: test
+        run_on: [ubuntu2204-large]
+      - name: tg
+      - name: undefined
+    - matrix_name: m
+      matrix_spec: {os: "*"}
+      tasks: [compile]
+    """
+
+    def setUp(self):
+        self.model = project_model(load(self.RAW))
+
+    def test_functions(self):
+        functions = self.model.functions
+        self.assertEqual(list(functions), ["f_single", "f_list"])
+        self.assertEqual(
+            [command.name for command in functions["f_single"].commands], ["shell.exec"]
+        )
+        commands = functions["f_list"].commands
+        self.assertEqual(
+            [(command.name, command.func) for command in commands],
+            [("shell.exec", None), (None, "f_single")],
+        )
+        self.assertEqual(commands[0].params, {"script": "echo"})
+        self.assertEqual(commands[1].params, {})
+
+    def test_tasks(self):
+        tasks = self.model.tasks
+        # malformed tasks are left out, and the first definition of a name wins
+        self.assertEqual(list(tasks), ["compile", "test"])
+        self.assertEqual(tasks["compile"].tags, ("release",))
+        self.assertEqual(tasks["compile"].depends_on, frozenset())
+        self.assertEqual(tasks["compile"].commands, ())
+        test = tasks["test"]
+        self.assertEqual(test.tags, ("release", "unit"))
+        self.assertEqual(test.depends_on, {"compile", "lint"})
+        self.assertEqual(len(test.commands), 3)
+        self.assertEqual(test.functions, ("f_list", "f_single"))
+        self.assertEqual(self.model.task_groups["tg"].tasks, ("compile", "test"))
+
+    def test_variants(self):
+        variants = self.model.variants
+        # matrices are expanded on demand, their cells are not kept
+        self.assertEqual(list(variants), ["linux"])
+        self.assertEqual(
+            [variant.name for variant in self.model.iterate_variants()],
+            ["linux", "m__os~linux", "m__os~macos"],
+        )
+        linux = variants["linux"]
+        self.assertEqual(linux.display_name, "Linux")
+        self.assertEqual(linux.tags, ("required",))
+        self.assertEqual(linux.run_on, ("ubuntu2204",))
+        self.assertEqual([ref.name for ref in linux.tasks], ["compile", "test", "tg", "undefined"])
+        self.assertEqual([ref.run_on for ref in linux.tasks[:2]], [None, ("ubuntu2204-large",)])
+        self.assertEqual(linux.task_names, {"compile", "test", "tg", "undefined"})
+        self.assertEqual([task.name for task in self.model.tasks_in(linux)], ["compile", "test"])
+        self.assertIs(next(self.model.iterate_variants()), linux)
+        cells = {variant.name: variant for variant in self.model.iterate_variants()}
+        self.assertEqual(cells["m__os~macos"].task_names, {"compile"})
+
+        # the first variant or cell with a name wins
+        yaml = load(self.RAW + "- {name: m__os~linux, tasks: [test]}\n    - {name: linux}\n")
+        names = [variant.name for variant in ProjectModel(yaml).iterate_variants()]
+        self.assertEqual(names, ["linux", "m__os~linux", "m__os~macos"])
+
+    def test_tags(self):
+        model = self.model
+        self.assertEqual(list(model.tasks_tagged("release")), ["compile", "test"])
+        self.assertIs(model.tasks_tagged("unit")["test"], model.tasks["test"])
+        # tags of ignored duplicate definitions aren't indexed
+        self.assertEqual(model.tasks_tagged("duplicate"), {})
+        self.assertEqual(model.tasks_tagged("missing"), {})
+        self.assertEqual(set(model.tasks_by_tag), {"release", "unit"})
+        # the index itself can't be modified through the views
+        with self.assertRaises(TypeError):
+            model.tasks_tagged("release")["other"] = model.tasks["test"]  # type: ignore
+        self.assertEqual(list(model.tasks_by_tag["release"]), ["compile", "test"])
+
+        model = ProjectModel(load("tasks: [{name: t, tags: [a, b, a]}]"))
+        self.assertEqual(model.tasks["t"].tags, ("a", "b"))
+
+    def test_built_once(self):
+        yaml = load(self.RAW)
+        self.assertIs(project_model(yaml), project_model(yaml))
+        self.assertIsNot(project_model(yaml), project_model(load(self.RAW)))
+        with mock.patch.object(helpers, "MEMOIZE", False):
+            self.assertIsNot(project_model(yaml), project_model(yaml))
+        # plain dicts work too, they are not memoized
+        self.assertEqual(list(project_model({"tasks": [{"name": "t"}]}).tasks), ["t"])
+
+    def test_root_keys(self):
+        full = ProjectModel(load_file(MONGO))
+        partial = ProjectModel(load_file(MONGO, root_keys=PROJECT_BLOCKS))
+        self.assertEqual(list(partial.tasks), list(full.tasks))
+        self.assertEqual(list(partial.variants), list(full.variants))
+        self.assertEqual(
+            [variant.name for variant in partial.iterate_variants()],
+            [variant.name for variant in full.iterate_variants()],
+        )
+        self.assertEqual(list(partial.functions), list(full.functions))
+
+
+class TestFunctionSummary(unittest.TestCase):
+    RAW = """
+    functions:
+      f_write: &f_write
+        command: expansions.write
+        params: {file: expansions.yml, redacted: true}
+      f_script: &f_script
+        command: subprocess.exec
+        params: {binary: bash, args: [src/evergreen/run.sh]}
+      f_update: &f_update
+        command: expansions.update
+      f_timeout:
+        command: timeout.update
+      f_prelude:
+      - *f_update
+      - *f_write
+      f_safe_script:
+      - func: f_prelude
+      - *f_script
+      f_chain:
+      - func: f_safe_script
+      - func: f_timeout
+      f_loop_a:
+      - func: f_loop_b
+      f_loop_b:
+      - func: f_loop_a
+      - func: f_undefined
+    """
+
+    def setUp(self):
+        self.model = project_model(load(self.RAW))
+
+    def _flags(self, name):
+        summary = self.model.function_summary(name)
+        return {flag for flag in summary.__slots__ if getattr(summary, flag)}  # type: ignore
+
+    def test_call_graph(self):
+        functions = self.model.functions
+        self.assertEqual(functions["f_write"].calls, ())
+        # definitions included through an anchor are commands, not calls
+        self.assertEqual(functions["f_prelude"].calls, ())
+        self.assertEqual(functions["f_safe_script"].calls, ("f_prelude",))
+        self.assertEqual(functions["f_loop_b"].calls, ("f_loop_a", "f_undefined"))
+
+    def test_summaries(self):
+        self.assertEqual(self._flags("f_write"), {"writes_expansions"})
+        self.assertEqual(self._flags("f_script"), {"runs_evergreen_script"})
+        self.assertEqual(self._flags("f_update"), {"updates_expansions"})
+        self.assertEqual(self._flags("f_timeout"), {"updates_timeout"})
+        self.assertEqual(self._flags("f_prelude"), {"writes_expansions"})
+        # the script runs after f_prelude wrote the expansions
+        self.assertEqual(self._flags("f_safe_script"), {"writes_expansions"})
+        self.assertEqual(self._flags("f_chain"), {"updates_timeout"})
+        self.assertEqual(self._flags("f_loop_a"), set())
+        self.assertEqual(self._flags("f_undefined"), set())
+        self.assertIs(
+            self.model.function_summary("f_chain"), self.model.function_summary("f_chain")
+        )
+
+    def test_cycles_do_not_depend_on_order(self):
+        functions = {
+            "f_a": [{"func": "f_b"}],
+            "f_b": [
+                {"func": "f_a"},
+                {
+                    "command": "expansions.write",
+                    "params": {"file": "expansions.yml", "redacted": True},
+                },
+            ],
+            "f_c": [{"func": "f_a"}, {"func": "f_b"}],
+        }
+        for names in (["f_a", "f_b", "f_c"], ["f_c", "f_b", "f_a"]):
+            with self.subTest(order=names):
+                model = ProjectModel({"functions": {name: functions[name] for name in names}})
+                # calls within the cycle count as no effect
+                self.assertFalse(model.function_summary("f_a").writes_expansions)
+                self.assertTrue(model.function_summary("f_b").writes_expansions)
+                self.assertTrue(model.function_summary("f_c").writes_expansions)
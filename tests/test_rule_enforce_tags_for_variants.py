@@ -141,3 +141,34 @@ class TestEnforceTagsForVariants(unittest.TestCase):
 
         violations = self.rule(rule_config, yaml)
         self.assertEqual(len(violations), 1)
+
+    def test_matrix_variants_are_checked(self):
+        rule_config = {
+            "tags": [
+                {
+                    "tag_name": "required",
+                    "variant_config": {"name_regex": ".*", "display_name_regex": "^! .+$"},
+                },
+            ]
+        }
+
+        yaml = load(
+            """
+            axes:
+            - id: os
+              values:
+              - id: linux
+                display_name: Linux
+                tags: [required]
+              - id: macos
+                display_name: macOS
+            buildvariants:
+            - matrix_name: matrix
+              matrix_spec: {os: "*"}
+              display_name: "! ${os}"
+            """
+        )
+
+        violations = self.rule(rule_config, yaml)
+        self.assertEqual(len(violations), 1)
+        self.assertIn("'matrix__os~macos'", violations[0])
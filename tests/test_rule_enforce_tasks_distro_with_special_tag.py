@@ -137,3 +137,35 @@ class TestEnforceTasksDistroWithSpecialTag(unittest.TestCase):
         self.assertEqual(len(violations), 1)
         self.assertIn("task1", violations[0])
         self.assertIn("rhel8.8-small", violations[0])
+
+    def test_errors_in_config_order(self):
+        rule_config = {
+            "tags": [
+                {"task_tag_name": "requires_xlarge_host", "allowed_distro_regex": ".*-xlarge"},
+                {"task_tag_name": "requires_large_host", "allowed_distro_regex": ".*-large"},
+            ]
+        }
+        yaml = load(
+            """
+            tasks:
+            - name: task1
+              tags: ["requires_large_host"]
+            - name: task2
+              tags: ["requires_large_host", "requires_xlarge_host"]
+            buildvariants:
+            - name: variant-1
+              run_on:
+                - rhel8.8-small
+              tasks:
+                - name: task1
+                - name: task2
+            """
+        )
+
+        violations = self.rule(rule_config, yaml)
+        self.assertEqual(len(violations), 3)
+        self.assertIn("'task2'", violations[0])
+        self.assertIn("'requires_xlarge_host'", violations[0])
+        self.assertIn("'task1'", violations[1])
+        self.assertIn("'task2'", violations[2])
+        self.assertIn("'requires_large_host'", violations[2])
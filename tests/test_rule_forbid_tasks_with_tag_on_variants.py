@@ -144,3 +144,36 @@ class TestForbidTasksWithTagOnVariants(unittest.TestCase):
         self.assertIn("task1", violations[0])
         self.assertIn("variant-2", violations[1])
         self.assertIn("task2", violations[1])
+
+    def test_matrix_variants(self):
+        rule_config = {
+            "tags": [
+                {
+                    "variant_tag_name": "no_task_tag_experimental",
+                    "forbidden_task_tag": "experimental",
+                }
+            ]
+        }
+
+        yaml = load(
+            """
+            tasks:
+            - name: task1
+              tags: ["experimental"]
+            axes:
+            - id: os
+              values:
+              - id: linux
+                tags: ["no_task_tag_experimental"]
+              - id: macos
+            buildvariants:
+            - matrix_name: matrix
+              matrix_spec: {os: "*"}
+              tasks:
+                - name: task1
+            """
+        )
+
+        violations = self.rule(rule_config, yaml)
+        self.assertEqual(len(violations), 1)
+        self.assertIn("'matrix__os~linux'", violations[0])
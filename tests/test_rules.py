@@ -1,14 +1,17 @@
 """evglint tests."""
+import glob
+import os
 import unittest
 from io import StringIO
 from typing import List
+from unittest import mock
 
 from typing_extensions import TypedDict
 
 import evergreen_lint.helpers as h
 from evergreen_lint import rules
 from evergreen_lint.model import LintError, Rule
-from evergreen_lint.yamlhandler import load
+from evergreen_lint.yamlhandler import load, load_file, read_file
 
 
 class TestRulebreaker(unittest.TestCase):
@@ -119,6 +122,45 @@ class TestRulebreaker(unittest.TestCase):
                 )
 
 
+def _may_fire(contents):
+    found = rules.find_literals(rules.literals_required_by(rules.RULES.values()), contents)
+    return rules.rules_that_may_fire(rules.RULES, found)
+
+
+class TestRequiredLiterals(unittest.TestCase):
+    """Rules must not be skipped on files they report errors for."""
+
+    def test_rules_that_fire_have_their_literals(self):
+        fixtures = glob.glob(os.path.join(os.path.dirname(__file__), "yml", "*.yml"))
+        for fixture in fixtures:
+            yaml_dict = load_file(fixture)
+            with read_file(fixture) as content:
+                may_fire = _may_fire([content])
+            for rule_name, rule in rules.RULES.items():
+                with self.subTest(fixture=os.path.basename(fixture), rule=rule_name):
+                    if rule_name not in may_fire:
+                        self.assertEqual(rule()(rule().defaults(), yaml_dict), [])
+
+    def test_skipped_without_literals(self):
+        may_fire = _may_fire([b"tasks:\n- name: t\n"])
+        self.assertNotIn("no-shell-exec", may_fire)
+        self.assertNotIn("limit-keyval-inc", may_fire)
+        # rules without literals always run
+        self.assertIn("invalid-function-name", may_fire)
+
+        may_fire = _may_fire([b"a: 1\n", b"b: shell.exec\n"])
+        self.assertIn("no-shell-exec", may_fire)
+        self.assertNotIn("no-multiline-expansions-update", may_fire)
+
+    def test_find_literals(self):
+        self.assertEqual(rules.find_literals(["ab", "bc", "c"], [b"abc"]), {"ab", "bc", "c"})
+        self.assertEqual(rules.find_literals(["abc", "b"], [b"xabcx"]), {"abc", "b"})
+        self.assertEqual(rules.find_literals(["abc", "b"], [b"xbx"]), {"b"})
+        self.assertEqual(rules.find_literals(["a.c"], [b"abc"]), set())
+        self.assertEqual(rules.find_literals([], [b"abc"]), set())
+        self.assertEqual(rules.find_literals(["x", "y"], [b"y", memoryview(b"x")]), {"x", "y"})
+
+
 class TestHelpers(unittest.TestCase):
     """Test .helpers module."""
 
@@ -182,6 +224,174 @@ tasks:
             count = count + 1
         self.assertEqual(count, 2)
 
+    def test_iterate_shared_commands(self):
+        """Test iterate_shared_commands."""
+        yaml_dict = load(TestRulebreaker.RULEBREAKER.format(inject_here=""))
+        shared = list(h.iterate_shared_commands(yaml_dict))
+        # *a1 is used 11 times, but only visited once
+        self.assertEqual(len(shared), 4)
+        self.assertEqual(sum(len(contexts) for contexts, _ in shared), 14)
+        self.assertEqual(shared[0][0][0], "Function 'single command', command")
+        self.assertEqual(len(shared[0][0]), 11)
+
+    def test_command_index(self):
+        """Test command_index against the iterate_* helpers."""
+        for fixture in glob.glob(os.path.join(os.path.dirname(__file__), "yml", "*.yml")):
+            with self.subTest(fixture=os.path.basename(fixture)):
+                yaml_dict = load_file(fixture, positions=True)
+                index = h.command_index(yaml_dict)
+                self.assertIs(h.command_index(yaml_dict), index)
+
+                def rendered(uses):
+                    return [
+                        ([str(context) for context in contexts], node) for contexts, node in uses
+                    ]
+
+                shared = list(h.iterate_shared_commands(yaml_dict))
+                for name in {command["command"] for _, command in shared}:
+                    self.assertEqual(
+                        rendered(index.commands_named(name)),
+                        [use for use in shared if use[1]["command"] == name],
+                    )
+                self.assertEqual(
+                    rendered(index.commands_named(*h.SHELL_COMMANDS)),
+                    [use for use in shared if h.is_shell_command(use[1]["command"])],
+                )
+                calls = list(h.iterate_fn_calls_context(yaml_dict))
+                self.assertEqual(
+                    [(str(context), *rest) for context, *rest in sum(index.calls.values(), [])],
+                    sorted(calls, key=lambda call: list(index.calls).index(call[1]["func"])),
+                )
+
+        # commands shared through an anchor are listed once, with every use
+        yaml_dict = load(TestRulebreaker.RULEBREAKER.format(inject_here=""))
+        contexts, _ = h.command_index(yaml_dict).commands["shell.exec"][0]
+        self.assertEqual(len(contexts), 11)
+
+    LOCATIONS = """
+functions:
+  f_single: {command: shell.exec}
+  f_list:
+  - command: shell.exec
+  - func: f_single
+task_groups:
+- name: tg
+  setup_group:
+  - command: shell.exec
+tasks:
+- name: t
+  commands: {func: f_list}
+  teardown_task:
+  - command: shell.exec
+pre:
+- command: shell.exec
+"""
+
+    def test_locations(self):
+        """Test the contexts of the iterate_* helpers and their Locations."""
+        yaml_dict = load(TestHelpers.LOCATIONS)
+        self.assertEqual(
+            [context for context, _, _ in h.iterate_commands_context(yaml_dict)],
+            [
+                "Function 'f_single', command",
+                "Function 'f_list', command 0",
+                "task_group 'tg', setup_group, command 0",
+                "Task 't', teardown_task, command 0",
+                "Global pre, command 0",
+            ],
+        )
+        self.assertEqual(
+            [context for context, _, _ in h.iterate_fn_calls_context(yaml_dict)],
+            [
+                "Function 'f_list', command 1 (function call: 'f_single')",
+                "Task 't', function call 'f_list'",
+            ],
+        )
+        self.assertEqual(
+            [context for context, _ in h.iterate_command_lists(yaml_dict)],
+            [
+                "Function 'f_single'",
+                "Function 'f_list'",
+                "task_group 'tg', setup_group",
+                "Task 't'",
+                "Task 't', teardown_task",
+                "Global pre",
+            ],
+        )
+        # the contexts are plain strings
+        for context, _ in h.iterate_commands(yaml_dict):
+            self.assertIs(type(context), str)
+
+        # lazy=True gives the Locations the strings are rendered from, the
+        # strings are put together without them
+        yaml_dict = load(TestHelpers.LOCATIONS, positions=True)
+        for iterator in [
+            h.iterate_commands_context,
+            h.iterate_fn_calls_context,
+            h.iterate_command_lists,
+        ]:
+            with self.subTest(iterator=iterator.__name__):
+                with mock.patch.object(h.Location, "at", side_effect=AssertionError):
+                    contexts = [context for context, *_ in iterator(yaml_dict)]
+                locations = [context for context, *_ in iterator(yaml_dict, lazy=True)]
+                self.assertTrue(all(isinstance(location, h.Location) for location in locations))
+                self.assertTrue(all(location._text is None for location in locations))
+                self.assertEqual([str(location) for location in locations], contexts)
+                self.assertIn("(line ", contexts[0])
+
+        # the command index keeps Locations, rendered on first use
+        index = h.command_index(load(TestHelpers.LOCATIONS, positions=True))
+        contexts, _ = index.commands_named("shell.exec")[0]
+        context = contexts[0]
+        self.assertIsInstance(context, h.Location)
+        self.assertIsNone(context._text)
+        self.assertEqual(context.kind, "function")
+        self.assertEqual(str(context), "Function 'f_single', command (line 3, column 13)")
+        self.assertEqual(h.describe_uses(contexts), str(context))
+        # Locations compare by place, never to their text
+        self.assertEqual(context, context.at(context.index, None, context.node))
+        self.assertNotEqual(context, str(context))
+        self.assertNotEqual(context, contexts[0].at(0, None, context.node))
+        self.assertEqual(len({context, context.at(context.index, None, context.node)}), 1)
+        call, _, _ = index.calls["f_single"][0]
+        self.assertEqual(
+            str(call), "Function 'f_list', command 1 (function call: 'f_single') (line 6, column 5)"
+        )
+
+    def test_memoized_iterators(self):
+        """Test that the iterate_* helpers are built once per document."""
+        iterators = [
+            h.iterate_commands,
+            h.iterate_commands_context,
+            h.iterate_fn_calls_context,
+            h.iterate_command_lists,
+        ]
+        yaml_dict = load(TestHelpers.LOCATIONS)
+        for iterator in iterators:
+            with self.subTest(iterator=iterator.__name__):
+                first = list(iterator(yaml_dict))
+                again = list(iterator(yaml_dict))
+                self.assertEqual(again, first)
+                self.assertTrue(all(a[0] is b[0] for a, b in zip(again, first)))
+        self.assertEqual(
+            len(list(h.iterate_commands_context(yaml_dict, skip_blocks=["functions"]))), 3
+        )
+
+        # documents don't share results, even if they are equal
+        other = list(h.iterate_commands(load(TestHelpers.LOCATIONS)))
+        self.assertIsNot(other[0][0], list(h.iterate_commands(yaml_dict))[0][0])
+
+        # with MEMOIZE off every call walks the document again
+        with mock.patch.object(h, "MEMOIZE", False):
+            yaml_dict = load(TestHelpers.LOCATIONS)
+            for iterator in iterators:
+                with self.subTest(iterator=iterator.__name__, memoize=False):
+                    first = list(iterator(yaml_dict))
+                    again = list(iterator(yaml_dict))
+                    self.assertEqual(again, first)
+                    self.assertIsNot(again[0][0], first[0][0])
+            self.assertIsNot(h.command_index(yaml_dict), h.command_index(yaml_dict))
+
     def test_match_subprocess_exec(self):
         """Test match_subprocess_exec."""
         cmd = {}
@@ -435,6 +645,27 @@ tasks:
                     )
                 ],
             },
+            {
+                "raw_yaml": """
+functions:
+    "anchored": &shell
+      command: shell.exec
+tasks:
+- name: test
+  commands:
+    - *shell
+    - *shell
+            """,
+                "errors": [
+                    (
+                        "Function 'anchored', command [also used in: Task 'test', "
+                        "command 0; Task 'test', command 1] is a shell.exec command, "
+                        "which is forbidden. Extract your shell script out of the "
+                        "YAML and into a .sh file in directory 'evergreen', and "
+                        "use subprocess.exec instead."
+                    )
+                ],
+            },
         ]
 
 
@@ -822,8 +1053,88 @@ tasks:
         """,
                 "errors": REQUIRED_EXPANSIONS_WRITE_ERRORS,
             },
+            {
+                # functions with a list definition are seen through
+                "raw_yaml": """
+functions:
+  "f_expansions_write": &f_expansions_write
+    command: expansions.write
+    params:
+      file: expansions.yml
+      redacted: true
+
+  "f_prelude":
+    # counts as an expansions.write call, it ends with one, but only
+    # functions that are just an expansions.write call are suggested
+    - command: expansions.update
+    - *f_expansions_write
+
+  "f_update":
+    # leaves the expansions updated, callers must write them
+    - command: shell.exec
+    - command: expansions.update
+
+tasks:
+  - name: prelude
+    commands:
+      - func: f_prelude
+      - command: subprocess.exec
+        params:
+          binary: bash
+          args:
+            - "src/evergreen/do_something.sh"
+
+  - name: update
+    commands:
+      - func: f_prelude
+      - func: f_update
+      - command: subprocess.exec
+        params:
+          binary: bash
+          args:
+            - "src/evergreen/do_something.sh"
+""",
+                "errors": [
+                    "Function 'f_update', command 1 is an expansions.update command that is not "
+                    "immediately followed by an expansions.write call. Always call "
+                    "expansions.write with params: file: expansions.yml; redacted: true, (or use "
+                    "one of these functions: ['f_expansions_write']) after calling "
+                    "expansions.update.",
+                    "Task 'update', command 1, (function call: f_update) is an expansions.update "
+                    "command that is not immediately followed by an expansions.write call. Always"
+                    " call expansions.write with params: file: expansions.yml; redacted: true, "
+                    "(or use one of these functions: ['f_expansions_write']) after "
+                    "calling expansions.update.",
+                ],
+            },
         ]
 
+    def test_positions(self):
+        """The position of the offending command ends its context."""
+        yaml_dict = load(
+            """
+functions:
+  f_update:
+    command: expansions.update
+tasks:
+- name: t
+  commands:
+  - command: shell.exec
+  - func: f_update
+  - command: shell.exec
+""",
+            positions=True,
+        )
+        errors = self.func(self.func.defaults(), yaml_dict)
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(
+            errors[0].startswith(
+                "Task 't', command 1, (function call: f_update) (line 9, column 5) is an "
+                "expansions.update command"
+            ),
+            errors[0],
+        )
+
 
 class TestRequiredExpansionsWriteAgainstEvaluatedYaml(_BaseTestClasses.RuleTest):
     """Test required-expansions-write."""
@@ -0,0 +1,82 @@
+"""Tests for evergreen_lint.snapshot."""
+import os
+import shutil
+import tempfile
+import unittest
+
+from click.testing import CliRunner
+
+import evergreen_lint.__main__ as ut
+from evergreen_lint import helpers as h
+from evergreen_lint import snapshot, yamlhandler
+from evergreen_lint.includes import ProjectLoader
+
+YML_DIR = os.path.join(os.path.dirname(__file__), "yml")
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.directory = tmp.name
+        self.project = os.path.join(self.directory, "mongo.yml")
+        shutil.copy(os.path.join(YML_DIR, "mongo_with_errs.yml"), self.project)
+        with open(os.path.join(self.directory, "main.yml"), "w") as fh:
+            fh.write("include:\n- filename: mongo.yml\n")
+        self.output = os.path.join(self.directory, "main.evgsnap")
+
+    def _compile(self, **options):
+        main = os.path.join(self.directory, "main.yml")
+        with ProjectLoader(positions=True, **options) as loader:
+            project = loader.load(main)
+            snapshot.write(self.output, project, loader.sources[main], **options)
+        return project
+
+    def test_round_trip(self):
+        project = self._compile()
+        self.assertTrue(snapshot.is_snapshot(self.output))
+        self.assertFalse(snapshot.is_snapshot(self.project))
+
+        loaded = snapshot.load(self.output)
+        self.assertEqual(loaded, project)
+        # unpickled strings are interned again
+        self.assertIs(next(iter(loaded["tasks"][0])), "name")
+        self.assertEqual(list(h.iterate_commands(loaded)), list(h.iterate_commands(project)))
+        self.assertEqual(
+            yamlhandler.position_of(loaded["tasks"][0]),
+            yamlhandler.Position(2070, 3, "mongo.yml"),
+        )
+
+    def test_stale_snapshot_is_rejected(self):
+        self._compile()
+        with open(self.project, "a") as fh:
+            fh.write("# changed\n")
+        with self.assertRaisesRegex(RuntimeError, r"stale.*\['mongo.yml'\]"):
+            snapshot.load(self.output)
+
+    def test_other_options_are_rejected(self):
+        self._compile(core_schema=True)
+        with self.assertRaisesRegex(RuntimeError, "compiled with core_schema=True, not False"):
+            snapshot.load(self.output)
+        self.assertEqual(
+            snapshot.load(self.output, core_schema=True)["tasks"][0]["name"], "compile_dist_test"
+        )
+
+        self._compile(alias_budget=None)
+        message = f"compiled with alias_budget=None, not {yamlhandler.ALIAS_BUDGET}"
+        with self.assertRaisesRegex(RuntimeError, message):
+            snapshot.load(self.output)
+        snapshot.load(self.output, alias_budget=None)
+
+    def test_lint_accepts_snapshots(self):
+        config = os.path.join(self.directory, "evglint.yml")
+        with open(config, "w") as fh:
+            fh.write("files:\n- main.evgsnap\nrules:\n- rule: no-shell-exec\n")
+
+        runner = CliRunner()
+        res = runner.invoke(ut.main, ["-c", config, "compile", self.project, "-o", self.output])
+        self.assertEqual(res.exit_code, 0, res.output)
+        res = runner.invoke(ut.main, ["-c", config, "lint"])
+        self.assertIn("1 error found in", res.output)
+        self.assertIn("Function 'remove files', command 1 (line 405, column 7)", res.output)
+        self.assertEqual(res.exit_code, 1)
@@ -0,0 +1,249 @@
+"""Tests for evergreen_lint.visitor."""
+import os
+import unittest
+from unittest import mock
+
+from evergreen_lint import visitor
+from evergreen_lint.rules import RULES
+from evergreen_lint.visitor import Visitor, VisitorRule, run_rules, walk
+from evergreen_lint.yamlhandler import load, load_file
+
+MONGO = os.path.join(os.path.dirname(__file__), "yml", "mongo.yml")
+
+
+class _Recorder(Visitor):
+    def __init__(self):
+        self.seen = []
+
+    def function(self, name, definition):
+        self.seen.append(("function", name))
+
+    def task_group(self, task_group):
+        self.seen.append(("task_group", task_group["name"]))
+
+    def task(self, task):
+        self.seen.append(("task", task["name"]))
+
+    def command(self, context, command, commands):
+        self.seen.append(("command", str(context)))
+
+    def function_call(self, context, call, commands):
+        self.seen.append(("function_call", str(context)))
+
+    def variant(self, variant):
+        self.seen.append(("variant", variant["name"]))
+
+
+class _VariantNames(Visitor):
+    def __init__(self):
+        self.names = []
+
+    def variant(self, variant):
+        self.names.append(variant["name"])
+
+
+class TestWalk(unittest.TestCase):
+    YAML = """
+functions:
+  f_empty:
+  f_one:
+    command: shell.exec
+task_groups:
+- name: group
+  setup_group:
+  - func: f_one
+tasks:
+- name: compile
+  commands:
+  - func: f_one
+  - command: subprocess.exec
+- name: no_commands
+buildvariants:
+- name: linux
+"""
+
+    def test_callbacks(self):
+        recorder = _Recorder()
+        walk(load(self.YAML), [recorder])
+        self.assertEqual(
+            recorder.seen,
+            [
+                ("function", "f_empty"),
+                ("function", "f_one"),
+                ("command", "Function 'f_one', command"),
+                ("task_group", "group"),
+                (
+                    "function_call",
+                    "task_group 'group', setup_group, command 0 (function call: 'f_one')",
+                ),
+                ("task", "compile"),
+                ("function_call", "Task 'compile', command 0 (function call: 'f_one')"),
+                ("command", "Task 'compile', command 1"),
+                ("task", "no_commands"),
+                ("variant", "linux"),
+            ],
+        )
+
+    def test_only_needed_nodes_are_walked(self):
+        names = _VariantNames()
+        with mock.patch.object(
+            visitor, "walk_command_blocks", wraps=visitor.walk_command_blocks
+        ) as iterator:
+            walk(load(self.YAML), [names, Visitor()])
+        iterator.assert_not_called()
+        self.assertEqual(names.names, ["linux"])
+
+
+class TestRunRules(unittest.TestCase):
+    RAW = """
+functions:
+  f_setup:
+    command: subprocess.exec
+    params: {binary: bash, args: [buildscripts/setup.sh]}
+  run tests:
+  - command: shell.exec
+    params: {script: make test}
+  - func: f_setup
+tasks:
+- name: compile
+  tags: [release]
+  commands:
+  - func: run tests
+- name: test
+  tags: [release, nightly]
+  depends_on: [compile]
+  commands:
+  - func: f_setup
+  - command: shell.exec
+    params: {script: make test}
+task_groups:
+- name: tg
+  tasks: [compile]
+  setup_group:
+  - func: run tests
+buildvariants:
+- name: linux
+  display_name: Linux
+  tags: [required]
+  expansions: {scons_cache: "on"}
+  tasks: [{name: compile}, {name: test}]
+- matrix_name: m
+  matrix_spec: {os: "*"}
+  tasks: [{name: test}]
+axes:
+- id: os
+  values:
+  - id: macos
+    variables: {os: macos}
+"""
+
+    CONFIGS = {
+        "dependency-for-func": {"dependencies": {"f_setup": ["lint"]}},
+        "enforce-tags-for-tasks": {
+            "tag_groups": [
+                {
+                    "group_name": "release",
+                    "tag_regex": "nightly|release",
+                    "tag_list": ["nightly", "release"],
+                    "min_num_of_tags": 2,
+                    "max_num_of_tags": 2,
+                }
+            ]
+        },
+        "enforce-tags-for-variants": {
+            "tags": [
+                {
+                    "tag_name": "required",
+                    "variant_config": {"name_regex": ".*", "display_name_regex": "^! .+$"},
+                }
+            ]
+        },
+        "variant-expansions": {
+            "require_expansions": [{"expansion_name": "compile_flags"}],
+            "prohibit_expansions": [{"expansion_name": "scons_cache"}],
+        },
+    }
+
+    # What each rule reported on RAW before visitor rules were run together
+    EXPECTED = {
+        "dependency-for-func": [
+            "Missing dependency. The task 'test' expects 'lint' to be listed as a "
+            "dependency due to the use of the 'f_setup' func."
+        ],
+        "enforce-tags-for-tasks": [
+            "Task tags requirement is not met. The task 'compile' should have no "
+            "less than '2' and no more than '2' tag(s) of 'release' tag group "
+            "list: ['nightly', 'release']. Found tags: ['release']. Please "
+            "add/remove tag(s) of the tag group list to/from the task 'compile' to "
+            "match the requirement."
+        ],
+        "enforce-tags-for-variants": [
+            "Tag 'required' should be removed from build variant 'linux' "
+            "because build variant configuration does not match the "
+            "following: \n"
+            '  name_regex: ".*"\n'
+            '  display_name_regex: "^! .+$"'
+        ],
+        "invalid-function-name": [
+            "Function 'run tests' must have a name matching '^f_[a-z][A-Za-z0-9_]*'"
+        ],
+        "no-shell-exec": [
+            "Function 'run tests', command 0 (line 7, column 5) is a shell.exec command, "
+            "which is forbidden. Extract your shell script out of the YAML and into a .sh "
+            "file in directory 'evergreen', and use subprocess.exec instead.",
+            "Task 'test', command 1 (line 20, column 5) is a shell.exec command, which is "
+            "forbidden. Extract your shell script out of the YAML and into a .sh file in "
+            "directory 'evergreen', and use subprocess.exec instead.",
+        ],
+        "shell-exec-explicit-shell": [
+            "Function 'run tests', command 0 (line 7, column 5) is a shell.exec "
+            "command without an explicitly declared shell. You almost certainly "
+            "want to add 'shell: bash' to the parameters list.",
+            "Task 'test', command 1 (line 20, column 5) is a shell.exec command "
+            "without an explicitly declared shell. You almost certainly want to "
+            "add 'shell: bash' to the parameters list.",
+        ],
+        "variant-expansions": [
+            "Build variant expansion 'compile_flags' should be added to 'linux' build "
+            "variant, because build variant configuration matches the following: ",
+            "Build variant expansion 'scons_cache' should be removed from 'linux' "
+            "build variant, because build variant configuration matches the "
+            "following: ",
+            "Build variant expansion 'compile_flags' should be added to 'm__os~macos' "
+            "build variant, because build variant configuration matches the "
+            "following: ",
+        ],
+    }
+
+    def test_errors(self):
+        rules = {
+            name: (rule(), self.CONFIGS.get(name, rule.defaults())) for name, rule in RULES.items()
+        }
+        # every visitor rule is covered
+        for name, rule in RULES.items():
+            if issubclass(rule, VisitorRule):
+                self.assertIn(name, self.EXPECTED)
+        self.assertEqual(run_rules(rules, load(self.RAW, positions=True)), self.EXPECTED)
+
+    def test_visitor_is_required(self):
+        class _NoVisitor(VisitorRule):
+            @staticmethod
+            def name() -> str:
+                return "no-visitor"
+
+        with self.assertRaises(TypeError):
+            _NoVisitor()  # type: ignore
+
+    def test_visitor_rules_share_one_walk(self):
+        yaml_dict = load_file(MONGO)
+        rules = {
+            name: (rule(), rule.defaults())
+            for name, rule in RULES.items()
+            if issubclass(rule, VisitorRule)
+        }
+        self.assertGreater(len(rules), 1)
+        with mock.patch.object(
+            visitor, "walk_command_blocks", wraps=visitor.walk_command_blocks
+        ) as iterator:
+            run_rules(rules, yaml_dict)
+        self.assertEqual(iterator.call_count, 1)
@@ -0,0 +1,713 @@
+"""Tests for evergreen_lint.yamlhandler."""
+import copy
+import gc
+import glob
+import json
+import mmap
+import os
+import pickle
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+import yaml
+
+from evergreen_lint import helpers as h
+from evergreen_lint import yamlhandler
+from evergreen_lint.cache import ParseCache
+from evergreen_lint.includes import ProjectLoader
+from evergreen_lint.model import Rule
+from evergreen_lint.rules import RULES, root_keys_read_by
+
+FIXTURES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "yml", "*.yml")))
+MONGO = os.path.join(os.path.dirname(__file__), "yml", "mongo.yml")
+
+
+class TestLoaderParity(unittest.TestCase):
+    """The libyaml-backed loader must produce the same tree as the pure-Python one."""
+
+    @unittest.skipUnless(yaml.__with_libyaml__, "PyYAML was built without libyaml")
+    def test_fast_loader_is_used(self):
+        self.assertIs(yamlhandler.SafeLoader, yaml.CSafeLoader)
+
+    def test_fixtures_parse_identically(self):
+        self.assertTrue(FIXTURES)
+        for fixture in FIXTURES:
+            with self.subTest(fixture=os.path.basename(fixture)):
+                with open(fixture) as fh:
+                    raw = fh.read()
+                expected = yaml.load(raw, Loader=yaml.SafeLoader)
+                self.assertEqual(yaml.load(raw, Loader=yamlhandler.SafeLoader), expected)
+                self.assertEqual(yamlhandler.load(raw), expected)
+                self.assertEqual(yamlhandler.load_file(fixture), expected)
+
+
+class TestReadOnly(unittest.TestCase):
+    """The loaded document must be read-only all the way down."""
+
+    RAW = """
+functions:
+  "f_anchor": &a1
+    command: shell.exec
+    params:
+      script: /bin/true
+tasks:
+- name: compile
+  tags: ["a", "b"]
+  commands:
+  - *a1
+  - func: f_anchor
+"""
+
+    def setUp(self):
+        self.doc = yamlhandler.load(self.RAW)
+
+    def test_nested_mutation_raises(self):
+        task = self.doc["tasks"][0]
+        mutations = [
+            lambda: self.doc.update({}),
+            lambda: self.doc["functions"].pop("f_anchor"),
+            lambda: task.__setitem__("name", "link"),
+            lambda: task["commands"].append({}),
+            lambda: self.doc["tasks"].__delitem__(0),
+            lambda: task["commands"][0]["params"].clear(),
+            lambda: task["tags"].sort(),
+        ]
+        for mutate in mutations:
+            with self.assertRaises(RuntimeError):
+                mutate()
+
+    def test_views_are_lazy_and_shared(self):
+        self.assertIsInstance(self.doc["tasks"], yamlhandler.ReadOnlyList)
+        self.assertIsInstance(self.doc["tasks"][0], yamlhandler.ReadOnlyDict)
+        self.assertIs(self.doc["tasks"], self.doc["tasks"])
+        # both references to the anchor resolve to the same view
+        self.assertIs(self.doc["tasks"][0]["commands"][0], self.doc["functions"]["f_anchor"])
+        for value in self.doc.values():
+            self.assertIsInstance(value, (yamlhandler.ReadOnlyDict, yamlhandler.ReadOnlyList))
+
+    def test_behaves_like_builtins(self):
+        task = self.doc["tasks"][0]
+        self.assertIsInstance(task, dict)
+        self.assertIsInstance(task["tags"], list)
+        self.assertEqual(", ".join(task["tags"]), "a, b")
+        self.assertEqual(tuple(task["tags"]), ("a", "b"))
+        self.assertEqual(dict(task["commands"][1]), {"func": "f_anchor"})
+        self.assertEqual(task["tags"][::-1], ["b", "a"])
+        self.assertEqual(task.get("depends_on", []), [])
+        self.assertIn("a", task["tags"])
+        self.assertEqual(self.doc, yaml.safe_load(self.RAW))
+
+    def test_c_level_consumers(self):
+        expected = yaml.safe_load(self.RAW)
+        # views have no storage of their own, the C encoder needs the data
+        task = self.doc["tasks"][0]
+        self.assertEqual(dict.__len__(task), 0)
+        self.assertEqual(list.__len__(task["tags"]), 0)
+        self.assertEqual(json.loads(json.dumps(yamlhandler.unwrap(self.doc))), expected)
+        self.assertEqual(json.loads(json.dumps(yamlhandler.unwrap(task))), expected["tasks"][0])
+        self.assertEqual(json.loads(json.dumps(self.doc["tasks"][0]["tags"])), ["a", "b"])
+        self.assertEqual({**task}, expected["tasks"][0])
+        self.assertEqual("{name}".format_map(task), "compile")
+        self.assertEqual(sorted(task["tags"]), ["a", "b"])
+        self.assertEqual(copy.copy(task), expected["tasks"][0])
+        self.assertEqual(copy.copy(task["tags"]), ["a", "b"])
+
+    def test_copies_are_mutable(self):
+        clone = copy.deepcopy(self.doc)
+        self.assertIs(type(clone), dict)
+        clone["tasks"][0]["commands"].append({})
+        self.assertEqual(len(self.doc["tasks"][0]["commands"]), 2)
+        self.assertEqual(pickle.loads(pickle.dumps(self.doc)), self.doc)
+
+
+class TestPositions(unittest.TestCase):
+    RAW = """functions:
+  "f_anchor": &a1
+    command: shell.exec
+tasks:
+- name: compile
+  commands:
+  - *a1
+  - command: subprocess.exec
+"""
+
+    def test_positions_are_recorded(self):
+        doc = yamlhandler.load(self.RAW, positions=True)
+        task = doc["tasks"][0]
+        self.assertEqual(yamlhandler.position_of(doc), yamlhandler.Position(1, 1))
+        self.assertEqual(yamlhandler.position_of(task), yamlhandler.Position(5, 3))
+        self.assertEqual(yamlhandler.position_of(task["commands"][1]), yamlhandler.Position(8, 5))
+        # aliases point at the anchor
+        self.assertEqual(yamlhandler.position_of(task["commands"][0]), yamlhandler.Position(2, 15))
+        self.assertIsNone(yamlhandler.position_of(task["name"]))
+
+    def test_positions_are_opt_in(self):
+        doc = yamlhandler.load(self.RAW)
+        self.assertIsNone(yamlhandler.position_of(doc["tasks"][0]))
+
+    def test_positions_survive_the_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "evergreen.yml")
+            with open(path, "w") as fh:
+                fh.write(self.RAW)
+            cache = ParseCache(os.path.join(directory, "cache"))
+            for _ in range(2):
+                doc = yamlhandler.load_file(path, cache=cache, positions=True)
+                command = doc["tasks"][0]["commands"][1]
+                self.assertEqual(yamlhandler.position_of(command), yamlhandler.Position(8, 5))
+
+    def test_iterator_contexts_carry_positions(self):
+        doc = yamlhandler.load(self.RAW, positions=True)
+        contexts = [context for context, _ in h.iterate_commands(doc)]
+        self.assertEqual(
+            contexts,
+            [
+                "Function 'f_anchor', command (line 2, column 15)",
+                "Task 'compile', command 0 (line 2, column 15)",
+                "Task 'compile', command 1 (line 8, column 5)",
+            ],
+        )
+
+    def test_table_is_compact(self):
+        doc = yamlhandler.load_file(MONGO, positions=True)
+        table = doc._doc.positions
+        self.assertGreater(len(table), 1000)
+        self.assertEqual(sys.getsizeof(table._ids) // len(table), 8)
+
+
+class TestRootKeys(unittest.TestCase):
+    RAW = """
+variables:
+- &a1
+  command: shell.exec
+modules:
+- name: enterprise
+tasks:
+- name: compile
+  commands:
+  - *a1
+"""
+
+    def test_only_requested_keys_are_built(self):
+        doc = yamlhandler.load(self.RAW, root_keys={"tasks"})
+        self.assertEqual(list(doc.keys()), ["tasks"])
+        # the anchor lives under a dropped key, but still resolves
+        self.assertEqual(doc["tasks"][0]["commands"], [{"command": "shell.exec"}])
+
+    def test_rules_see_the_same_data(self):
+        full = yamlhandler.load_file(MONGO)
+        for name, rule in RULES.items():
+            with self.subTest(rule=name):
+                keys = rule.root_keys()
+                self.assertIsNotNone(keys)
+                partial = yamlhandler.load_file(MONGO, root_keys=keys)
+                self.assertLessEqual(set(partial.keys()), set(keys))
+                config = rule.defaults()
+                self.assertEqual(rule()(config, partial), rule()(config, full))
+
+    def test_root_keys_read_by(self):
+        self.assertEqual(root_keys_read_by([RULES["dependency-for-func"]]), {"tasks"})
+        self.assertEqual(
+            root_keys_read_by(RULES.values()),
+            set(h.COMMAND_BLOCKS) | {"buildvariants", "axes", "parameters"},
+        )
+        self.assertIsNone(root_keys_read_by([Rule]))  # type: ignore
+
+
+class TestBuffers(unittest.TestCase):
+    def setUp(self):
+        self.path = MONGO
+        with open(self.path, "rb") as fh:
+            self.raw = fh.read()
+        self.expected = yaml.load(self.raw, Loader=yaml.SafeLoader)
+
+    def test_load_accepts_buffers(self):
+        with open(self.path, "rb") as fh:
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                buffers = [self.raw, bytearray(self.raw), memoryview(self.raw), mapped]
+                for buffer in buffers:
+                    with self.subTest(type=type(buffer).__name__):
+                        self.assertEqual(yamlhandler.load(buffer), self.expected)
+
+    def test_large_files_are_mapped(self):
+        with yamlhandler.read_file(self.path) as content:
+            self.assertIsInstance(content, bytes)
+        with mock.patch.object(yamlhandler, "MMAP_THRESHOLD", 0):
+            with yamlhandler.read_file(self.path) as content:
+                self.assertIsInstance(content, mmap.mmap)
+                self.assertEqual(ParseCache.key(content), ParseCache.key(self.raw))
+
+            with tempfile.TemporaryDirectory() as directory:
+                cache = ParseCache(directory)
+                for _ in range(2):
+                    doc = yamlhandler.load_file(self.path, cache=cache, positions=True)
+                    self.assertEqual(doc, self.expected)
+                    self.assertEqual(yamlhandler.position_of(doc["tasks"][0]).line, 2075)
+
+
+class TestAliasBudget(unittest.TestCase):
+    @staticmethod
+    def laughs(levels):
+        lines = ['a0: &a0 ["lol", "lol", "lol", "lol", "lol", "lol", "lol", "lol", "lol"]']
+        for i in range(1, levels):
+            refs = ", ".join([f"*a{i - 1}"] * 9)
+            lines.append(f"a{i}: &a{i} [{refs}]")
+        return "\n".join(lines) + "\n"
+
+    def test_billion_laughs_is_rejected_quickly(self):
+        # expands to 9^30 strings, checking it must not walk them
+        with self.assertRaisesRegex(RuntimeError, "alias budget"):
+            yamlhandler.load(self.laughs(30))
+
+    def test_budget_is_configurable(self):
+        raw = self.laughs(3)  # aliases add 9 * 10 + 9 * 91 nodes
+        with self.assertRaisesRegex(RuntimeError, "more than 100 nodes"):
+            yamlhandler.load(raw, alias_budget=100)
+        doc = yamlhandler.load(raw, alias_budget=909)
+        self.assertEqual(len(doc["a2"]), 9)
+        self.assertEqual(yamlhandler.load(raw, alias_budget=None), doc)
+
+    def test_budget_only_counts_selected_keys(self):
+        raw = self.laughs(3) + "tasks: []\n"
+        doc = yamlhandler.load(raw, root_keys={"tasks"}, alias_budget=0)
+        self.assertEqual(doc, {"tasks": []})
+
+    def test_recursive_aliases_are_rejected(self):
+        with self.assertRaisesRegex(RuntimeError, "recursive yaml alias"):
+            yamlhandler.load("a: &a\n  b: *a\n")
+
+    def test_deep_nesting(self):
+        # deeper than the default recursion limit
+        depth = 1500
+        raw = "".join("  " * i + f"k{i}:\n" for i in range(depth)) + "  " * depth + "v\n"
+        raw += "alias: &a " + "[" * depth + "]" * depth + "\nagain: *a\n"
+        doc = yamlhandler.load(raw)
+        self.assertIn("k1", doc["k0"])
+        # the alias adds the 1500 nested sequences once more
+        with self.assertRaisesRegex(RuntimeError, "more than 1499 nodes"):
+            yamlhandler.load(raw, alias_budget=1499)
+
+    def test_fixtures_fit_the_default_budget(self):
+        for fixture in FIXTURES:
+            with self.subTest(fixture=os.path.basename(fixture)):
+                yamlhandler.load_file(fixture)
+
+
+class TestInterning(unittest.TestCase):
+    def test_trees_are_equal(self):
+        for fixture in FIXTURES:
+            with self.subTest(fixture=os.path.basename(fixture)):
+                self.assertEqual(
+                    yamlhandler.load_file(fixture, intern=True), yamlhandler.load_file(fixture)
+                )
+
+    def test_names_are_shared(self):
+        for kwargs in [{}, {"positions": True}]:
+            with self.subTest(**kwargs):
+                doc = yamlhandler.load_file(MONGO, intern=True, **kwargs)
+                first, second = doc["tasks"][0], doc["tasks"][1]
+                self.assertIs(next(iter(first)), next(iter(second)))
+                self.assertIs(first["commands"][0]["func"], second["commands"][1]["func"])
+                self.assertIs(first["name"], second["depends_on"][0]["name"])
+
+        script = "x" * (yamlhandler.INTERN_MAX_LENGTH + 1)
+        doc = yamlhandler.load(f"a: {script}\nb: {script}\n{script}: 1\n", intern=True)
+        self.assertIsNot(doc["a"], doc["b"])
+        self.assertIs(list(doc)[2], sys.intern(script))
+
+    def test_sharing_survives_the_cache(self):
+        for kwargs in [{}, {"positions": True}]:
+            with self.subTest(**kwargs), tempfile.TemporaryDirectory() as directory:
+                cache = ParseCache(directory)
+                # a miss, then a hit
+                docs = [
+                    yamlhandler.load_file(MONGO, cache=cache, intern=True, **kwargs)
+                    for _ in range(2)
+                ]
+                for doc in docs:
+                    first, second = doc["tasks"][0], doc["tasks"][1]
+                    self.assertIs(next(iter(first)), next(iter(second)))
+                # the unpickled tree shares strings with other trees too
+                self.assertIs(docs[1]["tasks"][0]["name"], docs[0]["tasks"][0]["name"])
+                self.assertIs(next(iter(docs[1]["tasks"][0])), "name")
+
+    def test_memory_benchmark(self):
+        """The interned mongo.yml tree takes at least a fifth less memory."""
+        with open(MONGO, "rb") as fh:
+            raw = fh.read()
+
+        def _retained(intern):
+            tracemalloc.start()
+            try:
+                doc = yamlhandler.load(raw, positions=True, intern=intern)
+                return tracemalloc.get_traced_memory()[0], doc
+            finally:
+                tracemalloc.stop()
+
+        plain, _ = _retained(False)
+        interned, _ = _retained(True)
+        self.assertLess(
+            interned, plain * 0.8, f"retained {interned} bytes interned vs {plain} bytes plain"
+        )
+
+
+class TestCoreSchema(unittest.TestCase):
+    def test_scalars_resolve_like_evergreen(self):
+        table = [
+            ("yes", "yes"),
+            ("Off", "Off"),
+            ("2021-01-01", "2021-01-01"),
+            ("1:30", "1:30"),
+            ("true", True),
+            ("FALSE", False),
+            ("~", None),
+            ("", None),
+            ("0", 0),
+            ("-42", -42),
+            ("1_000", 1000),
+            ("010", 8),
+            ("0o17", 15),
+            ("0x1f", 31),
+            ("1.5", 1.5),
+            ("1e3", 1000.0),
+            ("-.inf", float("-inf")),
+            ("v1.2", "v1.2"),
+        ]
+        for raw, expected in table:
+            with self.subTest(raw=raw):
+                value = yamlhandler.load(f"key: {raw}\n", core_schema=True)["key"]
+                self.assertEqual(value, expected)
+                self.assertIs(type(value), type(expected))
+
+    def test_merge_keys(self):
+        doc = yamlhandler.load("a: &a {x: 1}\nb:\n  <<: *a\n  y: 2\n", core_schema=True)
+        self.assertEqual(doc["b"], {"x": 1, "y": 2})
+
+    def test_fixtures_parse_identically(self):
+        for fixture in FIXTURES:
+            with self.subTest(fixture=os.path.basename(fixture)):
+                self.assertEqual(
+                    yamlhandler.load_file(fixture, core_schema=True, intern=True, positions=True),
+                    yamlhandler.load_file(fixture),
+                )
+
+    @unittest.skipUnless(yaml.__with_libyaml__, "PyYAML was built without libyaml")
+    @unittest.skipUnless(os.environ.get("EVGLINT_BENCHMARK"), "set EVGLINT_BENCHMARK=1 to run")
+    def test_benchmark(self):
+        """Loading the fixtures with the core schema is about as fast as without
+        it, close to a bare CSafeLoader, which skips the checks of load(), and
+        several times faster than yaml.safe_load.
+
+        Timing depends on the machine and its load, so this only runs when
+        asked for.
+        """
+        raws = []
+        for fixture in FIXTURES:
+            with open(fixture, "rb") as fh:
+                raws.append(fh.read())
+
+        loaders = {
+            "core": lambda raw: yamlhandler.load(raw, core_schema=True),
+            "default": yamlhandler.load,
+            "CSafeLoader": lambda raw: yaml.load(raw, Loader=yaml.CSafeLoader),
+            "safe_load": yaml.safe_load,
+        }
+        # the best of interleaved rounds, so a slow moment hits them alike, each
+        # without the garbage of the previous one
+        best = dict.fromkeys(loaders, float("inf"))
+        for _ in range(5):
+            for name, load in loaders.items():
+                gc.collect()
+                start = time.perf_counter()
+                for raw in raws:
+                    load(raw)
+                best[name] = min(best[name], time.perf_counter() - start)
+        core, default, c_safe_load, safe_load = best.values()
+        timings = (
+            f"{core:.3f}s vs {default:.3f}s without the core schema, {c_safe_load:.3f}s for "
+            f"CSafeLoader, {safe_load:.3f}s for safe_load"
+        )
+        self.assertLess(core, default * 1.25, timings)
+        self.assertLess(core, c_safe_load * 1.5, timings)
+        self.assertLess(core * 2, safe_load, timings)
+
+
+class TestParallelSections(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.executor = ProcessPoolExecutor(2)
+        lines = ["# project", "stepback: true", "functions:"]
+        lines += ['  "setup": &setup', "    command: shell.exec", "    params: {script: ls}"]
+        lines += ["tasks:"]
+        for idx in range(200):
+            lines += [f"- name: task_{idx}", "  commands:", "  - *setup", "  - func: run"]
+        lines += ["variables:", "- &variant", "  run_on: [rhel80]"]
+        lines += ["buildvariants:"]
+        for idx in range(200):
+            lines += ["- <<: *variant", f"  name: variant_{idx}", "  tasks: [{name: task_0}]"]
+        lines += ["modules: []"]
+        cls.raw = "\n".join(lines) + "\n"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.executor.shutdown()
+
+    def setUp(self):
+        patcher = mock.patch.object(yamlhandler, "PARALLEL_THRESHOLD", 1024)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sections_are_grouped_by_anchor(self):
+        raw = self.raw.encode()
+        sections = yamlhandler._split_sections(raw)
+        keys = [key for key, _, _ in sections]
+        self.assertEqual(
+            keys, ["stepback", "functions", "tasks", "variables", "buildvariants", "modules"]
+        )
+        groups = yamlhandler._group_sections(raw, sections, 0)
+        self.assertEqual(
+            [[keys[idx] for idx in group] for group in groups],
+            [["stepback"], ["functions", "tasks"], ["variables", "buildvariants"], ["modules"]],
+        )
+        # small groups are packed with their neighbours
+        self.assertEqual(len(yamlhandler._group_sections(raw, sections, 256)), 2)
+
+    def test_same_result_as_serial(self):
+        # modules is too small for a process of its own, so the last case is
+        # parsed serially
+        for root_keys, submits in [
+            (None, 2),
+            ({"tasks", "buildvariants"}, 2),
+            ({"modules", "tasks"}, 0),
+        ]:
+            with self.subTest(root_keys=root_keys):
+                serial = yamlhandler.load(self.raw, positions=True, root_keys=root_keys)
+                with mock.patch.object(
+                    self.executor, "submit", wraps=self.executor.submit
+                ) as submit:
+                    doc = yamlhandler.load(
+                        self.raw, positions=True, root_keys=root_keys, executor=self.executor
+                    )
+                self.assertEqual(submit.call_count, submits)
+                self.assertEqual(list(doc), list(serial))
+                self.assertEqual(doc, serial)
+
+                nodes = list(yamlhandler._walk(yamlhandler.unwrap(doc)))
+                expected = list(yamlhandler._walk(yamlhandler.unwrap(serial)))
+                self.assertEqual(len(nodes), len(expected))
+                table = yamlhandler.document_positions(doc)
+                serial_table = yamlhandler.document_positions(serial)
+                for node, serial_node in zip(nodes, expected):
+                    self.assertEqual(table.get(node), serial_table.get(serial_node))
+                # aliases within a group are still shared
+                tasks = doc["tasks"]
+                self.assertIs(tasks[0]["commands"][0], tasks[1]["commands"][0])
+
+    def test_interned_across_groups(self):
+        doc = yamlhandler.load(self.raw, intern=True, executor=self.executor)
+        # tasks and buildvariants are parsed by different processes
+        self.assertIs(doc["tasks"][0]["name"], doc["buildvariants"][0]["tasks"][0]["name"])
+
+    def test_unsplittable_documents_parse_serially(self):
+        for raw in ["---\n" + self.raw, self.raw.replace("modules", "'modules'")]:
+            with mock.patch.object(self.executor, "submit") as submit:
+                doc = yamlhandler.load(raw, executor=self.executor)
+            submit.assert_not_called()
+            self.assertEqual(doc, yamlhandler.load(raw))
+
+    def test_project_loader(self):
+        with ProjectLoader(positions=True, processes=2) as loader:
+            doc = loader.load(MONGO)
+        self.assertEqual(doc, yamlhandler.load_file(MONGO))
+        self.assertEqual(yamlhandler.position_of(doc["tasks"][0]).line, 2075)
+
+
+def _unparsed(sequence):
+    return sum(type(item) is yamlhandler._Entry for item in sequence._data._items)
+
+
+class TestLazyLoad(unittest.TestCase):
+    RAW = """
+functions:
+  "setup": &setup
+    command: shell.exec
+  "plain":
+    command: subprocess.exec
+tasks:
+# a comment
+- name: first
+  commands:
+  - func: plain
+- name: second
+  commands:
+  - *setup
+- name: multi
+    line
+  tags: ["a"]
+buildvariants: []
+"""
+
+    def test_equal_to_eager(self):
+        for root_keys in [None, {"tasks"}, {"functions", "buildvariants"}]:
+            with self.subTest(root_keys=root_keys):
+                eager = yamlhandler.load_file(MONGO, positions=True, root_keys=root_keys)
+                doc = yamlhandler.load_file(MONGO, positions=True, root_keys=root_keys, lazy=True)
+                self.assertEqual(list(doc), list(eager))
+                self.assertEqual(doc, eager)
+
+                table = yamlhandler.document_positions(doc)
+                eager_table = yamlhandler.document_positions(eager)
+                nodes = yamlhandler._walk(yamlhandler.unwrap(doc))
+                for node, eager_node in zip(nodes, yamlhandler._walk(yamlhandler.unwrap(eager))):
+                    self.assertEqual(table.get(node), eager_table.get(eager_node))
+
+    def test_rules_see_the_same_data(self):
+        eager = yamlhandler.load_file(MONGO, positions=True)
+        doc = yamlhandler.load_file(MONGO, positions=True, lazy=True)
+        self.assertGreater(_unparsed(doc["tasks"]), 0)
+        for name, rule in RULES.items():
+            with self.subTest(rule=name):
+                config = rule.defaults()
+                self.assertEqual(rule()(config, doc), rule()(config, eager))
+
+    def test_entries_are_parsed_on_demand(self):
+        doc = yamlhandler.load(self.RAW, positions=True, lazy=True)
+        tasks = doc["tasks"]
+        # "second" refers to an anchor, so it was parsed up front
+        self.assertEqual(_unparsed(tasks), 2)
+        self.assertEqual(len(tasks), 3)
+
+        with mock.patch.object(
+            yamlhandler._LazySource,
+            "parse",
+            autospec=True,
+            side_effect=yamlhandler._LazySource.parse,
+        ) as parse:
+            self.assertEqual(
+                yamlhandler.find_named(tasks, "second"),
+                [{"name": "second", "commands": [{"command": "shell.exec"}]}],
+            )
+            # only "multi" had to be parsed, its name isn't on one line
+            self.assertEqual(parse.call_count, 1)
+            self.assertEqual(tasks[0]["name"], "first")
+            self.assertEqual(tasks[0]["name"], "first")
+            self.assertEqual(parse.call_count, 2)
+
+        self.assertEqual(yamlhandler.find_named(tasks, "multi line"), [tasks[2]])
+        self.assertEqual(_unparsed(tasks), 0)
+        self.assertEqual(yamlhandler.position_of(tasks[2]), yamlhandler.Position(15, 3))
+
+        functions = doc["functions"]
+        self.assertEqual(list(functions), ["setup", "plain"])
+        self.assertIs(functions["setup"], tasks[1]["commands"][0])
+        self.assertEqual(functions["plain"], {"command": "subprocess.exec"})
+        self.assertEqual(yamlhandler.position_of(functions["plain"]), yamlhandler.Position(6, 5))
+
+    def test_storage_never_holds_placeholders(self):
+        doc = yamlhandler.load(self.RAW, lazy=True)
+        tasks = yamlhandler.unwrap(doc["tasks"])
+        # unwrap() parses what is left, for C-level consumers like json
+        self.assertEqual(list.__len__(tasks), 3)
+        self.assertFalse(any(type(item) is yamlhandler._Entry for item in list.__iter__(tasks)))
+        self.assertEqual(json.loads(json.dumps(yamlhandler.unwrap(doc))), yaml.safe_load(self.RAW))
+
+        doc = yamlhandler.load(self.RAW, lazy=True)
+        self.assertEqual(list.__len__(doc["tasks"]._data), 0)
+        self.assertEqual(dict.__len__(doc["functions"]._data), 0)
+
+    def test_copies_are_plain(self):
+        doc = yamlhandler.load(self.RAW, lazy=True)
+        for copied in [pickle.loads(pickle.dumps(doc)), copy.deepcopy(doc)]:
+            self.assertEqual(copied, yamlhandler.load(self.RAW))
+            self.assertIs(type(yamlhandler.unwrap(copied)["tasks"]), list)
+            self.assertIs(type(yamlhandler.unwrap(copied)["functions"]), dict)
+
+    def test_unsplittable_sections_are_parsed_up_front(self):
+        raw = self.RAW.replace("tasks:\n", "tasks: &tasks\n")
+        doc = yamlhandler.load(raw, lazy=True)
+        self.assertIs(type(doc["tasks"]._data), list)
+        self.assertEqual(doc, yamlhandler.load(raw))
+
+    def test_project_loader(self):
+        with ProjectLoader(positions=True, lazy=True) as loader:
+            doc = loader.load(MONGO)
+        self.assertGreater(_unparsed(doc["tasks"]), 0)
+        self.assertEqual(doc, yamlhandler.load_file(MONGO))
+        # a cached tree is whole
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ParseCache(tmp)
+            for _ in range(2):
+                doc = yamlhandler.load_file(MONGO, cache=cache, lazy=True)
+                self.assertIs(type(doc["tasks"]._data), list)
+
+
+class TestJson(unittest.TestCase):
+    def setUp(self):
+        with open(MONGO) as fh:
+            self.tree = yaml.load(fh.read(), Loader=yamlhandler.SafeLoader)
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.text = json.dumps(self.tree, indent=2)
+
+    def _write(self, name, text):
+        path = os.path.join(self.directory.name, name)
+        with open(path, "w") as fh:
+            fh.write(text)
+        return path
+
+    def test_same_as_yaml(self):
+        # without the .json extension, the content is sniffed
+        for name in ["project.json", "project.yml"]:
+            with self.subTest(name=name):
+                path = self._write(name, self.text)
+                with mock.patch.object(yamlhandler, "_load_content") as load_yaml:
+                    doc = yamlhandler.load_file(path, positions=True)
+                load_yaml.assert_not_called()
+                self.assertEqual(doc, self.tree)
+                self.assertIsInstance(doc, yamlhandler.ReadOnlyDict)
+                with self.assertRaises(RuntimeError):
+                    doc["tasks"][0]["name"] = "x"
+
+                # the same positions as the yaml loader finds
+                expected = yamlhandler.load(self.text, positions=True)
+                table = yamlhandler.document_positions(doc)
+                expected_table = yamlhandler.document_positions(expected)
+                nodes = list(yamlhandler._walk(yamlhandler.unwrap(doc)))
+                expected_nodes = list(yamlhandler._walk(yamlhandler.unwrap(expected)))
+                self.assertEqual(len(table), len(expected_nodes))
+                self.assertEqual(
+                    [table.get(node) for node in nodes],
+                    [expected_table.get(node) for node in expected_nodes],
+                )
+
+    def test_root_keys(self):
+        path = self._write("project.json", self.text)
+        doc = yamlhandler.load_file(path, positions=True, root_keys={"tasks"})
+        self.assertEqual(list(doc.keys()), ["tasks"])
+        self.assertEqual(doc["tasks"], self.tree["tasks"])
+        expected = yamlhandler.load(self.text, positions=True)
+        self.assertEqual(
+            yamlhandler.position_of(doc["tasks"][0]), yamlhandler.position_of(expected["tasks"][0])
+        )
+
+    def test_flow_yaml_falls_back(self):
+        path = self._write("project.yml", "{tasks: [{name: compile}]}\n")
+        self.assertEqual(yamlhandler.load_file(path), {"tasks": [{"name": "compile"}]})
+
+    def test_columns_count_characters(self):
+        path = self._write("project.json", '{"é": {"a": [1]}, "b": {}}')
+        doc = yamlhandler.load_file(path, positions=True)
+        self.assertEqual(yamlhandler.position_of(doc["é"]).column, 7)
+        self.assertEqual(yamlhandler.position_of(doc["é"]["a"]).column, 13)
+        self.assertEqual(yamlhandler.position_of(doc["b"]).column, 24)
+
+    def test_repeated_keys_have_no_positions(self):
+        path = self._write("project.json", '{"a": {"b": 1}, "a": {"c": [2]}}')
+        doc = yamlhandler.load_file(path, positions=True)
+        self.assertEqual(doc, {"a": {"c": [2]}})
+        self.assertIsNone(yamlhandler.position_of(doc["a"]))